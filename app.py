@@ -8,6 +8,9 @@ import re
 import time
 from typing import Optional
 
+import card_snapshot
+import run_history
+
 # ページ設定
 st.set_page_config(
     page_title="ポケカ PSA10 買取比較",
@@ -233,10 +236,10 @@ st.markdown("""
 @st.cache_data
 def load_data():
     """
-    CSVファイルを読み込む
+    CSVファイルを読み込む（型付きスナップショット merged_card_data.parquet があればそちら）
     """
     try:
-        df = pd.read_csv('merged_card_data.csv', encoding='utf-8-sig')
+        df = card_snapshot.read_cards('merged_card_data.csv')
         return df
     except FileNotFoundError:
         st.error("merged_card_data.csv が見つかりません。")
@@ -681,6 +684,56 @@ def display_table_view(df):
         )
 
 
+def display_run_history():
+    """
+    パイプラインの実行履歴（run_history.jsonl、直近90日）
+    入口ごとの直近と過去の中央値の比較・推移・週ごとの集計
+    """
+    records = run_history.load(days=90)
+    if not records:
+        st.info("実行履歴がありません（各スクリプトを実行すると run_history.jsonl に記録されます）。")
+        return
+
+    summary = run_history.summarize(records)
+    rows = []
+    for entry, s in summary.items():
+        last = s["last"]
+        marks = [m for m, on in (("🔴 遅くなった", s["slower"]), ("🔴 一致率が下がった", s["match_dropped"])) if on]
+        if last.get("status") != "ok":
+            marks.append(f"🔴 エラー終了（{last.get('error')}）")
+        rows.append({
+            "入口": entry,
+            "直近の実行": last.get("started_at"),
+            "直近（秒）": last.get("seconds"),
+            "過去の中央値（秒）": s["median_seconds"],
+            "直近の一致率": last.get("match_rate"),
+            "実行回数": s["runs"],
+            "エラー終了": s["error_runs"],
+            "状態": "・".join(marks) or "🟢",
+        })
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+    entry = st.selectbox("入口", list(summary), key="run_history_entry")
+    entry_records = [r for r in records if r.get("entry") == entry]
+    index = pd.to_datetime([r.get("started_at") for r in entry_records], utc=True)
+    trend = pd.DataFrame({
+        "所要時間（秒）": [r.get("seconds") for r in entry_records],
+        "一致率": [r.get("match_rate") for r in entry_records],
+        "エラー件数": [sum((r.get("errors") or {}).values()) for r in entry_records],
+    }, index=index)
+    st.line_chart(trend[["所要時間（秒）"]])
+    stages = pd.DataFrame([r.get("stages") or {} for r in entry_records], index=index)
+    if not stages.empty and len(stages.columns):
+        st.caption("stage ごとの所要時間（秒）")
+        st.line_chart(stages)
+    if trend["一致率"].notna().any():
+        st.line_chart(trend[["一致率"]])
+    st.bar_chart(trend[["エラー件数"]])
+
+    st.caption("週ごとの集計（中央値）")
+    st.dataframe(pd.DataFrame(run_history.weekly(entry_records)), use_container_width=True, hide_index=True)
+
+
 def main():
     """
     メイン処理
@@ -828,7 +881,7 @@ def main():
     st.markdown('</div>', unsafe_allow_html=True)
     
     # タブ：データ分析 / 現場リサーチ（現場リサーチは1回だけ表示）
-    tab1, tab2 = st.tabs(["📊 データ分析（PC向け）", "📱 現場リサーチ（スマホ向け）"])
+    tab1, tab2, tab3 = st.tabs(["📊 データ分析（PC向け）", "📱 現場リサーチ（スマホ向け）", "🕒 実行履歴"])
     
     with tab1:
         st.markdown(
@@ -857,6 +910,16 @@ def main():
             unsafe_allow_html=True,
         )
         display_card_view(filtered_df, key_prefix="card_view")
+    
+    with tab3:
+        st.markdown(
+            '<div class="section-card">'
+            '<h3>🕒 実行履歴</h3>'
+            '<p style="color: var(--text-muted); margin: 0; font-size: 0.9rem;">定期実行の各スクリプトの所要時間・一致率・エラー件数の推移です。直近が過去の中央値より遅い・一致率が下がったものに印が付きます。</p>'
+            '</div>',
+            unsafe_allow_html=True,
+        )
+        display_run_history()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+"""
+/api/cards の絞り込み・並び替え・ページング用インデックス。
+
+データセットのバージョンごとに一度だけ作り、各列を numpy 配列・カテゴリコードにしておく。
+リクエストごとの処理はマスクの論理積と、事前計算済みの並び順からの切り出しだけになる。
+"""
+import threading
+
+import numpy as np
+
+from search_index import SearchIndex
+
+# 鑑定費・利益率の定数（フロントの profitCalc.js / generate_filtered_csv.py と同一）
+GRADE_FEE_STANDARD = 3000
+GRADE_FEE_EXPRESS = 10000
+MIN_PROFIT_TO_SHOW = 5001
+EXPRESS_THRESHOLD = 30000
+
+# 並び替えキー → 行の値
+SORT_KEYS = ("net_profit", "profit", "profit_rate", "buy_price", "sell_price", "card_number")
+DEFAULT_SORT = "net_profit"
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+_KEYWORD_CACHE_SIZE = 256
+
+
+def calc_profit_info(profit: float, sell_price: float):
+    """
+    profitCalc.js の calcCardProfit と同一ロジック。
+    Returns: (鑑定費, 手取り利益, 利益率) または None（非表示対象の場合）
+    """
+    p = float(profit or 0)
+    if p < MIN_PROFIT_TO_SHOW:
+        return None
+    grading_fee = GRADE_FEE_EXPRESS if p >= EXPRESS_THRESHOLD else GRADE_FEE_STANDARD
+    net_profit = p - grading_fee
+    total_cost = float(sell_price or 0) + grading_fee
+    profit_rate = (net_profit / total_cost) * 100 if total_cost > 0 else 0
+    return grading_fee, net_profit, profit_rate
+
+
+def _categorize(values: list) -> tuple[np.ndarray, dict]:
+    """文字列の列をカテゴリコード配列と {値: コード} に変換"""
+    codes = {}
+    arr = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        arr[i] = codes.setdefault(v, len(codes))
+    return arr, codes
+
+
+def _sort_orders(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(昇順, 降順) の並び順。NaN はどちらでも末尾"""
+    if values.dtype == object:
+        asc = np.argsort(values, kind="stable")
+        return asc, asc[::-1].copy()
+    asc = np.argsort(values, kind="stable")
+    desc = np.argsort(-values, kind="stable")
+    return asc, desc
+
+
+class CardIndex:
+    """結合済みのカード行から作る列指向のインデックス"""
+
+    def __init__(self, rows: list, search: SearchIndex | None = None):
+        self.rows = rows
+        self.search = search if search is not None else SearchIndex(rows)
+        n = len(rows)
+        self.size = n
+
+        profit = np.zeros(n)
+        buy_price = np.zeros(n)
+        sell_price = np.zeros(n)
+        net_profit = np.full(n, np.nan)
+        profit_rate = np.full(n, np.nan)
+        in_stock = np.zeros(n, dtype=bool)
+        card_numbers = np.empty(n, dtype=object)
+        rarities = []
+        set_names = []
+        for i, row in enumerate(rows):
+            profit[i] = float(row.get("profit") or 0)
+            buy_price[i] = float(row.get("buy_price") or 0)
+            sell_price[i] = float(row.get("sell_price") or 0)
+            info = calc_profit_info(profit[i], sell_price[i])
+            if info is not None:
+                net_profit[i] = info[1]
+                profit_rate[i] = info[2]
+            in_stock[i] = "在庫あり" in (row.get("stock_normalized") or "")
+            card_numbers[i] = row.get("card_number") or ""
+            rarities.append(row.get("rarity") or "")
+            set_names.append(row.get("set_name") or "")
+
+        self.profit = profit
+        self.net_profit = net_profit
+        self.profit_rate = profit_rate
+        self.in_stock = in_stock
+        self.rarity_codes, self.rarity_map = _categorize(rarities)
+        self.set_codes, self.set_map = _categorize(set_names)
+        # 利益計算上の非表示対象（予想最大利益 5,000 円以下）はフロントと同じく除外
+        self.visible = ~np.isnan(net_profit)
+        self._keyword_masks: dict[str, np.ndarray] = {}
+        self._keyword_lock = threading.Lock()  # /api/cards はスレッドプールから同時に呼ばれる
+
+        columns = {
+            "net_profit": net_profit,
+            "profit": profit,
+            "profit_rate": profit_rate,
+            "buy_price": buy_price,
+            "sell_price": sell_price,
+            "card_number": card_numbers,
+        }
+        self.orders = {key: _sort_orders(columns[key]) for key in SORT_KEYS}
+
+    def _category_mask(self, codes: np.ndarray, mapping: dict, wanted: list[str]) -> np.ndarray:
+        wanted_codes = [mapping[v] for v in wanted if v in mapping]
+        if not wanted_codes:
+            return np.zeros(self.size, dtype=bool)
+        return np.isin(codes, wanted_codes)
+
+    def keyword_mask(self, keyword: str) -> np.ndarray:
+        """キーワードの部分一致マスク（n-gram インデックスで引く。直近のキーワードはキャッシュ。返すマスクは書き換えない）"""
+        kw = keyword.strip()
+        with self._keyword_lock:
+            mask = self._keyword_masks.get(kw)
+        if mask is not None:
+            return mask
+        mask = np.zeros(self.size, dtype=bool)
+        mask[self.search.match_ids(kw)] = True
+        with self._keyword_lock:
+            while len(self._keyword_masks) >= _KEYWORD_CACHE_SIZE:
+                self._keyword_masks.pop(next(iter(self._keyword_masks)))
+            self._keyword_masks[kw] = mask
+        return mask
+
+    def query(
+        self,
+        keyword: str | None = None,
+        min_profit: float | None = None,
+        min_profit_rate: float | None = None,
+        in_stock_only: bool = False,
+        rarities: list[str] | None = None,
+        set_names: list[str] | None = None,
+        sort: str = DEFAULT_SORT,
+        descending: bool = True,
+        offset: int = 0,
+        limit: int = DEFAULT_LIMIT,
+    ) -> tuple[list, int]:
+        """条件に合う行のうち offset から limit 件と、条件に合う総件数を返す"""
+        if sort not in self.orders:
+            raise ValueError(f"sort は {', '.join(SORT_KEYS)} のいずれかを指定してください")
+        mask = self.visible.copy()
+        if keyword and keyword.strip():
+            mask &= self.keyword_mask(keyword)
+        if min_profit is not None:
+            mask &= self.profit >= min_profit
+        if min_profit_rate is not None:
+            mask &= self.profit_rate >= min_profit_rate
+        if in_stock_only:
+            mask &= self.in_stock
+        if rarities:
+            mask &= self._category_mask(self.rarity_codes, self.rarity_map, rarities)
+        if set_names:
+            mask &= self._category_mask(self.set_codes, self.set_map, set_names)
+
+        asc, desc = self.orders[sort]
+        order = desc if descending else asc
+        matched = order[mask[order]]
+        page = matched[offset : offset + limit]
+        return [self.rows[i] for i in page], int(matched.size)
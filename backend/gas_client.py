@@ -0,0 +1,103 @@
+"""
+PSA9 相場 GAS（scripts/gas/psa9_stats_api.gs）の非同期クライアント。
+
+1 本の httpx.AsyncClient（コネクションプール）を使い回し、20 件ずつのバッチを
+同時実行数の上限つきで並行に投げる。バッチごとに指数バックオフで再試行し、
+失敗したバッチがあっても成功したバッチの結果は返す。
+"""
+import asyncio
+
+import httpx
+
+BATCH_SIZE = 20
+DEFAULT_CONCURRENCY = 3
+DEFAULT_TIMEOUT_SEC = 120
+DEFAULT_RETRIES = 2  # 初回 + 再試行 2 回
+RETRY_BASE_DELAY_SEC = 1.0
+
+
+def to_gas_card(c: dict) -> dict:
+    """フロントのカード形式 → GAS の入力形式"""
+    return {
+        "id": c.get("id") or c.get("card_number") or "",
+        "cardName": c.get("card_name") or c.get("cardName") or "",
+        "cardNum": c.get("card_number") or c.get("cardNum") or "",
+        "rarity": c.get("rarity") or "",
+    }
+
+
+class GasBatchError(Exception):
+    """再試行しても 1 バッチの取得に失敗した"""
+
+    def __init__(self, batch_index: int, ids: list, cause: Exception):
+        super().__init__(str(cause))
+        self.batch_index = batch_index
+        self.ids = ids
+        self.cause = cause
+
+
+class GasClient:
+    def __init__(
+        self,
+        url: str,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT_SEC,
+        retries: int = DEFAULT_RETRIES,
+        batch_size: int = BATCH_SIZE,
+    ):
+        self.url = url
+        self.retries = retries
+        self.batch_size = batch_size
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            follow_redirects=True,  # GAS のウェブアプリは script.googleusercontent.com へリダイレクトする
+            limits=httpx.Limits(max_connections=max(1, concurrency), max_keepalive_connections=max(1, concurrency)),
+            headers={"Content-Type": "application/json"},
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _post_batch(self, batch_index: int, batch: list) -> list:
+        payload = {"cards": [to_gas_card(c) for c in batch]}
+        ids = [c["id"] for c in payload["cards"]]
+        last_error: Exception | None = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(RETRY_BASE_DELAY_SEC * (2 ** (attempt - 1)))
+            try:
+                async with self._semaphore:
+                    r = await self._client.post(self.url, json=payload)
+                r.raise_for_status()
+                data = r.json()
+                results = data.get("results", []) if isinstance(data, dict) else []
+                # GAS が id を返さない場合は送信した順番で id を補う
+                for j, res in enumerate(results):
+                    if isinstance(res, dict) and not res.get("id") and j < len(ids):
+                        res["id"] = ids[j]
+                return results
+            except (httpx.HTTPError, ValueError) as e:
+                last_error = e
+        raise GasBatchError(batch_index, ids, last_error)
+
+    async def fetch(self, cards: list) -> tuple[list, list]:
+        """
+        cards をバッチに分けて並行取得する。
+        Returns: (送信順に並べた results, 失敗したバッチの GasBatchError リスト)
+        """
+        batches = [cards[i : i + self.batch_size] for i in range(0, len(cards), self.batch_size)]
+        outcomes = await asyncio.gather(
+            *(self._post_batch(n, b) for n, b in enumerate(batches)),
+            return_exceptions=True,
+        )
+        results = []
+        errors = []
+        for outcome in outcomes:
+            if isinstance(outcome, GasBatchError):
+                errors.append(outcome)
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results.extend(outcome)
+        return results, errors
@@ -1,11 +1,43 @@
+import gzip
+import hashlib
 import json
 import os
+import sys
+import threading
+import time
+from datetime import datetime
 
 import pandas as pd
-import requests
-from fastapi import Body, FastAPI, HTTPException
+from fastapi import Body, FastAPI, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 
+# backend/ 直下とプロジェクトルートのモジュールを import できるように（uvicorn backend.main:app / main:app の両方で動かす）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import card_snapshot
+import profiling
+import run_history
+from card_identity import identify, index_links, row_id
+from card_index import DEFAULT_LIMIT, DEFAULT_SORT, MAX_LIMIT, CardIndex
+from gas_client import DEFAULT_CONCURRENCY, GasClient
+from psa9_cache import DEFAULT_TTL_SEC, Psa9Cache
+from psa9_index import Psa9Index
+from psa9_store import Psa9Store
+from search_index import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, SearchIndex
+from yahoo_client import YahooClient
+
+# 高速 JSON エンコーダ・brotli は任意（未インストールなら標準 json / gzip のみ）
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 app = FastAPI()
 
 app.add_middleware(
@@ -14,8 +46,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# PIPELINE_PROFILE を指定して起動したときだけ、リクエストごとの所要時間を stage として記録する（profiling.py。終了時に profiles/ へ書き出す）
+# リクエストは同時に走るので所要時間だけ（メモリのスナップショットは load_dataset などの stage だけで取る）
+profiling.setup("backend", argv=[])
+if profiling.enabled():
+    @app.middleware("http")
+    async def _profile_requests(request: Request, call_next):
+        with profiling.stage(f"{request.method} {request.url.path}", timing_only=True):
+            return await call_next(request)
+
 # プロジェクトルートの CSV とリンクマッピングを参照
 # CARD_CSV で "filtered_cards.csv" を指定すると定期更新される filtered_cards を表示対象にできる
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -24,7 +66,15 @@ CSV_PATH = os.path.join(BASE_DIR, _DEFAULT_CSV)
 POKECA_LINKS_PATH = os.path.join(BASE_DIR, "pokeca_chart_links.json")
 EBAY_LINKS_PATH = os.path.join(BASE_DIR, "ebay_links.json")
 PSA9_STATS_PATH = os.path.join(BASE_DIR, "psa9_stats.json")
+PSA9_LOG_PATH = os.path.join(BASE_DIR, "psa9_stats.log.jsonl")
+RUN_HISTORY_PATH = run_history.history_path()
+# /api/psa9-stats の取得元: yahoo（psa9_collector.py でヤフオクを直接検索。デフォルト）か gas（GAS_PSA9_API_URL）
+PSA9_SOURCE = os.environ.get("PSA9_SOURCE", "yahoo").strip().lower() or "yahoo"
 GAS_PSA9_API_URL = os.environ.get("GAS_PSA9_API_URL", "")
+# バッチの同時実行数（Apps Script の同時実行上限・ヤフオクへの負荷に合わせて小さめ）
+GAS_CONCURRENCY = int(os.environ.get("GAS_CONCURRENCY", str(DEFAULT_CONCURRENCY)))
+# /api/psa9-stats のキャッシュ有効期間（秒）。psa9_stats.json の相場もこの期間内なら GAS を呼ばない
+PSA9_CACHE_TTL_SEC = float(os.environ.get("PSA9_CACHE_TTL_SEC", str(DEFAULT_TTL_SEC)))
 
 
 def load_pokeca_links() -> dict:
@@ -49,15 +99,12 @@ def load_ebay_links() -> dict:
         return {}
 
 
+_psa9_store = Psa9Store(PSA9_STATS_PATH, PSA9_LOG_PATH)
+
+
 def load_psa9_stats() -> dict:
-    """psa9_stats.json（定期バッチで更新）を読み込み"""
-    if not os.path.exists(PSA9_STATS_PATH):
-        return {}
-    try:
-        with open(PSA9_STATS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return {}
+    """psa9_stats.json（定期バッチで更新）に追記ログの最新値を重ねて読み込み"""
+    return _psa9_store.load_all()
 
 
 def normalize_stock_status(stock_status):
@@ -108,135 +155,363 @@ def calculate_profit(row):
         return 0
 
 
-@app.get("/api/cards")
-def get_cards():
+def _build_rows(df, identities: list, pokeca_links: dict, ebay_links: dict, psa9_index: Psa9Index) -> list:
+    """
+    CSV の DataFrame と各リンク・PSA9 相場を結合し、/api/cards の行リストを作る。
+    identities は df と同じ順の card_identity.identify の結果、リンクは index_links で正規のキーに読み替え済み
+    """
+    processed_data = []
+    for (i, row), ident in zip(df.iterrows(), identities):
+        profit = calculate_profit(row)
+        stock_norm = normalize_stock_status(row.get("ラッシュ在庫状況"))
+        composite_key = ident.key
+
+        buy_val = row.get("買取金額", 0)
+        sell_val = row.get("ラッシュ販売価格", 0)
+        item = {
+            "id": row_id(row.get("No", ""), row.get("card_number", ""), i),
+            "no": row.get("No"),
+            "card_name": ident.card_name,
+            "card_number": ident.card_number,
+            "rarity": (row.get("レア") or "").strip() if pd.notna(row.get("レア")) else "",
+            "set_name": str(row.get("弾")).strip() if pd.notna(row.get("弾")) else "",
+            "buy_price": _safe_float(buy_val),
+            "sell_price": _safe_float(sell_val),
+            "stock_original": row.get("ラッシュ在庫状況"),
+            "stock_normalized": stock_norm,
+            "image_url": row.get("画像URL") if pd.notna(row.get("画像URL")) and str(row.get("画像URL")).strip() and str(row.get("画像URL")) != "取得失敗" else None,
+            "profit": profit,
+            "pokeca_chart_url": pokeca_links.get(composite_key),
+            "ebay_sold_url": ebay_links.get(composite_key),
+        }
+        # 定期バッチで取得済みの PSA9 相場をマージ
+        psa9 = psa9_index.resolve(composite_key)
+        if psa9 is not None:
+            item["psa9Stats"] = psa9
+        processed_data.append(item)
+    return processed_data
+
+
+# ---------------------------------------------------------------------------
+# /api/cards 用のデータセットキャッシュ
+# CSV・リンク JSON・psa9_stats.json を毎リクエスト読み直すのは重いので、
+# 結合済みの行リストをメモリに保持し、元ファイルの mtime / サイズが変わったときだけ作り直す。
+# ---------------------------------------------------------------------------
+_DATASET_SOURCES = (CSV_PATH, card_snapshot.snapshot_path(CSV_PATH), POKECA_LINKS_PATH, EBAY_LINKS_PATH, PSA9_STATS_PATH, PSA9_LOG_PATH)
+
+
+def _dumps(obj) -> bytes:
+    """JSON を bytes で返す（orjson があれば使う）"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class EncodedPayload:
+    """
+    レスポンス本文を一度だけ JSON 化・圧縮して保持する。
+    ETag は本文のハッシュ。圧縮版は表現が異なるので接尾辞を付けて区別する。
+    """
+
+    def __init__(self, obj):
+        self.identity = _dumps(obj)
+        digest = hashlib.sha256(self.identity).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip = gzip.compress(self.identity, compresslevel=9)
+        self.br = brotli.compress(self.identity, quality=11) if brotli is not None else None
+        self._etags = {self.etag, f'"{digest}-gzip"', f'"{digest}-br"'}
+
+    def matches(self, if_none_match: str) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag in self._etags:
+                return True
+        return False
+
+    def select(self, accept_encoding: str) -> tuple[bytes, str | None, str]:
+        """Accept-Encoding から (本文, Content-Encoding, ETag) を選ぶ"""
+        accepted = set()
+        for part in (accept_encoding or "").lower().split(","):
+            name, _, params = part.strip().partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(name.strip())
+        digest = self.etag.strip('"')
+        if self.br is not None and "br" in accepted:
+            return self.br, "br", f'"{digest}-br"'
+        if "gzip" in accepted:
+            return self.gzip, "gzip", f'"{digest}-gzip"'
+        return self.identity, None, self.etag
+
+
+def _payload_response(request: Request, payload: EncodedPayload) -> Response:
+    """事前エンコード済みの本文を返す。If-None-Match が一致すれば 304"""
+    body, encoding, etag = payload.select(request.headers.get("accept-encoding", ""))
+    headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if payload.matches(request.headers.get("if-none-match", "")):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class CardDataset:
+    """結合済みのカード行と、その元になったファイルのシグネチャ"""
+
+    def __init__(self, rows: list, signature: tuple, psa9_index: Psa9Index):
+        self.rows = rows
+        self.signature = signature
+        self.psa9_index = psa9_index
+        self.version = hashlib.sha1(repr(signature).encode("utf-8")).hexdigest()[:16]
+        self.built_at = time.time()
+        # 全件レスポンスはバージョンごとに一度だけ JSON 化・圧縮する
+        self.payload = EncodedPayload(rows)
+        # キーワード検索用の n-gram インデックスと、絞り込み・並び替え用の列インデックス
+        self.search = SearchIndex(rows)
+        self.index = CardIndex(rows, self.search)
+
+
+_dataset: CardDataset | None = None
+_dataset_lock = threading.Lock()
+
+
+def _source_signature() -> tuple:
+    """元ファイルごとの (mtime_ns, size)。存在しないファイルは None"""
+    sig = []
+    for path in _DATASET_SOURCES:
+        try:
+            st = os.stat(path)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def _load_dataset(signature: tuple) -> CardDataset:
     if not os.path.exists(CSV_PATH):
         raise HTTPException(status_code=500, detail=f"CSV not found: {CSV_PATH}")
     try:
-        df = pd.read_csv(CSV_PATH, encoding="utf-8-sig")
+        # 型付きスナップショット（.parquet）が CSV と一致していればそちらを読む
+        df = card_snapshot.read_cards(CSV_PATH)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"CSV read error: {e}")
 
-    pokeca_links = load_pokeca_links()
-    ebay_links = load_ebay_links()
-    psa9_stats = load_psa9_stats()
-    if not isinstance(psa9_stats, dict):
-        psa9_stats = {}
-
-    # NOTE:
-    # 旧仕様では psa9_stats.json のキーが「No_card_number_rowIndex」のように行インデックス依存になっており、
-    # CSV の読み込み元（merged/filtered）や並びが変わると card.id と一致しなくなる。
-    # そこで「No_card_number」までの prefix で候補を集め、データが揃っている方を優先して紐付ける。
-    underscore_prefix_map = {}
-
-    for k, v in psa9_stats.items():
-        if not isinstance(k, str):
-            continue
-        if "|" in k:
-            continue
-        # 例: "173/086_173/086_37" -> prefix: "173/086_173/086"
-        parts = k.split("_")
-        if len(parts) < 3:
-            continue
-        prefix = f"{parts[0]}_{parts[1]}"
-        underscore_prefix_map.setdefault(prefix, []).append(v)
-
-    def _psa9_score(psa9: dict) -> int:
-        """候補の中から「よりデータが揃っているもの」を優先するスコア。"""
-        if not isinstance(psa9, dict):
-            return -10**9
-        if psa9.get("error"):
-            return -10**6
-        recent_urls = []
-        for key in ("recent1", "recent2", "recent3"):
-            r = psa9.get(key) or {}
-            recent_urls.append(r.get("url"))
-        has_recent = any(u for u in recent_urls if isinstance(u, str) and u.strip())
-        yahoo_avg = psa9.get("yahooAvg")
-        has_hist = psa9.get("hasHistory") is True
-
-        score = 0
-        if has_recent:
-            score += 100
-        if yahoo_avg is not None:
-            score += 20
-        if has_hist:
-            score += 5
-        return score
+    # 型番・カード名・キーは行ごとに一度だけ作り、結合はすべてこのキーで引く
+    identities = identify((row for _, row in df.iterrows()), default_name="不明")
+    pokeca_links = index_links(load_pokeca_links(), identities)
+    ebay_links = index_links(load_ebay_links(), identities)
+    psa9_index = Psa9Index(load_psa9_stats())
 
     try:
-        processed_data = []
-        for i, row in df.iterrows():
-            profit = calculate_profit(row)
-            stock_norm = normalize_stock_status(row.get("ラッシュ在庫状況"))
-            card_number = (row.get("card_number", "") or row.get("No", "") or "").strip()
-            card_name = (row.get("カード名") or "不明").strip()
-            composite_key = f"{card_number}|{card_name}" if card_number and card_name else None
-            pokeca_url = None
-            if composite_key and composite_key in pokeca_links:
-                pokeca_url = pokeca_links[composite_key]
-            elif card_number and card_number in pokeca_links:
-                pokeca_url = pokeca_links[card_number]
-            ebay_sold_url = None
-            if composite_key and composite_key in ebay_links:
-                ebay_sold_url = ebay_links[composite_key]
-            elif card_number and card_number in ebay_links:
-                ebay_sold_url = ebay_links[card_number]
-
-            buy_val = row.get("買取金額", 0)
-            sell_val = row.get("ラッシュ販売価格", 0)
-            card_id = f"{row.get('No', '')}_{row.get('card_number', '')}_{i}"
-            item = {
-                "id": card_id,
-                "no": row.get("No"),
-                "card_name": card_name,
-                "card_number": card_number,
-                "rarity": (row.get("レア") or "").strip() if pd.notna(row.get("レア")) else "",
-            "buy_price": _safe_float(buy_val),
-            "sell_price": _safe_float(sell_val),
-                "stock_original": row.get("ラッシュ在庫状況"),
-                "stock_normalized": stock_norm,
-                "image_url": row.get("画像URL") if pd.notna(row.get("画像URL")) and str(row.get("画像URL")).strip() and str(row.get("画像URL")) != "取得失敗" else None,
-                "profit": profit,
-                "pokeca_chart_url": pokeca_url,
-                "ebay_sold_url": ebay_sold_url,
-            }
-            # 定期バッチで取得済みの PSA9 相場をマージ（composite_key 優先、旧形式の card_id も互換で参照）
-            psa9 = psa9_stats.get(composite_key) if composite_key else None
-            if psa9 is None:
-                psa9 = psa9_stats.get(card_id)
-
-            # それでも見つからない場合（CSVの行インデックスがズレている旧キー）、
-            # prefix（No_card_number）で最良候補を選ぶ。
-            if psa9 is None:
-                no_val = str(row.get("No", "") or "").strip()
-                cn_val = (row.get("card_number") or row.get("No") or "").strip()
-                if no_val and cn_val:
-                    prefix = f"{no_val}_{cn_val}"
-                    candidates = underscore_prefix_map.get(prefix) or []
-                    if candidates:
-                        psa9 = max(candidates, key=_psa9_score)
-            if psa9 is not None:
-                item["psa9Stats"] = psa9
-            processed_data.append(item)
-
-        return processed_data
-    except HTTPException:
-        raise
+        rows = _build_rows(df, identities, pokeca_links, ebay_links, psa9_index)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"/api/cards error: {e}")
+    return CardDataset(rows, signature, psa9_index)
+
+
+def get_dataset() -> CardDataset:
+    """
+    キャッシュ済みのデータセットを返す。元ファイルが変わっていれば作り直す。
+    作り直し中に来た他のリクエストはロックで待たせ、1回の読み込み結果を共有する。
+    """
+    global _dataset
+    signature = _source_signature()
+    current = _dataset
+    if current is not None and current.signature == signature:
+        return current
+    with _dataset_lock:
+        # ロック待ちの間に別スレッドが作り直していればそれを使う
+        signature = _source_signature()
+        if _dataset is not None and _dataset.signature == signature:
+            return _dataset
+        with profiling.stage("load_dataset"):
+            _dataset = _load_dataset(signature)
+        return _dataset
+
+
+@app.on_event("startup")
+def _warm_dataset_cache():
+    """起動時にデータセットを読み込んでおき、最初のリクエストを待たせない"""
+    try:
+        get_dataset()
+    except HTTPException as e:
+        print(f"警告: /api/cards のキャッシュ作成に失敗しました: {e.detail}")
+
+
+def _split_param(value: str | None) -> list[str]:
+    """カンマ区切りのクエリパラメータをリストに"""
+    if not value:
+        return []
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+@app.get("/api/cards")
+def get_cards(
+    request: Request,
+    keyword: str | None = None,
+    min_profit: float | None = None,
+    min_profit_rate: float | None = None,
+    in_stock_only: bool = False,
+    rarity: str | None = None,
+    set_name: str | None = Query(default=None, alias="set"),
+    sort: str = DEFAULT_SORT,
+    order: str = "desc",
+    cursor: str | None = None,
+    limit: int = Query(default=DEFAULT_LIMIT, ge=1, le=MAX_LIMIT),
+):
+    """
+    クエリパラメータなし: 全件（事前エンコード済み・ETag 付き）を返す。
+    クエリパラメータあり: サーバー側で絞り込み・並び替えを行い、1ページ分だけ返す。
+      keyword, min_profit, min_profit_rate, in_stock_only, rarity / set（カンマ区切りで複数可）,
+      sort（net_profit / profit / profit_rate / buy_price / sell_price / card_number）, order（asc / desc）,
+      cursor（前回レスポンスの next_cursor）, limit
+    """
+    dataset = get_dataset()
+    if not request.query_params:
+        return _payload_response(request, dataset.payload)
+
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order は asc か desc を指定してください")
+    try:
+        offset = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="cursor が不正です")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="cursor が不正です")
+    try:
+        items, total = dataset.index.query(
+            keyword=keyword,
+            min_profit=min_profit,
+            min_profit_rate=min_profit_rate,
+            in_stock_only=in_stock_only,
+            rarities=_split_param(rarity),
+            set_names=_split_param(set_name),
+            sort=sort,
+            descending=order == "desc",
+            offset=offset,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    next_offset = offset + len(items)
+    body = {
+        "items": items,
+        "total": total,
+        "next_cursor": str(next_offset) if next_offset < total else None,
+        "version": dataset.version,
+    }
+    return Response(content=_dumps(body), media_type="application/json")
+
+
+@app.get("/api/search")
+def search_cards(
+    q: str = "",
+    limit: int = Query(default=DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+):
+    """
+    カード名・型番・No のキーワード検索（全角/半角・ひらがな/カタカナの違いを吸収）。
+    完全一致 > 前方一致 > 部分一致 > あいまい一致 の順に並べて返す。
+    """
+    dataset = get_dataset()
+    hits = dataset.search.search(q, limit=limit)
+    body = {
+        "query": q,
+        "results": [dict(dataset.rows[i], score=round(score, 3)) for i, score in hits],
+        "version": dataset.version,
+    }
+    return Response(content=_dumps(body), media_type="application/json")
+
+
+@app.get("/api/run-history")
+def get_run_history(
+    entry: str | None = None,
+    days: float = Query(default=90, gt=0, le=3650),
+    limit: int = Query(default=200, ge=1, le=5000),
+):
+    """
+    パイプラインの実行履歴（run_history.jsonl）。
+    records は期間内の記録（新しい順・最大 limit 件）、summary は入口ごとの直近の実行と過去の中央値の比較
+    （slower: 遅くなった / match_dropped: 一致率が下がった）、weekly は入口・週ごとの集計。
+    """
+    records = run_history.load(RUN_HISTORY_PATH, entry=entry, days=days)
+    body = {
+        "records": records[::-1][:limit],
+        "summary": run_history.summarize(records),
+        "weekly": run_history.weekly(records),
+    }
+    return Response(content=_dumps(body), media_type="application/json")
+
+
+_psa9_client: GasClient | YahooClient | None = None
+_psa9_cache: Psa9Cache | None = None
+
+
+def _parse_fetched_at(value) -> float | None:
+    """psa9_stats.json の fetchedAt（ISO 8601）を UNIX 秒に"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+def _stored_psa9(key: str, card: dict):
+    """psa9_stats.json 側の (相場, 取得時刻)。fetchedAt が無い旧エントリはファイルの更新時刻を使う"""
+    dataset = _dataset
+    if dataset is None:
+        return None
+    stats = dataset.psa9_index.resolve(key)
+    if not isinstance(stats, dict) or stats.get("error"):
+        return None
+    fetched_at = _parse_fetched_at(stats.get("fetchedAt"))
+    if fetched_at is None:
+        sig = dataset.signature[_DATASET_SOURCES.index(PSA9_STATS_PATH)]
+        if sig is None:
+            return None
+        fetched_at = sig[0] / 1e9
+    return stats, fetched_at
+
+
+@app.on_event("startup")
+async def _open_psa9_client():
+    global _psa9_client, _psa9_cache
+    if PSA9_SOURCE == "gas":
+        if GAS_PSA9_API_URL:
+            _psa9_client = GasClient(GAS_PSA9_API_URL, concurrency=GAS_CONCURRENCY)
+    else:
+        _psa9_client = YahooClient(concurrency=GAS_CONCURRENCY)
+    if _psa9_client is not None:
+        _psa9_cache = Psa9Cache(_psa9_client, _stored_psa9, ttl_sec=PSA9_CACHE_TTL_SEC)
+
+
+@app.on_event("shutdown")
+async def _close_psa9_client():
+    if _psa9_client is not None:
+        await _psa9_client.aclose()
+    profiling.finish()
 
 
 @app.post("/api/psa9-stats")
-def fetch_psa9_stats(body: dict = Body(default=None)):
+async def fetch_psa9_stats(body: dict = Body(default=None)):
     """
     POST body: { "cards": [ { "id", "card_name", "card_number", "rarity", ... } ] }
-    GAS に 20件ずつバッチで投げて、ヤフオク相場・メルカリリンクを取得して返す。
+    composite_key ごとにキャッシュ（メモリ・psa9_stats.json）を引き、TTL 切れ・未取得のカードだけ
+    20件ずつのバッチを並行で取得元（PSA9_SOURCE: ヤフオク直接 / GAS）に投げて、ヤフオク相場・メルカリリンクを取得して返す。
+    各結果には cacheHit（取得元を呼ばずにキャッシュから返したか）、coalesced（別リクエストが取得中の
+    結果を共有したか）と ageSec（相場の取得からの経過秒）が付く。
+    取得に失敗したカードは error 付きで返す（全件失敗時のみ 502）。
     """
-    if not GAS_PSA9_API_URL:
+    if _psa9_cache is None:
         raise HTTPException(
             status_code=500,
-            detail="GAS_PSA9_API_URL が未設定です。環境変数を設定してください。",
+            detail="PSA9_SOURCE=gas ですが GAS_PSA9_API_URL が未設定です。環境変数を設定してください。",
         )
     cards = (body or {}).get("cards", [])
     if not isinstance(cards, list):
@@ -246,41 +521,15 @@ def fetch_psa9_stats(body: dict = Body(default=None)):
     if len(cards) > 100:
         raise HTTPException(status_code=400, detail="1回あたり100件までにしてください")
 
-    batch_size = 20
-    all_results = []
-    for i in range(0, len(cards), batch_size):
-        batch = cards[i : i + batch_size]
-        gas_payload = {
-            "cards": [
-                {
-                    "id": c.get("id") or c.get("card_number") or "",
-                    "cardName": c.get("card_name") or c.get("cardName") or "",
-                    "cardNum": c.get("card_number") or c.get("cardNum") or "",
-                    "rarity": c.get("rarity") or "",
-                }
-                for c in batch
-            ]
-        }
-        try:
-            r = requests.post(
-                GAS_PSA9_API_URL,
-                json=gas_payload,
-                headers={"Content-Type": "application/json"},
-                timeout=120,
-            )
-            r.raise_for_status()
-            data = r.json()
-            results = data.get("results", [])
-            all_results.extend(results)
-        except requests.RequestException as e:
-            raise HTTPException(
-                status_code=502,
-                detail=f"GAS API 呼び出しに失敗しました: {str(e)}",
-            )
-        except json.JSONDecodeError as e:
-            raise HTTPException(
-                status_code=502,
-                detail=f"GAS API の応答が不正です: {str(e)}",
-            )
-
-    return {"results": all_results}
+    # psa9_stats.json の更新を反映（作り直しはスレッドで行い、イベントループを止めない）
+    try:
+        await run_in_threadpool(get_dataset)
+    except HTTPException:
+        pass
+    results = await _psa9_cache.get_many(cards)
+    if all(r["ageSec"] is None for r in results):
+        raise HTTPException(
+            status_code=502,
+            detail=f"PSA9 相場の取得に失敗しました（{PSA9_SOURCE}）: {results[0].get('error')}",
+        )
+    return {"results": results}
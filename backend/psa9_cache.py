@@ -0,0 +1,149 @@
+"""
+/api/psa9-stats の読み込みスルーキャッシュ。
+
+キーは composite_key（card_number|カード名）。次の順に探し、TTL 内なら GAS を呼ばない。
+  1. このプロセスで GAS から取得した結果（メモリ）
+  2. refresh_psa9_stats.py が保存した psa9_stats.json（データセット経由）
+キャッシュにないカードだけをまとめて GAS に投げる。同じキーを取得中の別リクエストは
+その取得結果（asyncio.Future）を待って共有し、GAS を二重に呼ばない（cacheHit ではなく coalesced として返す）。
+取得したリクエストがキャンセルされた（クライアントの切断など）ときも、待っている側には error 付きの結果を入れる。
+"""
+import asyncio
+import time
+
+from card_identity import canonical_key, clean
+from gas_client import GasClient
+
+DEFAULT_TTL_SEC = 24 * 60 * 60
+MAX_ENTRIES = 5000
+# GAS の応答のうち相場として保存する項目（refresh_psa9_stats.py と同一）
+STATS_FIELDS = ("yahooAvg", "yahooMedian", "recent1", "recent2", "recent3", "mercariUrl", "hasHistory", "error")
+
+
+def cache_key(card: dict) -> str:
+    """composite_key（card_number|カード名）。どちらかが無ければ id"""
+    cn = card.get("card_number") or card.get("cardNum")
+    key = canonical_key(cn, card.get("card_name") or card.get("cardName"))
+    return key or str(card.get("id") or clean(cn))
+
+
+class Psa9Cache:
+    def __init__(self, client: GasClient, stored_lookup, ttl_sec: float = DEFAULT_TTL_SEC):
+        """
+        stored_lookup(key, card) -> (stats, fetched_at) | None
+          psa9_stats.json 側の相場と取得時刻（UNIX 秒）を返す関数
+        """
+        self.client = client
+        self.stored_lookup = stored_lookup
+        self.ttl_sec = ttl_sec
+        self._entries: dict[str, tuple[dict, float]] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _lookup(self, key: str, card: dict, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self.stored_lookup(key, card)
+        if entry is None:
+            return None
+        stats, fetched_at = entry
+        if now - fetched_at > self.ttl_sec:
+            return None
+        return entry
+
+    def _store(self, key: str, stats: dict, fetched_at: float):
+        if len(self._entries) >= MAX_ENTRIES:
+            # 期限切れを捨て、それでも多ければ古い順に捨てる
+            cutoff = fetched_at - self.ttl_sec
+            self._entries = {k: v for k, v in self._entries.items() if v[1] >= cutoff}
+            while len(self._entries) >= MAX_ENTRIES:
+                self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (stats, fetched_at)
+
+    async def _fetch_misses(self, misses: dict[str, dict], futures: dict[str, asyncio.Future]):
+        """キャッシュにないカードを GAS から取得し、各キーの Future に結果を入れる"""
+        try:
+            gas_cards = [
+                {
+                    "id": key,
+                    "card_name": card.get("card_name") or card.get("cardName") or "",
+                    "card_number": card.get("card_number") or card.get("cardNum") or "",
+                    "rarity": card.get("rarity") or "",
+                }
+                for key, card in misses.items()
+            ]
+            results, errors = await self.client.fetch(gas_cards)
+            fetched_at = time.time()
+            by_key = {r.get("id"): r for r in results if isinstance(r, dict)}
+            failed = {}
+            for e in errors:
+                for key in e.ids:
+                    failed[key] = str(e)
+            for key, fut in futures.items():
+                r = by_key.get(key)
+                if r is not None:
+                    stats = {f: r.get(f) for f in STATS_FIELDS}
+                    if not stats.get("error"):
+                        self._store(key, stats, fetched_at)
+                    fut.set_result((stats, fetched_at))
+                else:
+                    error = failed.get(key, "GAS の応答に結果がありません")
+                    fut.set_result(({"error": error}, None))
+        except Exception as e:
+            for fut in futures.values():
+                if not fut.done():
+                    fut.set_result(({"error": str(e)}, None))
+        finally:
+            # キャンセル（BaseException）で抜けたときも、待っている他のリクエストを止めたままにしない
+            for key, fut in futures.items():
+                if not fut.done():
+                    fut.set_result(({"error": "GAS からの取得が中断されました"}, None))
+                self._inflight.pop(key, None)
+
+    async def get_many(self, cards: list) -> list:
+        """
+        cards の順に結果を返す。各結果には次が付く。
+          cacheHit:  GAS を呼ばずにキャッシュから返したか（取得失敗の結果は常に False）
+          coalesced: 別のリクエストが取得中だった GAS の呼び出しの結果を共有したか
+          ageSec:    相場の取得からの経過秒（取得失敗時は None）
+        """
+        now = time.time()
+        loop = asyncio.get_running_loop()
+        keys = [cache_key(c) for c in cards]
+        resolved: dict[str, tuple] = {}
+        waiting: dict[str, asyncio.Future] = {}
+        misses: dict[str, dict] = {}
+        new_futures: dict[str, asyncio.Future] = {}
+        for key, card in zip(keys, cards):
+            if key in resolved or key in waiting or key in misses:
+                continue
+            entry = self._lookup(key, card, now)
+            if entry is not None:
+                resolved[key] = (entry[0], entry[1], True, False)
+            elif key in self._inflight:
+                waiting[key] = self._inflight[key]
+            else:
+                misses[key] = card
+                fut = loop.create_future()
+                new_futures[key] = fut
+                self._inflight[key] = fut
+
+        if misses:
+            await self._fetch_misses(misses, new_futures)
+            waiting.update(new_futures)
+        for key, fut in waiting.items():
+            # shield: このリクエストがキャンセルされても、共有している Future はキャンセルしない
+            stats, fetched_at = await asyncio.shield(fut)
+            resolved[key] = (stats, fetched_at, False, key not in new_futures)
+
+        results = []
+        done = time.time()
+        for key, card in zip(keys, cards):
+            stats, fetched_at, hit, coalesced = resolved[key]
+            item = dict(stats)
+            item["id"] = card.get("id") or key
+            item["key"] = key
+            item["cacheHit"] = hit and not stats.get("error")
+            item["coalesced"] = coalesced
+            item["ageSec"] = round(done - fetched_at, 1) if fetched_at is not None else None
+            results.append(item)
+        return results
@@ -0,0 +1,40 @@
+"""
+psa9_stats.json とカード行の結合用インデックス。
+
+psa9_stats.json のキーは composite_key（card_number|カード名）に統一されている（psa9_store.py migrate で移行済み）。
+行ごとの照合は dict を一度引くだけ。移行前の旧キー「No_card_number_rowIndex」が残っていても読み替えず
+（そのカードは相場なしになる）、プロセスごとに一度だけ移行を促す警告をログに出す。
+"""
+import logging
+import os
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+from psa9_store import is_legacy_key, psa9_score  # noqa: E402,F401
+
+logger = logging.getLogger(__name__)
+_legacy_warned = False
+
+
+class Psa9Index:
+    """composite_key → 相場"""
+
+    def __init__(self, psa9_stats: dict):
+        global _legacy_warned
+        self.stats = psa9_stats if isinstance(psa9_stats, dict) else {}
+        if not _legacy_warned:
+            legacy = sum(1 for k in self.stats if is_legacy_key(k))
+            if legacy:
+                _legacy_warned = True
+                logger.warning(
+                    "psa9_stats に旧形式のキーが %d 件あります（照合されません）。python psa9_store.py migrate で移行してください",
+                    legacy,
+                )
+
+    def resolve(self, composite_key: str | None):
+        if not composite_key:
+            return None
+        return self.stats.get(composite_key)
@@ -0,0 +1,131 @@
+"""
+カード検索用の n-gram 転置インデックス。
+
+カード名・型番・No を正規化（全角/半角・ひらがな/カタカナ・大文字/小文字の統一、装飾記号の除去）
+したうえで 2-gram（1 文字は 1-gram）に分解し、gram → 行番号の転置リストを作る。
+検索時はクエリの gram の転置リストを積集合して候補を絞り、部分一致を確認してから順位付けする。
+"""
+import re
+import unicodedata
+
+# scrape_rush._normalize_card_name と同じ装飾記号（括弧の中身は検索対象に残す）
+_DECORATION_RE = re.compile(r"[【】\[\]（）\(\)「」『』<>＜＞:：・、，,\s☆★]")
+_NGRAM = 2
+# 全 gram が一致する候補がないとき、この割合以上の gram を含む行をあいまい一致として返す
+_FUZZY_MIN_RATIO = 0.6
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+
+# 小書きカタカナ → 通常のカタカナ（ピカチュウ / ピカチユウ の入力ゆれ用）
+_SMALL_KANA = str.maketrans("ァィゥェォッャュョヮヵヶ", "アイウエオツヤユヨワカケ")
+
+
+def _hiragana_to_katakana(s: str) -> str:
+    return "".join(chr(ord(c) + 0x60) if "ぁ" <= c <= "ゖ" else c for c in s)
+
+
+def normalize_text(text) -> str:
+    """
+    検索用の正規化。
+    - NFKC で全角英数字・半角カタカナを統一（ｅｘ→ex、ｶﾞ→ガ）
+    - ひらがな→カタカナ、小書き文字→通常の文字
+    - 装飾記号・空白の削除、小文字化
+    """
+    if text is None:
+        return ""
+    s = unicodedata.normalize("NFKC", str(text))
+    s = _hiragana_to_katakana(s).translate(_SMALL_KANA)
+    s = _DECORATION_RE.sub("", s)
+    return s.lower()
+
+
+def _grams(s: str) -> set[str]:
+    if len(s) < _NGRAM:
+        return {s} if s else set()
+    return {s[i : i + _NGRAM] for i in range(len(s) - _NGRAM + 1)}
+
+
+class SearchIndex:
+    """カード行リストから作る n-gram 転置インデックス"""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.names: list[str] = []
+        self.numbers: list[str] = []
+        self.postings: dict[str, set[int]] = {}
+        for i, row in enumerate(rows):
+            name = normalize_text(row.get("card_name"))
+            number = normalize_text(row.get("card_number"))
+            no = normalize_text(row.get("no"))
+            self.names.append(name)
+            self.numbers.append(number)
+            grams = set()
+            for field in {name, number, no}:
+                grams |= _grams(field)
+                # 1 文字クエリ用に 1-gram も登録
+                grams |= set(field)
+            for g in grams:
+                self.postings.setdefault(g, set()).add(i)
+        self._texts = [f"{n}\t{c}\t{normalize_text(r.get('no'))}" for n, c, r in zip(self.names, self.numbers, rows)]
+
+    def _candidates(self, query: str) -> set[int]:
+        grams = _grams(query) if len(query) >= _NGRAM else {query}
+        lists = []
+        for g in grams:
+            posting = self.postings.get(g)
+            if not posting:
+                return set()
+            lists.append(posting)
+        lists.sort(key=len)
+        result = set(lists[0])
+        for posting in lists[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+    def match_ids(self, query: str) -> list[int]:
+        """正規化後のクエリを部分文字列として含む行番号（行順）"""
+        q = normalize_text(query)
+        if not q:
+            return list(range(len(self.rows)))
+        return sorted(i for i in self._candidates(q) if q in self._texts[i])
+
+    def _rank(self, q: str, i: int) -> tuple:
+        name = self.names[i]
+        number = self.numbers[i]
+        if q == number or q == name:
+            tier = 0
+        elif number.startswith(q) or name.startswith(q):
+            tier = 1
+        else:
+            tier = 2
+        pos = name.find(q)
+        return (tier, pos if pos >= 0 else len(name), len(name), i)
+
+    def search(self, query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[tuple[int, float]]:
+        """
+        順位付き検索。(行番号, スコア) のリストを返す。
+        スコアは 完全一致 > 前方一致 > 部分一致 > あいまい一致（gram の一致率）の順に高い。
+        """
+        q = normalize_text(query)
+        if not q:
+            return []
+        exact = [i for i in self._candidates(q) if q in self._texts[i]]
+        if exact:
+            ranked = sorted(exact, key=lambda i: self._rank(q, i))[:limit]
+            return [(i, 3.0 - self._rank(q, i)[0]) for i in ranked]
+
+        # 部分一致がない場合（表記ゆれ・入力途中の誤字など）は gram の一致率で並べる
+        grams = _grams(q)
+        if len(grams) < 2:
+            return []
+        counts: dict[int, int] = {}
+        for g in grams:
+            for i in self.postings.get(g, ()):
+                counts[i] = counts.get(i, 0) + 1
+        threshold = len(grams) * _FUZZY_MIN_RATIO
+        fuzzy = [(i, c / len(grams)) for i, c in counts.items() if c >= threshold]
+        fuzzy.sort(key=lambda x: (-x[1], len(self.names[x[0]]), x[0]))
+        return fuzzy[:limit]
@@ -0,0 +1,66 @@
+"""
+/api/psa9-stats 用の、GAS を経由しない取得クライアント（psa9_collector.py でヤフオクを直接検索する）。
+
+GasClient と同じ fetch(cards) -> (results, errors) を持ち、Psa9Cache からそのまま使える。
+20 件ずつのバッチを同時実行数の上限つきでスレッドに回し、各バッチ内は psa9_collector.collect_batch と同じく
+0.6 秒間隔で 1 件ずつ取得する（取得できないカードがあればそのバッチは GasBatchError になる）。
+"""
+import asyncio
+import os
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path:
+    sys.path.insert(0, _ROOT)
+
+import psa9_collector  # noqa: E402
+from gas_client import BATCH_SIZE, DEFAULT_CONCURRENCY, GasBatchError, to_gas_card  # noqa: E402
+
+
+class YahooClient:
+    def __init__(
+        self,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        batch_size: int = BATCH_SIZE,
+        base_url: str | None = None,
+        interval_sec: float = psa9_collector.REQUEST_INTERVAL_SEC,
+    ):
+        self.batch_size = batch_size
+        self.base_url = base_url or psa9_collector.YAHOO_CLOSEDSEARCH_URL
+        self.interval_sec = interval_sec
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._session = psa9_collector.make_session(max(1, concurrency))
+
+    async def aclose(self):
+        self._session.close()
+
+    async def _collect(self, batch_index: int, batch: list) -> list:
+        cards = [to_gas_card(c) for c in batch]
+        try:
+            async with self._semaphore:
+                return await asyncio.to_thread(
+                    psa9_collector.collect_batch, self._session, cards, self.base_url, self.interval_sec
+                )
+        except Exception as e:
+            raise GasBatchError(batch_index, [c["id"] for c in cards], e)
+
+    async def fetch(self, cards: list) -> tuple[list, list]:
+        """
+        cards をバッチに分けて並行取得する。
+        Returns: (送信順に並べた results, 失敗したバッチの GasBatchError リスト)
+        """
+        batches = [cards[i : i + self.batch_size] for i in range(0, len(cards), self.batch_size)]
+        outcomes = await asyncio.gather(
+            *(self._collect(n, b) for n, b in enumerate(batches)),
+            return_exceptions=True,
+        )
+        results = []
+        errors = []
+        for outcome in outcomes:
+            if isinstance(outcome, GasBatchError):
+                errors.append(outcome)
+            elif isinstance(outcome, BaseException):
+                raise outcome
+            else:
+                results.extend(outcome)
+        return results, errors
@@ -0,0 +1,302 @@
+"""
+Playwright のブラウザ起動・コンテキスト・ページをまとめて扱う（scrape_otachu.py / scrape_rush.py / fetch_pokeca_chart_links.py 共通）。
+
+- 起動: Chrome（channel="chrome"。Cloudflare に検出されにくい）→ Chromium → Firefox の順に試す
+- コンテキスト: User-Agent・画面サイズ・言語をそろえ、既定のタイムアウトを設定する。
+  画像・動画・フォントのリクエストは読み込まずに捨てる（img の src 属性は DOM に残るので URL は取れる）
+- ページ: 使い終わったページはプールに戻して使い回し、recycle_after 回使ったら閉じて作り直す
+  （長時間の実行でメモリが増え続けないように）。fresh_context=True なら毎回新しいコンテキストを作って閉じる
+- 計測: 起動にかかった時間・起動したブラウザ・作ったコンテキスト/ページ数・捨てたリクエスト数を
+  metrics に持ち、終了時に 1 行で表示する
+
+同期 API 用の BrowserManager と、asyncio 用の AsyncBrowserManager がある。
+
+  with BrowserManager() as browser:
+      with browser.page() as page:
+          page.goto(url)
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+VIEWPORT = {"width": 1280, "height": 720}
+CHROMIUM_ARGS = ["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"]
+DEFAULT_ENGINES = ("chrome", "chromium", "firefox")
+DEFAULT_BLOCKED_RESOURCES = ("image", "media", "font")
+DEFAULT_TIMEOUT_MS = 30000
+PAGE_RECYCLE_AFTER = 50  # 同じページをこの回数使ったら作り直す
+
+
+def _launch_target(playwright, engine: str, headless: bool):
+    """engine 名 → (BrowserType, launch の引数)"""
+    if engine == "chrome":
+        return playwright.chromium, {"channel": "chrome", "headless": headless, "args": CHROMIUM_ARGS}
+    if engine == "chromium":
+        return playwright.chromium, {"headless": headless, "args": CHROMIUM_ARGS}
+    if engine == "firefox":
+        return playwright.firefox, {"headless": headless}
+    raise ValueError(f"不明なブラウザ: {engine}")
+
+
+class _ManagerBase:
+    def __init__(
+        self,
+        headless: bool = True,
+        engines=DEFAULT_ENGINES,
+        blocked_resources=DEFAULT_BLOCKED_RESOURCES,
+        timeout_ms: int = DEFAULT_TIMEOUT_MS,
+        user_agent: str = USER_AGENT,
+        viewport: dict | None = VIEWPORT,
+        context_options: dict | None = None,
+        recycle_after: int = PAGE_RECYCLE_AFTER,
+        max_pages: int = 1,
+        label: str = "",
+    ):
+        self.headless = headless
+        self.engines = tuple(engines)
+        self.blocked_resources = frozenset(blocked_resources or ())
+        self.timeout_ms = timeout_ms
+        self.context_options = {"user_agent": user_agent, **({"viewport": viewport} if viewport else {})}
+        self.context_options.update(context_options or {})
+        self.recycle_after = recycle_after
+        self.max_pages = max(1, max_pages)
+        self.label = label
+        self.browser = None
+        self._playwright = None
+        self._context = None  # ページプール用の共有コンテキスト
+        self._idle: list = []
+        self._uses: dict = {}
+        self.metrics = {
+            "engine": None,
+            "launch_sec": None,
+            "contexts": 0,
+            "pages": 0,
+            "recycled": 0,
+            "acquired": 0,
+            "blocked_requests": 0,
+        }
+
+    def _launch_failed(self, engine: str, error: Exception):
+        print(f"{engine} の起動に失敗しました: {error}")
+
+    def _launched(self, engine: str, started: float):
+        self.metrics["engine"] = engine
+        self.metrics["launch_sec"] = round(time.monotonic() - started, 2)
+        print(f"{engine} で起動しました（{self.metrics['launch_sec']:.1f} 秒）")
+
+    def _should_block(self, route) -> bool:
+        if route.request.resource_type in self.blocked_resources:
+            self.metrics["blocked_requests"] += 1
+            return True
+        return False
+
+    def _should_recycle(self, page) -> bool:
+        self._uses[page] = self._uses.get(page, 0) + 1
+        if self.recycle_after and self._uses[page] >= self.recycle_after:
+            self._uses.pop(page, None)
+            self.metrics["recycled"] += 1
+            return True
+        return False
+
+    def summary(self) -> str:
+        m = self.metrics
+        prefix = f"[{self.label}] " if self.label else ""
+        launch = f"{m['launch_sec']:.1f} 秒" if m["launch_sec"] is not None else "未起動"
+        return (
+            f"{prefix}ブラウザ: {m['engine'] or '-'}（起動 {launch}）、コンテキスト {m['contexts']}、"
+            f"ページ {m['pages']}（使用 {m['acquired']} 回・作り直し {m['recycled']}）、"
+            f"読み込まなかったリクエスト {m['blocked_requests']}"
+        )
+
+
+class BrowserManager(_ManagerBase):
+    """同期 API（playwright.sync_api）用"""
+
+    def start(self):
+        from playwright.sync_api import sync_playwright
+
+        self._playwright = sync_playwright().start()
+        started = time.monotonic()
+        last_error = None
+        for engine in self.engines:
+            browser_type, options = _launch_target(self._playwright, engine, self.headless)
+            try:
+                self.browser = browser_type.launch(**options)
+            except Exception as e:
+                self._launch_failed(engine, e)
+                last_error = e
+                continue
+            self._launched(engine, started)
+            return self
+        self._playwright.stop()
+        raise last_error
+
+    def close(self):
+        if self.browser is not None:
+            self.browser.close()
+            self.browser = None
+            print(self.summary())
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def new_context(self, **overrides):
+        """設定済みのコンテキスト（リソースの遮断・既定のタイムアウトつき）"""
+        context = self.browser.new_context(**{**self.context_options, **overrides})
+        context.set_default_timeout(self.timeout_ms)
+        context.set_default_navigation_timeout(self.timeout_ms)
+        if self.blocked_resources:
+            context.route("**/*", lambda route: route.abort() if self._should_block(route) else route.continue_())
+        self.metrics["contexts"] += 1
+        return context
+
+    def acquire(self):
+        """プールのページを 1 枚借りる（無ければ共有コンテキストに作る）"""
+        self.metrics["acquired"] += 1
+        if self._idle:
+            return self._idle.pop()
+        if self._context is None:
+            self._context = self.new_context()
+        self.metrics["pages"] += 1
+        return self._context.new_page()
+
+    def release(self, page):
+        if self._should_recycle(page) or len(self._idle) >= self.max_pages:
+            page.close()
+        else:
+            self._idle.append(page)
+
+    @contextmanager
+    def page(self, fresh_context: bool = False):
+        """
+        ページを借りて返す。fresh_context=True なら新しいコンテキストのページを作り、終わったら閉じる
+        （Cookie などを持ち越さず、毎回初回アクセスとして扱わせたいとき）
+        """
+        if fresh_context:
+            context = self.new_context()
+            self.metrics["acquired"] += 1
+            self.metrics["pages"] += 1
+            try:
+                yield context.new_page()
+            finally:
+                context.close()
+            return
+        page = self.acquire()
+        try:
+            yield page
+        finally:
+            self.release(page)
+
+
+class AsyncBrowserManager(_ManagerBase):
+    """asyncio（playwright.async_api）用。同時に貸し出すページは max_pages 枚まで"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._slots = asyncio.Semaphore(self.max_pages)
+        self._lock = asyncio.Lock()
+        self._start_error = None
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        started = time.monotonic()
+        last_error = None
+        for engine in self.engines:
+            browser_type, options = _launch_target(self._playwright, engine, self.headless)
+            try:
+                self.browser = await browser_type.launch(**options)
+            except Exception as e:
+                self._launch_failed(engine, e)
+                last_error = e
+                continue
+            self._launched(engine, started)
+            return self
+        await self._playwright.stop()
+        self._playwright = None
+        raise last_error
+
+    async def close(self):
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+            print(self.summary())
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _route(self, route):
+        if self._should_block(route):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def new_context(self, **overrides):
+        context = await self.browser.new_context(**{**self.context_options, **overrides})
+        context.set_default_timeout(self.timeout_ms)
+        context.set_default_navigation_timeout(self.timeout_ms)
+        if self.blocked_resources:
+            await context.route("**/*", self._route)
+        self.metrics["contexts"] += 1
+        return context
+
+    async def acquire(self):
+        """
+        プールのページを 1 枚借りる。max_pages 枚すべて貸し出し中なら返るまで待つ。
+        ブラウザが未起動ならここで起動する（ページが必要になるまで起動しない）
+        """
+        await self._slots.acquire()
+        try:
+            async with self._lock:
+                if self._start_error is not None:
+                    raise self._start_error  # 起動に失敗したら以降のページ要求でも起動し直さない
+                if self.browser is None:
+                    try:
+                        await self.start()
+                    except Exception as e:
+                        self._start_error = e
+                        raise
+                self.metrics["acquired"] += 1
+                if self._idle:
+                    return self._idle.pop()
+                if self._context is None:
+                    self._context = await self.new_context()
+                self.metrics["pages"] += 1
+                return await self._context.new_page()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def release(self, page):
+        try:
+            if self._should_recycle(page):
+                await page.close()
+            else:
+                self._idle.append(page)
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def page(self):
+        page = await self.acquire()
+        try:
+            yield page
+        finally:
+            await self.release(page)
@@ -0,0 +1,100 @@
+"""
+カードの識別キー（各スクリプト・バックエンド共通）。
+
+- 正規のキー（key）: 「card_number|カード名」。psa9_stats.json と API の PSA9 照合に使う
+- リンクのキー（link_key）: 同じ card_number に別名のカードがあるときだけ「card_number|カード名」、
+  それ以外は card_number。ebay_links.json / pokeca_chart_links.json のキー
+- 行 id: 「No_card_number_行番号」。/api/cards の id（フロントが保持するので形式は変えない）
+
+型番・カード名は 1 行につき一度だけ正規化（前後の空白除去、NaN・None は空文字、card_number が空なら No）し、
+sys.intern した文字列で持つ。結合は identify() の結果のキーで dict を 1 回引くだけにする。
+"""
+import sys
+
+
+def clean(value) -> str:
+    """CSV のセル → 前後の空白を除いた文字列（None・NaN は空文字）"""
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value).strip()
+
+
+def card_number_of(row) -> str:
+    """行の型番（card_number 列。空なら No 列）"""
+    return clean(row.get("card_number")) or clean(row.get("No"))
+
+
+def canonical_key(card_number, card_name) -> str | None:
+    """正規のキー「card_number|カード名」。どちらかが空なら None"""
+    cn = clean(card_number)
+    name = clean(card_name)
+    return sys.intern(f"{cn}|{name}") if cn and name else None
+
+
+def link_key(card_number, card_name, duplicated: bool) -> str:
+    """リンク JSON のキー。duplicated（同じ型番に別名のカードがある）ときだけ card_number|カード名"""
+    cn = clean(card_number)
+    name = clean(card_name)
+    return sys.intern(f"{cn}|{name}" if duplicated and name else cn)
+
+
+def duplicated_numbers(pairs) -> set:
+    """(card_number, カード名) の並びから、カード名が 2 種類以上ある card_number の集合"""
+    names: dict[str, set] = {}
+    for cn, name in pairs:
+        if cn and name:
+            names.setdefault(cn, set()).add(name)
+    return {cn for cn, ns in names.items() if len(ns) > 1}
+
+
+def row_id(no, card_number, index) -> str:
+    """/api/cards の行 id。値は加工せずに文字列にする（既存の id と一致させる）"""
+    return f"{no}_{card_number}_{index}"
+
+
+class CardIdentity:
+    __slots__ = ("no", "card_number", "card_name", "key", "link_key")
+
+    def __init__(self, no: str, card_number: str, card_name: str, key: str | None, link_key: str):
+        self.no = no
+        self.card_number = card_number
+        self.card_name = card_name
+        self.key = key
+        self.link_key = link_key
+
+    def __repr__(self):
+        return f"CardIdentity({self.key or self.card_number!r})"
+
+
+def identify(rows, default_name: str = "") -> list[CardIdentity]:
+    """
+    行（dict や pandas の行）ごとの識別情報を一度だけ作る。戻り値は rows と同じ順。
+    link_key の「別名のカードがあるか」は渡した行全体で判定する。
+    default_name: カード名が空の行に使う名前（API は "不明"）
+    """
+    base = []
+    for row in rows:
+        cn = sys.intern(card_number_of(row))
+        name = sys.intern(clean(row.get("カード名")) or default_name)
+        base.append((clean(row.get("No")), cn, name))
+    duplicated = duplicated_numbers((cn, name) for _, cn, name in base)
+    return [
+        CardIdentity(no, cn, name, canonical_key(cn, name), link_key(cn, name, cn in duplicated))
+        for no, cn, name in base
+    ]
+
+
+def index_links(links: dict, identities) -> dict:
+    """
+    リンク JSON（link_key → URL）を正規のキー → URL に読み替える（読み込み時に一度だけ）。
+    書いた側と読む側で「別名のカードがあるか」の判定対象（CSV）が違っても、
+    card_number|カード名 のキーを優先し、無ければ card_number のキーを使う。
+    """
+    index = {}
+    for ident in identities:
+        if ident.key is None or ident.key in index:
+            continue
+        url = links.get(ident.key) or links.get(ident.card_number)
+        if url:
+            index[ident.key] = url
+    return index
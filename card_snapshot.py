@@ -0,0 +1,179 @@
+"""
+カード CSV（merged_card_data.csv・filtered_cards.csv）の型付きスナップショット（Parquet）。
+
+CSV を書いたあとに同じ場所へ <名前>.parquet を書き、読む側はそちらを優先する。
+  - 型を固定する: 価格・利益の列は数値（金額は欠けが無ければ int64・あれば float64、率は float64。
+    "取得失敗" などの文字列は NaN）、型番・カード名などは文字列、レア・弾・ラッシュ在庫状況は category
+  - CSV を解析し直さないので読み込みが速く、category のぶんメモリも少ない
+スナップショットには元の CSV の SHA-1 を入れておき、CSV と中身が違う（手で直した・git pull で CSV だけ更新された）
+ときは使わずに CSV を読む。CSV から読むときも同じ型にそろえるので、どちらから読んでも列の型は同じ。
+
+pyarrow は任意（未インストールならスナップショットは作らず、常に CSV を読む）。
+環境変数 CARD_SNAPSHOT=0 で読み書きとも使わない。
+
+  df = card_snapshot.read_cards("merged_card_data.csv")
+  card_snapshot.write_snapshot("merged_card_data.csv")   … CSV を書いたあとに呼ぶ
+
+実行:
+  python card_snapshot.py build [CSV ...]  … スナップショットを作り直す（デフォルトは merged_card_data.csv と filtered_cards.csv）
+  python card_snapshot.py check [CSV ...]  … CSV と一致しているか・列の型・メモリ使用量を表示
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+# pyarrow は任意（未インストールなら CSV のみ）
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_ENV = "CARD_SNAPSHOT"
+SUFFIX = ".parquet"
+SCHEMA_VERSION = 2  # 列の型を変えたら上げる（古いスナップショットは使わずに CSV を読む）
+META_KEY = b"card_snapshot"
+DEFAULT_CSVS = ("merged_card_data.csv", "filtered_cards.csv")
+
+TEXT_COLUMNS = ("No", "カード名", "card_number", "更新日", "画像URL")
+CATEGORY_COLUMNS = ("レア", "弾", "ラッシュ在庫状況")
+INTEGER_COLUMNS = ("買取金額", "ラッシュ販売価格", "期待利益", "鑑定費", "手取り利益")  # 円。欠けがあれば float64
+FLOAT_COLUMNS = ("利益率", "月換算利益率")
+NUMBER_COLUMNS = INTEGER_COLUMNS + FLOAT_COLUMNS
+
+
+def enabled() -> bool:
+    return pq is not None and os.environ.get(SNAPSHOT_ENV, "").strip().lower() not in ("0", "off", "false")
+
+
+def snapshot_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + SUFFIX
+
+
+def _file_sha1(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """列の型をそろえる（スナップショットにするときと CSV から読んだときの両方）"""
+    for col in NUMBER_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors="coerce").astype("float64")
+            # 金額は pd.read_csv と同じく、欠けが無く整数だけなら int64（12000.0 と表示させない）
+            if col in INTEGER_COLUMNS and values.notna().all() and (values % 1 == 0).all():
+                values = values.astype("int64")
+            df[col] = values
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def read_csv(csv_path: str) -> pd.DataFrame:
+    """CSV を読み、スナップショットと同じ型にする"""
+    df = pd.read_csv(csv_path, encoding="utf-8-sig", dtype={col: str for col in TEXT_COLUMNS})
+    return normalize(df)
+
+
+def read_snapshot(csv_path: str) -> pd.DataFrame | None:
+    """CSV と中身が一致するスナップショットがあれば DataFrame、無い・古い・読めないときは None"""
+    path = snapshot_path(csv_path)
+    if not enabled() or not os.path.exists(path):
+        return None
+    try:
+        meta = json.loads((pq.read_schema(path).metadata or {}).get(META_KEY, b"{}"))
+        if meta.get("schema_version") != SCHEMA_VERSION or meta.get("source_sha1") != _file_sha1(csv_path):
+            return None
+        return pq.read_table(path).to_pandas()
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+
+
+def read_cards(csv_path: str, prefer_snapshot: bool = True) -> pd.DataFrame:
+    """スナップショットを優先して読む（使えなければ CSV）。CSV が無ければ FileNotFoundError"""
+    df = read_snapshot(csv_path) if prefer_snapshot else None
+    return df if df is not None else read_csv(csv_path)
+
+
+def write_snapshot(csv_path: str) -> str | None:
+    """
+    書き終えた CSV からスナップショットを作る（一時ファイルに書いてから置き換える）。
+    作れないとき（pyarrow が無い・CARD_SNAPSHOT=0・書き込みエラー）は警告だけ出して None。CSV の出力は失敗させない
+    """
+    if not enabled():
+        if pq is None:
+            print("警告: pyarrow が無いためスナップショット（.parquet）は作りません（読み込みは CSV のまま）")
+        return None
+    path = snapshot_path(csv_path)
+    tmp = f"{path}.tmp"
+    try:
+        table = pa.Table.from_pandas(read_csv(csv_path), preserve_index=False)
+        meta = {
+            "schema_version": SCHEMA_VERSION,
+            "source": os.path.basename(csv_path),
+            "source_sha1": _file_sha1(csv_path),
+            "created_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+        }
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), META_KEY: json.dumps(meta).encode()})
+        pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp, path)
+    except (OSError, ValueError, pa.ArrowException) as e:
+        print(f"警告: スナップショット {path} を作れませんでした（読み込みは CSV のまま）: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+    return path
+
+
+def _status(csv_path: str) -> str:
+    path = snapshot_path(csv_path)
+    if pq is None:
+        return "pyarrow なし（CSV を読む）"
+    if not os.path.exists(path):
+        return "スナップショットなし（CSV を読む）"
+    if read_snapshot(csv_path) is None:
+        return "CSV と不一致（CSV を読む。build で作り直す）"
+    return "一致（スナップショットを読む）"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="カード CSV の型付きスナップショット（Parquet）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("build", "スナップショットを作り直す"), ("check", "CSV と一致しているか・列の型を表示")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("csv", nargs="*", help=f"対象の CSV（デフォルト: {' '.join(DEFAULT_CSVS)}）")
+    args = parser.parse_args()
+
+    csv_paths = args.csv or [os.path.join(BASE_DIR, name) for name in DEFAULT_CSVS]
+    failed = False
+    for csv_path in csv_paths:
+        if not os.path.exists(csv_path):
+            print(f"エラー: {csv_path} が見つかりません")
+            failed = True
+            continue
+        if args.command == "build":
+            path = write_snapshot(csv_path)
+            if path is None:
+                failed = True
+                continue
+            print(f"保存: {path}（{os.path.getsize(path) / 1024:,.1f} KiB、CSV {os.path.getsize(csv_path) / 1024:,.1f} KiB）")
+            continue
+        df = read_cards(csv_path)
+        print(f"{os.path.basename(csv_path)}: {_status(csv_path)}、{len(df)} 行、"
+              f"メモリ {df.memory_usage(deep=True).sum() / 1024:,.1f} KiB")
+        for col, dtype in df.dtypes.items():
+            print(f"  {col}: {dtype}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
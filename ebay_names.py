@@ -0,0 +1,272 @@
+"""
+eBay リンク用のカード名 日本語 → 英語 変換と、その永続キャッシュ。
+
+カード名を「基本名」（ポケモン名・トレーナー名など）と、ローカルの規則で英語にできる部分
+（メガ・リージョンフォームなどの接頭辞、ex / V / VSTAR などの接尾辞、(SA) などの注記、SV4a などの弾コード）
+に分け、基本名の英訳だけを ebay_name_cache.json に保存する。
+同じポケモンの ex・V・SA 違いは一度訳せば使い回せるので、Gemini に送るのは初めて見る基本名だけになる。
+
+基本名は キャッシュ → 同梱の辞書（ebay_name_dictionary.json: ポケモン名・トレーナー名と「〇〇の△△」の規則）
+→ Gemini の順に探す。辞書で確実に訳せない名前（カードタイトルなど）だけが Gemini に回る。
+
+  split_name("メガリザードンYex (ミラー)") -> (["リザードン"], "Mega {0} Y ex")
+  compose("Mega {0} Y ex", ["Charizard"]) -> "Mega Charizard Y ex"
+"""
+import json
+import os
+import re
+import unicodedata
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, "ebay_name_cache.json")
+DICTIONARY_PATH = os.path.join(BASE_DIR, "ebay_name_dictionary.json")
+
+# 末尾の接尾辞（長いものから照合）→ 英語表記
+SUFFIXES = (
+    ("VSTAR", "VSTAR"),
+    ("VMAX", "VMAX"),
+    ("V-UNION", "V-UNION"),
+    ("VUNION", "V-UNION"),
+    ("BREAK", "BREAK"),
+    ("GX", "GX"),
+    ("EX", "EX"),
+    ("ex", "ex"),
+    ("V", "V"),
+)
+# 先頭の接頭辞 → 英語表記（直後が「の」のときは接頭辞として扱わない。例: ガラルの仲間たち）
+PREFIXES = (
+    ("オリジン", "Origin"),
+    ("ガラル", "Galarian"),
+    ("アローラ", "Alolan"),
+    ("ヒスイ", "Hisuian"),
+    ("パルデア", "Paldean"),
+    ("こくば", "Shadow Rider"),
+    ("はくば", "Ice Rider"),
+    ("いちげき", "Single Strike"),
+    ("れんげき", "Rapid Strike"),
+    ("ひかる", "Shining"),
+    ("かがやく", "Radiant"),
+)
+# 「メガ」で始まるがメガシンカではないポケモン
+MEGA_EXCEPTIONS = ("メガニウム", "メガヤンマ")
+# 末尾の注記（括弧内）→ 英語表記。None は検索語に含めない。ここにない注記は基本名に含めたまま訳す
+NOTES = {
+    "SA": "(Alternate Art)",
+    "マスターボール": "(Master Ball)",
+    "モンスターボール": "(Poke Ball)",
+    "ミラー": None,
+}
+_SET_CODE_RE = re.compile(r"\s*(?:SV|SM|XY|BW|S)\d{1,2}[a-zA-Z]?\s*$")
+_NOTE_RE = re.compile(r"\s*[(\[【]([^()\[\]【】]+)[)\]】]\s*$")
+
+
+def normalize_name(name: str) -> str:
+    """キャッシュのキー用。NFKC（全角英数・括弧・＆を半角に）と空白の除去"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", str(name or "")))
+
+
+def split_name(name: str) -> tuple[list, str]:
+    """
+    カード名 → (基本名のリスト, 英語のテンプレート)。
+    テンプレートの {0}, {1}… に基本名の英訳を入れると英名になる（＆でつながるタッグは基本名が複数）。
+    """
+    s = unicodedata.normalize("NFKC", str(name or "")).strip()
+    # 弾コード（SV4a など）は型番で特定できるので検索語に含めない
+    s = _SET_CODE_RE.sub("", s)
+    note_en = None
+    m = _NOTE_RE.search(s)
+    if m and m.group(1).strip() in NOTES:
+        note_en = NOTES[m.group(1).strip()]
+        s = s[: m.start()]
+        s = _SET_CODE_RE.sub("", s)
+    s = s.strip()
+
+    suffix_en = None
+    for ja, en in SUFFIXES:
+        if s.endswith(ja) and len(s) > len(ja):
+            suffix_en = en
+            s = s[: -len(ja)].strip()
+            break
+
+    prefix_en = None
+    form_en = None
+    if suffix_en in ("ex", "EX") and s.startswith("メガ") and not s.startswith(MEGA_EXCEPTIONS):
+        prefix_en = "Mega"
+        s = s[len("メガ"):]
+        # メガリザードンX / Y
+        if s[-1:] in ("X", "Y") and len(s) > 1:
+            form_en = s[-1]
+            s = s[:-1]
+    elif suffix_en == "EX" and s.startswith("M") and len(s) > 1 and not s[1].isascii():
+        # XY 期のメガシンカ（MレックウザEX → M Rayquaza EX）
+        prefix_en = "M"
+        s = s[1:]
+    else:
+        for ja, en in PREFIXES:
+            rest = s[len(ja):]
+            if s.startswith(ja) and rest and not rest.startswith("の"):
+                prefix_en = en
+                s = rest.strip()
+                break
+
+    bases = [normalize_name(b) for b in s.split("&")] if s else []
+    bases = [b for b in bases if b]
+    parts = []
+    if prefix_en:
+        parts.append(prefix_en)
+    parts.append(" & ".join(f"{{{i}}}" for i in range(len(bases))))
+    for p in (form_en, suffix_en, note_en):
+        if p:
+            parts.append(p)
+    template = " ".join(p for p in parts if p)
+    return bases, template
+
+
+def compose(template: str, bases_en: list) -> str:
+    return template.format(*bases_en).strip()
+
+
+_dictionary = None
+
+
+def _load_dictionary() -> tuple[dict, dict]:
+    global _dictionary
+    if _dictionary is None:
+        try:
+            with open(DICTIONARY_PATH, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"警告: {DICTIONARY_PATH} を読めませんでした（辞書なしで続行）: {e}")
+            data = {}
+        species = {normalize_name(k): v for k, v in (data.get("species") or {}).items()}
+        trainers = {normalize_name(k): v for k, v in (data.get("trainers") or {}).items()}
+        _dictionary = (species, trainers)
+    return _dictionary
+
+
+def offline_translate(base: str):
+    """
+    同梱の辞書だけで基本名を訳す。確実に訳せないときは None。
+      ポケモン名・トレーナー名そのもの、または「トレーナー名のポケモン名」（リーリエのピッピ → Lillie's Clefairy）
+    """
+    species, trainers = _load_dictionary()
+    base = normalize_name(base)
+    en = species.get(base) or trainers.get(base)
+    if en:
+        return en
+    owner, sep, pokemon = base.partition("の")
+    if sep and owner in trainers and pokemon in species:
+        return f"{trainers[owner]}'s {species[pokemon]}"
+    return None
+
+
+def english_name_offline(card_name: str):
+    """カード名全体を辞書と規則だけで英名にする。基本名のどれかが訳せなければ None"""
+    bases, template = split_name(card_name)
+    if not bases:
+        return None
+    bases_en = [offline_translate(b) for b in bases]
+    if any(en is None for en in bases_en):
+        return None
+    return compose(template, bases_en)
+
+
+class TranslationCache:
+    """基本名（normalize_name 済み）→ 英訳 の永続キャッシュ"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.entries: dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, dict):
+                    self.entries = {k: v for k, v in data.items() if isinstance(v, str) and v.strip()}
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"警告: {path} を読めませんでした（空のキャッシュで続行）: {e}")
+
+    def get(self, base: str):
+        en = self.entries.get(base)
+        if en is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return en
+
+    def put(self, base: str, english: str):
+        english = (english or "").strip()
+        if base and english:
+            self.entries[base] = english
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dict(sorted(self.entries.items())), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+def translate_names(names: list, cache: TranslationCache, translate_fn, negative=None) -> tuple[list, dict]:
+    """
+    カード名のリストを英名にする。キャッシュにも辞書にもない基本名だけを重複なしで translate_fn に渡す。
+    translate_fn(list[str]) -> list[str | None]（同じ順・同じ件数。訳せなかったものは空文字、
+    エラーなどで答えが返らなかったものは None）
+    negative（negative_cache.NegativeCache）を渡すと、前回訳せず再試行待ちの基本名は送らず、
+    今回空文字だった基本名を記録する（訳せたら記録を消す。None は記録しない＝次回もそのまま送る）。
+    戻り値: (英名のリスト（訳せなかった名前は空文字）, 内訳)
+    """
+    splits = [split_name(n) for n in names]
+    resolved: dict[str, str] = {}
+    unknown = []
+    offline = 0
+    seen = set()
+    for bases, _ in splits:
+        for b in bases:
+            if b in seen:
+                continue
+            seen.add(b)
+            en = cache.get(b)
+            if en is None:
+                en = offline_translate(b)
+                if en is not None:
+                    offline += 1
+            if en is None:
+                if negative is None or not negative.is_blocked(b):
+                    unknown.append(b)
+            else:
+                resolved[b] = en
+
+    translated = 0
+    if unknown:
+        for b, en in zip(unknown, translate_fn(unknown)):
+            if en is None:
+                continue
+            if en.strip():
+                cache.put(b, en)
+                resolved[b] = cache.entries[b]
+                translated += 1
+                if negative is not None:
+                    negative.record_success(b)
+            elif negative is not None:
+                negative.record_failure(b, "empty translation")
+
+    results = []
+    for bases, template in splits:
+        bases_en = [resolved.get(b) for b in bases]
+        if not bases or any(not en for en in bases_en):
+            results.append("")
+            continue
+        results.append(compose(template, bases_en))
+    stats = {
+        "names": len(names),
+        "bases": len(seen),
+        "hits": cache.hits,
+        "misses": cache.misses,
+        "offline": offline,
+        "requested": len(unknown),
+        "translated": translated,
+        "skipped": negative.skipped if negative is not None else 0,
+    }
+    return results, stats
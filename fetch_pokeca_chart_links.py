@@ -4,31 +4,59 @@
 filtered_cards.csv の card_number をもとに検索し、
 各カードの pokeca-chart.com 詳細ページURLを抽出して pokeca_chart_links.json に保存する。
 
-検索結果が JavaScript で遅延表示されるため Playwright を使用し、
-表示待ちを入れてからリンクを抽出する。
+詳細ページの URL は型番から決まる（/{弾コード}-{番号}-{総数}/、プロモなどは /001-s-p/）ので、
+まず既存のリンクから覚えた「総数 → 弾コード」と CSV の弾の列から候補 URL を作り、実在するかを HTTP で確かめる。
+候補が無い・確かめられないときは HTTP で検索する（WordPress の検索 API /wp-json/wp/v2/search → 検索ページの静的 HTML）。
+検索結果が JavaScript で遅延表示されるなどで HTTP では見つからなかったカードだけ
+Playwright で検索ページを表示し、表示待ちを入れてからリンクを抽出する（ブラウザは必要になったときに起動）。
+1 つのブラウザコンテキストの中で複数ページ（ページプール）を並行に使い、
+検索の開始間隔はサイト全体で MIN_REQUEST_INTERVAL_SEC 以上空ける。
+見つかったリンクはその都度 pokeca_chart_links.json に保存するので、途中で止めても再実行で続きから取得する。
+ブラウザで検索してサイトが NOT FOUND と表示したカードは negative_cache.json（negative_cache.py）に記録し、
+次に試してよい時刻（失敗が続くほど先に延びる）までは検索しない（ページを開けなかった・タイムアウトなどは記録しない）。
 
 オプション:
   --test  先頭8件のみ処理
   --headed  ブラウザを表示（ボット対策が厳しい場合に試す）
+  --workers N  同時に使うページ数（デフォルト 3。1 で従来どおり 1 件ずつ）
+  --min-interval SEC  検索の開始間隔の下限（全ページ合計。デフォルト 1.0）
+  --no-synth  候補 URL の組み立てを使わず、最初から検索する
+  --no-http  HTTP での検索を使わず、最初から Playwright で検索する
+  --http-only  Playwright を使わない（HTTP で見つからなければ「見つからず」。ネガティブキャッシュには記録しない）
+  --retry-not-found  ネガティブキャッシュの待ち時間を無視して、見つからなかったカードも検索する
+
+環境変数 POKECA_CHART_BASE_URL でサイトの URL を差し替えられる（scripts/fake_pokeca_chart_server.py での確認用）。
+取得順（候補 URL → HTTP 検索 → ブラウザ）とネガティブキャッシュの記録は python scripts/fake_pokeca_chart_server.py --check で確かめる。
 """
+import argparse
+import asyncio
 import csv
 import json
+import os
 import re
 import sys
 import time
+import unicodedata
 from collections import Counter
+from html import unescape
 from pathlib import Path
 from urllib.parse import quote
 
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
+import requests
+
+import profiling
+import run_history
+from browser_manager import AsyncBrowserManager
+from card_identity import clean, duplicated_numbers, link_key
+from negative_cache import NegativeCache
 
 # プロジェクトルート
 ROOT = Path(__file__).resolve().parent
 CSV_PATH = ROOT / "filtered_cards.csv"
 OUTPUT_PATH = ROOT / "pokeca_chart_links.json"
-BASE_URL = "https://pokeca-chart.com"
+BASE_URL = os.environ.get("POKECA_CHART_BASE_URL", "https://pokeca-chart.com").rstrip("/")
 SEARCH_URL = f"{BASE_URL}/"
+WP_SEARCH_API_URL = f"{BASE_URL}/wp-json/wp/v2/search"
 # カード詳細ページのURLパターン
 # 1) 標準: /s6a-093-069/, /s8a-p-001-025/ など末尾が -数字-数字
 CARD_LINK_PATTERN_STD = re.compile(
@@ -42,6 +70,13 @@ REQUEST_DELAY_SEC = 1.5
 PAGE_LOAD_WAIT_SEC = 5.0  # 検索結果の表示待ち（JS遅延表示のため多めに）
 RESULTS_LINK_WAIT_MS = 12000  # カード詳細リンクが出現するまで待つ最大時間
 SEARCH_RETRY_WAIT_MS = 4000  # 検索結果が「もう一度押すと出る」場合の追加待機（ミリ秒）
+DEFAULT_WORKERS = 3  # 同時に使うページ数
+MIN_REQUEST_INTERVAL_SEC = 1.0  # 検索の開始間隔の下限（全ページ合計。サイトへの負荷を抑える）
+HTTP_MIN_INTERVAL_SEC = 0.2  # HTTP リクエストの開始間隔の下限（全ワーカー合計）
+HTTP_TIMEOUT_SEC = 10
+WP_SEARCH_PER_PAGE = 20
+MAX_URL_CANDIDATES = 4  # 1 カードあたりに確かめる候補 URL の上限
+NEGATIVE_CACHE_NAMESPACE = "pokeca_chart"
 
 # ボット対策回避: 実ブラウザに近い User-Agent とヘッダー
 USER_AGENT = (
@@ -49,11 +84,7 @@ USER_AGENT = (
     "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 )
 VIEWPORT = {"width": 1280, "height": 720}
-
-
-def _composite_key(card_number: str, card_name: str) -> str:
-    """重複用の複合キー（JSON のキー用）"""
-    return f"{card_number}|{card_name}"
+BROWSER_ENGINES = ("chromium",)  # 従来どおり Chromium のみ（browser_manager の既定は Chrome → Chromium → Firefox）
 
 
 def get_card_entries() -> list[tuple[str, str, bool]]:
@@ -63,23 +94,80 @@ def get_card_entries() -> list[tuple[str, str, bool]]:
     """
     if not CSV_PATH.exists():
         print(f"エラー: {CSV_PATH} が見つかりません")
+        run_history.fail(f"{CSV_PATH} が見つかりません")
         sys.exit(1)
     # (card_number, card_name) の重複なし
     pairs: set[tuple[str, str]] = set()
     with open(CSV_PATH, "r", encoding="utf-8-sig") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            cn = row.get("card_number", "").strip()
-            name = (row.get("カード名") or "").strip()
+            cn = clean(row.get("card_number"))
+            name = clean(row.get("カード名"))
             if cn and name:
                 pairs.add((cn, name))
-    # card_number ごとのカード名の数
-    cn_counts = Counter(cn for cn, _ in pairs)
-    return [(cn, name, cn_counts[cn] > 1) for cn, name in sorted(pairs)]
+    duplicated = duplicated_numbers(pairs)
+    return [(cn, name, cn in duplicated) for cn, name in sorted(pairs)]
+
+
+def get_expansions() -> dict[tuple[str, str], str]:
+    """CSV の弾の列から (card_number, card_name) → 弾（SM12a など）。空欄のカードは含めない"""
+    expansions: dict[tuple[str, str], str] = {}
+    with open(CSV_PATH, "r", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            cn = row.get("card_number", "").strip()
+            name = (row.get("カード名") or "").strip()
+            exp = (row.get("弾") or "").strip()
+            if cn and name and exp:
+                expansions[(cn, name)] = exp
+    return expansions
 
 
 # サイトが「見つからない」と明示した場合の戻り値（URL ではない）
 NOT_FOUND_ON_SITE = "NOT_FOUND"
+_HREF_RE = re.compile(r"""href=["']([^"']+)["']""")
+
+
+def match_card_link(href: str, card_number: str) -> str | None:
+    """リンク先が card_number のカード詳細ページなら正規化した URL（末尾 /）、そうでなければ None"""
+    h = (href or "").strip()
+    if h.startswith("//"):
+        h = "https:" + h
+    elif h.startswith("/"):
+        h = BASE_URL + h
+    m = CARD_LINK_PATTERN_STD.match(h)
+    if m:
+        parts = m.group(1).split("-")
+        num_part = parts[-2] + "/" + parts[-1]
+        if num_part == card_number:
+            return h.rstrip("/") + "/"
+    if "/" in card_number and any(c.isalpha() for c in card_number.split("/")[-1]):
+        m2 = CARD_LINK_PATTERN_SPECIAL.match(h)
+        if m2 and m2.group(1) == card_number.replace("/", "-").lower():
+            return h.rstrip("/") + "/"
+    return None
+
+
+def find_card_link(hrefs, card_number: str) -> str | None:
+    """リンク先の一覧から最初に見つかった card_number の詳細ページ URL"""
+    for h in hrefs:
+        found = match_card_link(h, card_number)
+        if found:
+            return found
+    return None
+
+
+def search_queries(card_number: str, card_name: str | None = None) -> list[tuple[str, bool]]:
+    """
+    検索語の一覧 [(検索語, 🔍ボタンで再検索するか), ...]。
+    重複型番は「型番 名前」→「名前のみ」の順、それ以外は型番のみ
+    """
+    if card_name:
+        search_name = normalize_card_name_for_search(card_name)
+        return [
+            (f"{card_number} {search_name}", False),
+            (search_name, True),  # 名前だけ（見つからなければ🔍を押して再検索）
+        ]
+    return [(card_number, False)]
 
 
 def normalize_card_name_for_search(name: str) -> str:
@@ -102,56 +190,57 @@ def normalize_card_name_for_search(name: str) -> str:
     return s
 
 
-def _do_search_and_parse(page, query: str, card_number: str, try_click_search_retry: bool = False) -> tuple[str | None, bool]:
+class RateLimiter:
+    """呼び出しの開始間隔を interval 秒以上空ける（全ページで共有）"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._last = 0.0
+
+    async def wait(self):
+        async with self._lock:
+            delay = self._last + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last = time.monotonic()
+
+
+async def _do_search_and_parse(page, query: str, card_number: str, try_click_search_retry: bool = False, limiter: RateLimiter | None = None) -> tuple[str | None, bool]:
     """
     検索を実行し、HTML から該当 card_number のリンクを抽出する。
     try_click_search_retry: True のとき、見つからなければ🔍検索ボタン押下で再検索を試す。
-    戻り値: (URL または None, サイト側で NOT FOUND だったか)
+    戻り値: (URL または None, サイト側で NOT FOUND だったか。ページを開けなかったときは None)
     """
     url = f"{SEARCH_URL}?s={query}"
     try:
-        page.goto(url, wait_until="domcontentloaded", timeout=20000)
-        page.wait_for_timeout(int(PAGE_LOAD_WAIT_SEC * 1000))
+        if limiter:
+            await limiter.wait()
+        await page.goto(url, wait_until="domcontentloaded", timeout=20000)
+        await page.wait_for_timeout(int(PAGE_LOAD_WAIT_SEC * 1000))
         try:
-            page.wait_for_selector(
+            await page.wait_for_selector(
                 'a[href^="/"][href*="-"], a[href*="pokeca-chart.com/"][href*="-"]',
                 timeout=RESULTS_LINK_WAIT_MS,
             )
         except Exception:
             pass
-        page.wait_for_timeout(500)
-        html = page.content()
+        await page.wait_for_timeout(500)
+        html = await page.content()
     except Exception:
-        return None, False
+        run_history.error("browser_navigation_error")
+        return None, None
 
     def _parse(html_text: str) -> str | None:
-        sp = BeautifulSoup(html_text, "html.parser")
-        exp_slug = card_number.replace("/", "-").lower()
-        for a in sp.find_all("a", href=True):
-            h = a["href"].strip()
-            if h.startswith("//"):
-                h = "https:" + h
-            elif h.startswith("/"):
-                h = BASE_URL + h
-            m = CARD_LINK_PATTERN_STD.match(h)
-            if m:
-                parts = m.group(1).split("-")
-                num_part = parts[-2] + "/" + parts[-1]
-                if num_part == card_number:
-                    return h.rstrip("/") + "/"
-            if "/" in card_number and any(c.isalpha() for c in card_number.split("/")[-1]):
-                m2 = CARD_LINK_PATTERN_SPECIAL.match(h)
-                if m2 and m2.group(1) == exp_slug:
-                    return h.rstrip("/") + "/"
-        return None
+        return find_card_link(_HREF_RE.findall(html_text), card_number)
 
     found = _parse(html)
     if found:
         return (found, False)
 
     # サイトが「検索ボタンをもう一度押すと出てくる」ように遅延表示している場合のリトライ
-    page.wait_for_timeout(SEARCH_RETRY_WAIT_MS)
-    html2 = page.content()
+    await page.wait_for_timeout(SEARCH_RETRY_WAIT_MS)
+    html2 = await page.content()
     found = _parse(html2)
     if found:
         return (found, False)
@@ -160,12 +249,12 @@ def _do_search_and_parse(page, query: str, card_number: str, try_click_search_re
     if try_click_search_retry:
         for sel in ['input[type="submit"]', 'button[type="submit"]', 'button:has-text("検索")', '[aria-label="検索"]']:
             try:
-                page.locator(sel).first.click(timeout=2000)
+                await page.locator(sel).first.click(timeout=2000)
                 break
             except Exception:
                 continue
-        page.wait_for_timeout(SEARCH_RETRY_WAIT_MS)
-        html3 = page.content()
+        await page.wait_for_timeout(SEARCH_RETRY_WAIT_MS)
+        html3 = await page.content()
         found = _parse(html3)
         if found:
             return (found, False)
@@ -175,32 +264,163 @@ def _do_search_and_parse(page, query: str, card_number: str, try_click_search_re
     return (None, not_found)
 
 
-def search_and_extract_link(card_number: str, page, card_name: str | None = None) -> str | None:
+async def search_and_extract_link(card_number: str, page, card_name: str | None = None, limiter: RateLimiter | None = None) -> str | None:
     """
     pokeca-chart.com で検索し、カード詳細ページのURLを抽出。
     検索は「型番 名前」→「名前のみ」の順。名前のみで見つからなければ🔍検索ボタン押下で再検索する。
     戻り値: URL | NOT_FOUND_ON_SITE | None
+      NOT_FOUND_ON_SITE はどれかの検索でサイトが NOT FOUND と表示し、どの検索もページを開けたときだけ。
+      ページを開けなかった（タイムアウト・通信エラー）・結果が表示されなかっただけのときは None
+      （一時的な失敗なのでネガティブキャッシュに記録させない）
     """
-    if card_name:
-        search_name = normalize_card_name_for_search(card_name)
-        # 型番 名前 → 名前のみ の順。名前のみのときは見つからなければ検索ボタン押下で再検索
-        queries = [
-            (f"{card_number} {search_name}", False),
-            (search_name, True),  # 名前だけ（見つからなければ🔍を押して再検索）
-        ]
+    saw_not_found = False
+    navigation_failed = False
+    for q, click_retry in search_queries(card_number, card_name):
+        # & をそのままにすると URL のパラメータ区切りと解釈され「ファイヤー」だけ送られるので必ず quote
+        query = quote(q) if (" " in q or "&" in q) else q.replace("/", "%2F")
+        found, not_found = await _do_search_and_parse(page, query, card_number, try_click_search_retry=click_retry, limiter=limiter)
+        if found:
+            return found
+        if not_found is None:
+            navigation_failed = True
+        elif not_found:
+            saw_not_found = True
+    return NOT_FOUND_ON_SITE if saw_not_found and not navigation_failed else None
+
+
+def _is_special_number(card_number: str) -> bool:
+    """001/S-P のように総数の部分に英字を含む型番"""
+    return "/" in card_number and any(c.isalpha() for c in card_number.split("/")[-1])
+
+
+def expansion_slug(expansion: str) -> str:
+    """CSV の弾 → URL の弾コード（SM12a → sm12a、SM4+ → sm4plus）"""
+    return re.sub(r"[^a-z0-9]", "", expansion.lower().replace("+", "plus"))
+
+
+def learn_set_codes(links: dict[str, str]) -> dict[str, Counter]:
+    """既存のリンクから 総数 → Counter(弾コード) を作る（型番と URL が一致するものだけ）"""
+    set_codes: dict[str, Counter] = {}
+    for key, url in links.items():
+        add_set_code(set_codes, key.split("|")[0], url)
+    return set_codes
+
+
+def add_set_code(set_codes: dict[str, Counter], card_number: str, url: str):
+    if _is_special_number(card_number) or not match_card_link(url, card_number):
+        return
+    m = CARD_LINK_PATTERN_STD.match(url)
+    parts = m.group(1).split("-")
+    set_codes.setdefault(parts[-1], Counter())["-".join(parts[:-2])] += 1
+
+
+def candidate_urls(card_number: str, set_codes: dict[str, Counter], expansion: str | None = None) -> list[str]:
+    """
+    型番から詳細ページの候補 URL を作る（確からしい順）。
+    弾が分かっていればその弾コードだけ、分からなければ同じ総数の既存リンクで多い弾コードから順に
+    """
+    if _is_special_number(card_number):
+        return [f"{BASE_URL}/{card_number.replace('/', '-').lower()}/"]
+    num, sep, total = card_number.partition("/")
+    if not sep or not num.isdigit() or not total.isdigit():
+        return []
+    if expansion and expansion_slug(expansion):
+        codes = [expansion_slug(expansion)]
     else:
-        queries = [(card_number.replace("/", "%2F"), False)]
+        codes = [code for code, _ in set_codes.get(total, Counter()).most_common(MAX_URL_CANDIDATES)]
+    return [f"{BASE_URL}/{code}-{num}-{total}/" for code in codes]
 
-    for q, click_retry in queries:
-        # & をそのままにすると URL のパラメータ区切りと解釈され「ファイヤー」だけ送られるので必ず quote
-        query = quote(q) if (" " in q or "&" in q) else q
-        found, not_found = _do_search_and_parse(page, query, card_number, try_click_search_retry=click_retry)
+
+def make_http_session(pool_size: int) -> requests.Session:
+    """keep-alive で使い回す Session（同時実行数ぶんのコネクションを保持）"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT, "Accept-Language": "ja,en;q=0.9"})
+    return session
+
+
+async def _http_get(session: requests.Session, url: str, params: dict, limiter: RateLimiter | None):
+    if limiter:
+        await limiter.wait()
+    return await asyncio.to_thread(session.get, url, params=params, timeout=HTTP_TIMEOUT_SEC)
+
+
+def _name_key(text: str) -> str:
+    """ページ本文とカード名の照合用（NFKC・空白除去・＆→&）"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFKC", unescape(text or "")))
+
+
+async def verify_url(session: requests.Session, url: str, card_number: str, card_name: str | None = None, limiter: RateLimiter | None = None) -> str | None:
+    """
+    候補 URL が実在して card_number の詳細ページなら（リダイレクト後の）URL、そうでなければ None。
+    card_name を渡すとページを取得して本文にカード名があるかも確かめる（同じ番号の別カードを取り違えない）。
+    渡さなければ HEAD で存在だけ確かめる
+    """
+    try:
+        if card_name:
+            r = await _http_get(session, url, {}, limiter)
+        else:
+            if limiter:
+                await limiter.wait()
+            r = await asyncio.to_thread(session.head, url, allow_redirects=True, timeout=HTTP_TIMEOUT_SEC)
+            if r.status_code == 405:  # HEAD を受け付けないサーバーは GET で確かめる
+                r = await _http_get(session, url, {}, limiter)
+    except requests.RequestException:
+        return None
+    if r.status_code != 200:
+        return None
+    if card_name and _name_key(normalize_card_name_for_search(card_name)) not in _name_key(r.text):
+        return None
+    return match_card_link(r.url, card_number)
+
+
+async def synthesized_lookup(session: requests.Session, card_number: str, candidates: list[str], card_name: str | None = None, limiter: RateLimiter | None = None) -> str | None:
+    """
+    候補 URL をまとめて並行に確かめる。ちょうど 1 つだけ当てはまればその URL。
+    複数当てはまるときはどれか決められないので None（検索に回す）
+    """
+    if not candidates:
+        return None
+    found = await asyncio.gather(*(verify_url(session, url, card_number, card_name, limiter) for url in candidates))
+    found = list(dict.fromkeys(url for url in found if url))
+    return found[0] if len(found) == 1 else None
+
+
+async def http_search(session: requests.Session, query: str, card_number: str, limiter: RateLimiter | None = None) -> str | None:
+    """
+    ブラウザを使わずに検索する。WordPress の検索 API の結果 URL を見て、
+    無ければ検索ページの静的 HTML のリンクを見る。見つからなければ None
+    """
+    try:
+        r = await _http_get(
+            session, WP_SEARCH_API_URL, {"search": query, "per_page": WP_SEARCH_PER_PAGE, "_fields": "url"}, limiter
+        )
+        if r.ok:
+            items = r.json()
+            if isinstance(items, list):
+                found = find_card_link((it.get("url") for it in items if isinstance(it, dict)), card_number)
+                if found:
+                    return found
+    except (requests.RequestException, ValueError):
+        pass
+    try:
+        r = await _http_get(session, SEARCH_URL, {"s": query}, limiter)
+        if r.ok:
+            return find_card_link(_HREF_RE.findall(r.text), card_number)
+    except requests.RequestException:
+        pass
+    return None
+
+
+async def http_lookup(session: requests.Session, card_number: str, card_name: str | None = None, limiter: RateLimiter | None = None) -> str | None:
+    """search_queries の順に http_search を試す。見つからなければ None（ブラウザでの検索に回す）"""
+    for q, _ in search_queries(card_number, card_name):
+        found = await http_search(session, q, card_number, limiter)
         if found:
             return found
-        if not_found:
-            continue  # 次のクエリを試す
-    # 最後の試行で NOT FOUND だったかは判定しない（複数クエリ試したため）
-    return NOT_FOUND_ON_SITE
+    return None
 
 
 def load_existing_links() -> dict[str, str]:
@@ -214,9 +434,132 @@ def load_existing_links() -> dict[str, str]:
     return {}
 
 
+def save_links(results: dict[str, str]):
+    """キーでソートして保存（一時ファイルに書いてから置き換え、途中で落ちても壊れない）"""
+    tmp = OUTPUT_PATH.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(results.items())), f, ensure_ascii=False, indent=2)
+    os.replace(tmp, OUTPUT_PATH)
+
+
+async def run_pool(to_process: list, results: dict[str, str], workers: int, min_interval: float, headed: bool, use_http: bool = True, use_browser: bool = True, use_synth: bool = True, negative: NegativeCache | None = None) -> Counter:
+    """
+    workers 個のワーカーでキューから 1 件ずつ取り出して並行に調べる。
+    候補 URL の確認（synth）→ HTTP での検索（http）→ ページプールのページでの検索（browser）の順。
+    見つかったらその場で results に入れて JSON に保存する。
+    negative を渡すと、ブラウザでサイトが NOT FOUND と表示したカードだけを記録し、見つかったカードの記録を消す。
+    戻り値: 取得元ごとの新規取得件数
+    """
+    total = len(to_process)
+    workers = max(1, min(workers, total))
+    queue: asyncio.Queue = asyncio.Queue()
+    for n, entry in enumerate(to_process, 1):
+        queue.put_nowait((n, entry))
+    limiter = RateLimiter(min_interval)
+    http_limiter = RateLimiter(HTTP_MIN_INTERVAL_SEC)
+    session = make_http_session(workers * MAX_URL_CANDIDATES) if (use_http or use_synth) else None
+    set_codes = learn_set_codes(results) if use_synth else {}
+    expansions = get_expansions() if use_synth else {}
+    fetched: Counter = Counter()
+
+    async def worker(pages: AsyncBrowserManager | None):
+        while True:
+            try:
+                n, (card_number, card_name, is_duplicate) = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            key = link_key(card_number, card_name, is_duplicate)
+            label = f"{card_number} {card_name}" if is_duplicate else card_number
+            name = card_name if is_duplicate else None
+            started = time.monotonic()
+            result = None
+            source = "synth"
+            try:
+                expansion = expansions.get((card_number, card_name))
+                if use_synth:
+                    candidates = candidate_urls(card_number, set_codes, expansion)
+                    result = await synthesized_lookup(session, card_number, candidates, card_name, http_limiter)
+                if not result and use_http:
+                    source = "http"
+                    result = await http_lookup(session, card_number, name, http_limiter)
+                if not result and pages is not None:
+                    source = "browser"
+                    async with pages.page() as page:
+                        result = await search_and_extract_link(card_number, page, name, limiter)
+                    await asyncio.sleep(REQUEST_DELAY_SEC)
+            except Exception as e:
+                print(f"  [{n}/{total}] {label} ... エラー: {e}")
+                run_history.error("lookup_error")
+                continue
+            elapsed = time.monotonic() - started
+            if result and result != NOT_FOUND_ON_SITE:
+                results[key] = result
+                add_set_code(set_codes, card_number, result)
+                fetched[source] += 1
+                save_links(results)
+                if negative is not None and key in negative.entries:
+                    negative.record_success(key)
+                    negative.save()
+                print(f"  [{n}/{total}] {label} ... {result}（{source} {elapsed:.1f} 秒）")
+            elif result == NOT_FOUND_ON_SITE:
+                if negative is not None:
+                    negative.record_failure(key, NOT_FOUND_ON_SITE)
+                    negative.save()
+                print(f"  [{n}/{total}] {label} ... NOT FOUND（{elapsed:.1f} 秒）")
+                run_history.count("not_found_on_site")
+            else:
+                print(f"  [{n}/{total}] {label} ... (見つからず)")
+                run_history.count("not_found")
+
+    try:
+        if not use_browser:
+            await asyncio.gather(*(worker(None) for _ in range(workers)))
+            return fetched
+        # ブラウザは最初にページが必要になったときに起動する（HTTP だけで済めば起動しない）
+        pages = AsyncBrowserManager(
+            headless=not headed,
+            engines=BROWSER_ENGINES,
+            timeout_ms=20000,
+            user_agent=USER_AGENT,
+            viewport=VIEWPORT,
+            context_options={
+                "locale": "ja-JP",
+                "extra_http_headers": {
+                    "Accept-Language": "ja,en;q=0.9",
+                    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+                },
+            },
+            max_pages=workers,
+            label="pokeca-chart",
+        )
+        try:
+            await asyncio.gather(*(worker(pages) for _ in range(workers)))
+        finally:
+            await pages.close()
+        return fetched
+    finally:
+        if session is not None:
+            session.close()
+
+
 def main():
+    profiling.setup("fetch_pokeca_chart_links")
+    parser = argparse.ArgumentParser(description="pokeca-chart.com のカード詳細ページ URL を取得")
+    parser.add_argument("--test", action="store_true", help="先頭8件のみ処理")
+    parser.add_argument("--headed", action="store_true", help="ブラウザを表示（ボット対策が厳しい場合に試す）")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"同時に使うページ数（デフォルト: {DEFAULT_WORKERS}）")
+    parser.add_argument("--min-interval", type=float, default=MIN_REQUEST_INTERVAL_SEC, help=f"検索の開始間隔の下限・秒（デフォルト: {MIN_REQUEST_INTERVAL_SEC}）")
+    parser.add_argument("--no-synth", action="store_true", help="候補 URL の組み立てを使わず、最初から検索する")
+    parser.add_argument("--no-http", action="store_true", help="HTTP での検索を使わず、最初から Playwright で検索する")
+    parser.add_argument("--http-only", action="store_true", help="Playwright を使わない（HTTP で見つからなければ「見つからず」）")
+    parser.add_argument("--retry-not-found", action="store_true", help="ネガティブキャッシュの待ち時間を無視して検索する")
+    args = parser.parse_args()
+    if args.no_http and args.http_only:
+        parser.error("--no-http と --http-only は同時に指定できません")
+    run_history.start("fetch_pokeca_chart_links")
+
     entries = get_card_entries()
-    if "--test" in sys.argv:
+    if args.test:
         entries = entries[:8]  # 055/050 など重複が含まれるように多め
         print("※ テストモード: 先頭8件のみ")
 
@@ -229,50 +572,51 @@ def main():
     to_process = [
         (card_number, card_name, is_duplicate)
         for card_number, card_name, is_duplicate in entries
-        if (_composite_key(card_number, card_name) if is_duplicate else card_number) not in results
+        if link_key(card_number, card_name, is_duplicate) not in results
+    ]
+    skipped_existing = len(entries) - len(to_process)
+    negative = NegativeCache(NEGATIVE_CACHE_NAMESPACE, ignore_wait=args.retry_not_found)
+    to_process = [
+        e for e in to_process
+        if not negative.is_blocked(link_key(*e))
     ]
     total_to_process = len(to_process)
-    if total_to_process < len(entries):
-        print(f"既存により {len(entries) - total_to_process} 件スキップ、今回 {total_to_process} 件を処理")
-
-    fetched = 0
-    use_headed = "--headed" in sys.argv  # ウィンドウ表示でボット対策が厳しい場合に試す
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=not use_headed)
-        context = browser.new_context(
-            user_agent=USER_AGENT,
-            viewport=VIEWPORT,
-            locale="ja-JP",
-            extra_http_headers={
-                "Accept-Language": "ja,en;q=0.9",
-                "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            },
+    run_history.count("cards", len(entries))
+    run_history.count("to_process", total_to_process)
+    # 既存のリンク・再試行待ちで検索せずに済んだカードをヒットとして記録する
+    run_history.cache("existing_links", skipped_existing, len(entries) - skipped_existing)
+    run_history.cache("negative", negative.skipped, total_to_process)
+    if skipped_existing or negative.skipped:
+        print(
+            f"既存により {skipped_existing} 件、前回見つからず再試行待ちにより {negative.skipped} 件スキップ、"
+            f"今回 {total_to_process} 件を処理"
         )
-        page = context.new_page()
-        page.set_default_timeout(20000)
 
-        for n, (card_number, card_name, is_duplicate) in enumerate(to_process, 1):
-            key = _composite_key(card_number, card_name) if is_duplicate else card_number
-            label = f"{card_number} {card_name}" if is_duplicate else card_number
-            print(f"  [{n}/{total_to_process}] {label} ... ", end="", flush=True)
-            result = search_and_extract_link(card_number, page, card_name if is_duplicate else None)
-            if result and result != NOT_FOUND_ON_SITE:
-                results[key] = result
-                print(result)
-                fetched += 1
-            elif result == NOT_FOUND_ON_SITE:
-                print("NOT FOUND")
-            else:
-                print("(見つからず)")
-            time.sleep(REQUEST_DELAY_SEC)
+    fetched: Counter = Counter()
+    started = time.monotonic()
+    if to_process:
+        # ウィンドウ表示（--headed）はボット対策が厳しい場合に試す
+        print(f"ワーカー {args.workers} 本で並行取得（ブラウザ検索の間隔 {args.min_interval} 秒以上）")
+        with profiling.stage("fetch"):
+            fetched = asyncio.run(
+                run_pool(
+                    to_process, results, args.workers, args.min_interval, args.headed,
+                    use_http=not args.no_http, use_browser=not args.http_only, use_synth=not args.no_synth,
+                    negative=negative,
+                )
+            )
 
-        browser.close()
+    for source, n in fetched.items():
+        run_history.count(f"fetched_{source}", n)
+    run_history.match(sum(fetched.values()), total_to_process)
 
     # JSON 保存（キーでソート）
-    with open(OUTPUT_PATH, "w", encoding="utf-8") as f:
-        json.dump(dict(sorted(results.items())), f, ensure_ascii=False, indent=2)
+    save_links(results)
 
-    print(f"\n完了: {len(results)} 件のリンクを保存（新規 {fetched} 件）")
+    print(
+        f"\n完了: {len(results)} 件のリンクを保存（新規 {sum(fetched.values())} 件: "
+        f"候補 URL {fetched['synth']} / HTTP 検索 {fetched['http']} / ブラウザ {fetched['browser']}、{time.monotonic() - started:.1f} 秒）"
+    )
     print(f"出力: {OUTPUT_PATH}")
 
 
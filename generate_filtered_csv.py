@@ -8,6 +8,10 @@ import csv
 import os
 import sys
 
+import card_snapshot
+import profiling
+import run_history
+
 # 鑑定費・利益率の定数（フロントの profitCalc.js と同一）
 GRADE_FEE_STANDARD = 3000
 GRADE_FEE_EXPRESS = 10000
@@ -126,9 +130,10 @@ def generate_filtered_csv(
 
     if not os.path.exists(input_path):
         print(f"エラー: {input_csv} が見つかりません")
+        run_history.fail(f"{input_csv} が見つかりません")
         return 1
 
-    with open(input_path, "r", encoding="utf-8-sig") as f:
+    with profiling.stage("read"), open(input_path, "r", encoding="utf-8-sig") as f:
         reader = csv.DictReader(f)
         rows = list(reader)
         fieldnames = reader.fieldnames or []
@@ -138,30 +143,38 @@ def generate_filtered_csv(
     out_fieldnames = list(fieldnames) + new_cols
 
     filtered_rows = []
-    for row in rows:
-        info = calc_card_profit(row)
-        if info is None:
-            continue
-        # フロントと同じく丸めずに比較（19.999... < 20 で除外）
-        if info["利益率_比較用"] < profit_rate_min:
-            continue
-        row_copy = dict(row)
-        row_copy["鑑定費"] = info["鑑定費"]
-        row_copy["手取り利益"] = info["手取り利益"]
-        row_copy["利益率"] = info["利益率"]
-        row_copy["月換算利益率"] = info.get("月換算利益率", "") if info.get("月換算利益率") is not None else ""
-        filtered_rows.append(row_copy)
-
-    with open(output_path, "w", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=out_fieldnames, extrasaction="ignore")
-        writer.writeheader()
-        writer.writerows(filtered_rows)
+    with profiling.stage("filter"):
+        for row in rows:
+            info = calc_card_profit(row)
+            if info is None:
+                continue
+            # フロントと同じく丸めずに比較（19.999... < 20 で除外）
+            if info["利益率_比較用"] < profit_rate_min:
+                continue
+            row_copy = dict(row)
+            row_copy["鑑定費"] = info["鑑定費"]
+            row_copy["手取り利益"] = info["手取り利益"]
+            row_copy["利益率"] = info["利益率"]
+            row_copy["月換算利益率"] = info.get("月換算利益率", "") if info.get("月換算利益率") is not None else ""
+            filtered_rows.append(row_copy)
+
+    with profiling.stage("write"):
+        with open(output_path, "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=out_fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(filtered_rows)
+        # 読む側（update_ebay_links_gemini・refresh_psa9_stats）用の型付きスナップショット
+        card_snapshot.write_snapshot(output_path)
 
     print(f"filtered_cards.csv を生成しました: {len(filtered_rows)} 件")
+    run_history.count("rows_in", len(rows))
+    run_history.count("rows_out", len(filtered_rows))
     return 0
 
 
 def main():
+    profiling.setup("generate_filtered_csv")
+    run_history.start("generate_filtered_csv")
     profit_rate_min = DEFAULT_PROFIT_RATE_MIN
     if "--profit-rate" in sys.argv:
         idx = sys.argv.index("--profit-rate")
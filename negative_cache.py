@@ -0,0 +1,141 @@
+"""
+見つからなかった検索の記録（ネガティブキャッシュ）。
+
+ポケ相場のリンクが見つからなかったカード（fetch_pokeca_chart_links.py）や、
+Gemini の英訳が空だった基本名（update_ebay_links_gemini.py）を negative_cache.json に残し、
+次に試してよい時刻（retry_after）までは検索・送信しない。
+失敗が続くほど待ち時間を倍にする（24 時間 → 48 時間 → … 最大 30 日）。見つかったら記録を消す。
+
+  {"pokeca_chart": {"055/050|ピカチュウ": {"failures": 2, "last_failed": "...", "retry_after": "...", "reason": "NOT_FOUND"}},
+   "ebay_name": {...}}
+
+実行:
+  python negative_cache.py stats                  … 種類ごとの件数・待ち中の件数を表示
+  python negative_cache.py clear [--namespace NS] … 記録を消す（次回はすべて検索し直す）
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(BASE_DIR, "negative_cache.json")
+BASE_BACKOFF_HOURS = 24  # 1 回目の失敗後に待つ時間
+MAX_BACKOFF_HOURS = 24 * 30
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _parse_time(value):
+    try:
+        dt = datetime.fromisoformat(str(value))
+    except (TypeError, ValueError):
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _load(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        print(f"警告: {path} を読めませんでした（記録なしで続行）: {e}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+class NegativeCache:
+    """
+    1 種類（namespace）ぶんの記録。同じファイルの他の namespace は読み込んだまま書き戻す。
+    ignore_wait=True のときは待ち時間を無視する（記録の更新・削除はする）
+    """
+
+    def __init__(self, namespace: str, path: str = DEFAULT_PATH, ignore_wait: bool = False):
+        self.namespace = namespace
+        self.path = path
+        self.ignore_wait = ignore_wait
+        self._data = _load(path)
+        entries = self._data.get(namespace)
+        self.entries: dict[str, dict] = entries if isinstance(entries, dict) else {}
+        self._data[namespace] = self.entries
+        self.skipped = 0
+
+    def is_blocked(self, key: str, now: datetime | None = None) -> bool:
+        """retry_after より前なら True（呼ぶたびに skipped を数える）"""
+        entry = self.entries.get(key)
+        if not entry or self.ignore_wait:
+            return False
+        retry_after = _parse_time(entry.get("retry_after"))
+        if retry_after is None or retry_after <= (now or _now()):
+            return False
+        self.skipped += 1
+        return True
+
+    def record_failure(self, key: str, reason: str = "", now: datetime | None = None):
+        """失敗を記録し、retry_after を失敗回数に応じて延ばす"""
+        now = now or _now()
+        entry = self.entries.get(key) or {}
+        failures = int(entry.get("failures") or 0) + 1
+        hours = min(BASE_BACKOFF_HOURS * 2 ** (failures - 1), MAX_BACKOFF_HOURS)
+        self.entries[key] = {
+            "failures": failures,
+            "first_failed": entry.get("first_failed") or now.isoformat(timespec="seconds"),
+            "last_failed": now.isoformat(timespec="seconds"),
+            "retry_after": (now + timedelta(hours=hours)).isoformat(timespec="seconds"),
+            "reason": reason,
+        }
+
+    def record_success(self, key: str):
+        self.entries.pop(key, None)
+
+    def save(self):
+        if not self.entries:
+            self._data.pop(self.namespace, None)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {ns: dict(sorted(entries.items())) for ns, entries in sorted(self._data.items())},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        os.replace(tmp, self.path)
+        self._data[self.namespace] = self.entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ネガティブキャッシュ（negative_cache.json）の確認・削除")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="種類ごとの件数・待ち中の件数を表示")
+    p_clear = sub.add_parser("clear", help="記録を消す")
+    p_clear.add_argument("--namespace", help="この種類だけ消す（省略時はすべて）")
+    args = parser.parse_args()
+
+    data = _load(args.path)
+    if args.command == "stats":
+        if not data:
+            print("記録はありません")
+        now = _now()
+        for ns, entries in sorted(data.items()):
+            waiting = sum(
+                1 for e in entries.values()
+                if (_parse_time(e.get("retry_after")) or now) > now
+            )
+            print(f"{ns}: {len(entries)} 件（待ち中 {waiting} 件）")
+        return
+
+    namespaces = [args.namespace] if args.namespace else list(data)
+    for ns in namespaces:
+        cache = NegativeCache(ns, args.path)
+        print(f"{ns}: {len(cache.entries)} 件を削除")
+        cache.entries.clear()
+        cache.save()
+
+
+if __name__ == "__main__":
+    main()
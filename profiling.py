@@ -0,0 +1,275 @@
+"""
+処理段階（stage）ごとの CPU プロファイル・メモリ割り当ての記録（各スクリプト・バックエンド共通）。
+
+通常は何もしない。次のどちらかで有効になる。
+  環境変数 PIPELINE_PROFILE=1（cpu / mem / all。1 は all）
+  コマンドラインの --profile（--profile=cpu など。setup() が sys.argv から取り除くので各スクリプトの引数解析には影響しない）
+
+有効なときは profiles/<実行 ID>/<入口名>/ に次を書き出す（終了時）。
+  cpu.folded     … サンプリングしたスタック（stage;スレッド;関数;… 回数）。flamegraph.pl・speedscope・inferno でそのまま読める
+  cpu_top.txt    … 自分自身で時間を使っている関数の上位 N 件（サンプル数）
+  mem_NN_<stage>.txt … stage の開始時と終了時の tracemalloc のスナップショットの差（行ごとの割り当ての上位 N 件。
+                       timing_only の stage（バックエンドのリクエストごとの stage）は書かない）
+  summary.json   … stage ごとの所要時間・サンプル数・メモリの増減とピーク
+実行全体も入口名の stage として記録する（各入口で置く stage はその内側）。
+
+CPU は PIPELINE_PROFILE_INTERVAL_MS（デフォルト 5）ミリ秒ごとに全スレッドのスタックを取る（壁時計のサンプリングなので、
+通信待ち・sleep も数える）。実行 ID は PIPELINE_RUN_ID（run_scheduled_update.sh が 1 回の実行で共通の値を渡す）、
+無ければ開始時刻。出力先のルートは PIPELINE_PROFILE_DIR（デフォルトはプロジェクトルートの profiles/）。
+
+  profiling.setup("scrape_rush")
+  with profiling.stage("search"):
+      ...
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+import run_history
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILE_ENV = "PIPELINE_PROFILE"
+PROFILE_DIR_ENV = "PIPELINE_PROFILE_DIR"
+INTERVAL_ENV = "PIPELINE_PROFILE_INTERVAL_MS"
+TOP_ENV = "PIPELINE_PROFILE_TOP"
+DEFAULT_DIR = os.path.join(BASE_DIR, "profiles")
+DEFAULT_INTERVAL_MS = 5
+DEFAULT_TOP = 25
+MODES = {"1": ("cpu", "mem"), "all": ("cpu", "mem"), "cpu": ("cpu",), "mem": ("mem",)}
+MAX_STACK_DEPTH = 128
+
+
+def _mode_from_argv(argv: list):
+    """--profile / --profile=MODE を argv から取り除き、指定された MODE（無ければ None）を返す"""
+    mode = None
+    for arg in list(argv[1:]):
+        if arg == "--profile" or arg.startswith("--profile="):
+            mode = arg.partition("=")[2] or "all"
+            argv.remove(arg)
+    return mode
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Profiler:
+    def __init__(self, entry: str, modes: tuple, out_dir: str, interval_ms: float = DEFAULT_INTERVAL_MS, top: int = DEFAULT_TOP):
+        self.entry = entry
+        self.modes = modes
+        self.out_dir = out_dir
+        self.interval = max(interval_ms, 1) / 1000
+        self.top = top
+        self.stages: list[dict] = []
+        self._active: list[dict] = []  # 入れ子の stage（外側から順）
+        self._samples: Counter = Counter()
+        self._self_samples: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = time.perf_counter()
+        self._finished = False
+        self._root = None
+        self._paused = 0  # スナップショットを取っている間は CPU のサンプルを取らない（計測側の処理を数えない）
+
+    def start(self):
+        if "mem" in self.modes and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if "cpu" in self.modes:
+            self._thread = threading.Thread(target=self._sample_loop, name="profiling-sampler", daemon=True)
+            self._thread.start()
+        # 実行全体を入口名の stage にする（stage を置いていない入口でも全体のメモリの記録が残る）
+        self._root = self.stage(self.entry)
+        self._root.__enter__()
+        print(f"プロファイル: {self.entry}（{'+'.join(self.modes)}）→ {self.out_dir}")
+        return self
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if self._paused:
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                prefix = [s["name"] for s in self._active] or ["(stage なし)"]
+                for stage in self._active:
+                    stage["cpu_samples"] += 1
+            if any(tid not in names for tid in frames):
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in frames.items():
+                if tid == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                stack.reverse()
+                self._samples[";".join(prefix + [names.get(tid, str(tid))] + stack)] += 1
+                self._self_samples[stack[-1]] += 1
+
+    @contextmanager
+    def stage(self, name: str, timing_only: bool = False):
+        record = {"name": name, "seconds": None, "cpu_samples": 0}
+        if timing_only:
+            # 同時に走る stage（バックエンドのリクエストなど）は入れ子の stack に積まない（他の stage の CPU・メモリと混ざる）
+            started = time.perf_counter()
+            try:
+                yield record
+            finally:
+                record["seconds"] = round(time.perf_counter() - started, 3)
+                with self._lock:
+                    self.stages.append(record)
+            return
+        snapshot = None
+        if tracemalloc.is_tracing():
+            self._paused += 1
+            tracemalloc.reset_peak()
+            snapshot = tracemalloc.take_snapshot()
+            self._paused -= 1
+        with self._lock:
+            self._active.append(record)
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 3)
+            with self._lock:
+                if record in self._active:
+                    self._active.remove(record)
+                self.stages.append(record)
+            if snapshot is not None:
+                self._paused += 1
+                try:
+                    self._write_memory(record, snapshot)
+                finally:
+                    self._paused -= 1
+
+    def _write_memory(self, record: dict, before):
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        # 入れ子の stage が reset_peak したぶんは、内側のピークを外側にも反映する
+        peak = max(peak, record.pop("_child_peak", 0))
+        with self._lock:
+            for outer in self._active:
+                outer["_child_peak"] = max(outer.get("_child_peak", 0), peak)
+        diff = after.compare_to(before, "lineno")
+        record["mem_diff_bytes"] = sum(d.size_diff for d in diff)
+        record["mem_current_bytes"] = current
+        record["mem_peak_bytes"] = peak
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in record["name"])
+        path = os.path.join(self.out_dir, f"mem_{len(self.stages):02d}_{safe}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                f"stage: {record['name']}  所要 {record['seconds']} 秒  増減 {record['mem_diff_bytes'] / 1024:,.1f} KiB  "
+                f"ピーク {peak / 1024 / 1024:,.1f} MiB\n\n"
+            )
+            for d in diff[: self.top]:
+                f.write(f"{d.size_diff / 1024:+12,.1f} KiB  {d.count_diff:+8d} 個  {d.traceback}\n")
+        record["mem_report"] = os.path.basename(path)
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        if self._root is not None:
+            self._root.__exit__(None, None, None)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        with self._lock:
+            # 終了時に閉じていない stage（例外で抜けたなど）も記録する
+            for record in self._active:
+                record["seconds"] = round(time.perf_counter() - self._started, 3)
+                self.stages.append(dict(record, unfinished=True))
+            self._active.clear()
+        if "cpu" in self.modes:
+            with open(os.path.join(self.out_dir, "cpu.folded"), "w", encoding="utf-8") as f:
+                for stack, count in sorted(self._samples.items()):
+                    f.write(f"{stack} {count}\n")
+            total = sum(self._self_samples.values()) or 1
+            with open(os.path.join(self.out_dir, "cpu_top.txt"), "w", encoding="utf-8") as f:
+                f.write(f"サンプル {total} 件（{self.interval * 1000:.0f} ms ごと・全スレッド）\n\n")
+                for label, count in self._self_samples.most_common(self.top):
+                    f.write(f"{count:8d}  {count / total:6.1%}  {label}\n")
+        summary = {
+            "entry": self.entry,
+            "run_id": os.path.basename(os.path.dirname(self.out_dir)),
+            "modes": list(self.modes),
+            "interval_ms": self.interval * 1000,
+            "total_seconds": round(time.perf_counter() - self._started, 3),
+            "stages": self.stages,
+        }
+        with open(os.path.join(self.out_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"プロファイルを保存しました: {self.out_dir}")
+
+
+_profiler: Profiler | None = None
+
+
+def setup(entry: str, argv: list | None = None) -> Profiler | None:
+    """
+    入口（スクリプトの main・バックエンドの起動時）で 1 回呼ぶ。--profile を argv（デフォルト sys.argv）から取り除き、
+    --profile か PIPELINE_PROFILE が指定されていればプロファイルを始める（終了時に自動で書き出す）
+    """
+    global _profiler
+    mode = _mode_from_argv(sys.argv if argv is None else argv)
+    if mode is not None:
+        os.environ[PROFILE_ENV] = mode  # このプロセスから起動する子プロセスにも引き継ぐ
+    mode = (mode or os.environ.get(PROFILE_ENV, "")).strip().lower()
+    if _profiler is not None or mode in ("", "0", "off"):
+        return _profiler
+    if mode not in MODES:
+        print(f"警告: {PROFILE_ENV}={mode} は不明です（cpu / mem / all）。プロファイルは取りません")
+        return None
+    root = os.environ.get(PROFILE_DIR_ENV, "").strip() or DEFAULT_DIR
+    try:
+        interval_ms = float(os.environ.get(INTERVAL_ENV, DEFAULT_INTERVAL_MS))
+        top = int(os.environ.get(TOP_ENV, DEFAULT_TOP))
+    except ValueError:
+        interval_ms, top = DEFAULT_INTERVAL_MS, DEFAULT_TOP
+    profiler = Profiler(entry, MODES[mode], os.path.join(root, run_history.run_id(), entry), interval_ms, top)
+    try:
+        os.makedirs(profiler.out_dir, exist_ok=True)
+    except OSError as e:
+        print(f"警告: プロファイルの出力先を作れませんでした（プロファイルなしで続行）: {e}")
+        return None
+    _profiler = profiler.start()
+    atexit.register(finish)
+    return _profiler
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+@contextmanager
+def stage(name: str, timing_only: bool = False):
+    """
+    処理段階。所要時間は常に実行履歴（run_history）に入れる。プロファイルが無効ならそれ以外は何もしない。
+    timing_only=True のときはプロファイルにも所要時間だけ記録する（メモリのスナップショット・CPU サンプルの stage 付けをしない）
+    """
+    started = time.perf_counter()
+    try:
+        if _profiler is None:
+            yield None
+        else:
+            with _profiler.stage(name, timing_only) as record:
+                yield record
+    finally:
+        run_history.add_stage(name, time.perf_counter() - started)
+
+
+def finish():
+    """結果を書き出す（atexit でも呼ばれる。2 回目以降は何もしない）"""
+    if _profiler is not None:
+        _profiler.finish()
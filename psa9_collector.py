@@ -0,0 +1,167 @@
+"""
+PSA9 ヤフオク相場の収集（GAS を経由せず Python から直接取得）。
+
+scripts/gas/psa9_stats_api.gs の getYahooStats と同じ検索クエリ（カード名 型番 レア PSA9）で
+ヤフオクの落札済み検索を取得し、同じ形式（yahooAvg, yahooMedian, recent1〜3, mercariUrl, hasHistory, error）を返す。
+平均・中央値は外れ値（四分位範囲の 1.5 倍より外の価格。まとめ売り・別グレードの混入など）を除いて計算する。
+
+refresh_psa9_stats.py（--source yahoo）から使う。ヤフオクの代わりにローカルの
+scripts/fake_yahoo_server.py に向けるには環境変数 YAHOO_CLOSEDSEARCH_URL を設定する。
+"""
+import os
+import re
+import time
+from urllib.parse import quote
+
+import numpy as np
+import requests
+
+YAHOO_CLOSEDSEARCH_URL = os.environ.get(
+    "YAHOO_CLOSEDSEARCH_URL", "https://auctions.yahoo.co.jp/closedsearch/closedsearch"
+)
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+)
+REQUEST_TIMEOUT_SEC = 30
+REQUEST_INTERVAL_SEC = 0.6  # 1 ワーカーあたりのリクエスト間隔（GAS の Utilities.sleep(600) 相当）
+MAX_RETRIES = 2
+RETRY_BASE_DELAY_SEC = 1
+OUTLIER_IQR_FACTOR = 1.5
+MIN_SAMPLES_FOR_OUTLIER = 4  # これより少ない件数では外れ値を判定しない
+
+# GAS と同じ抽出パターン（価格とタイトルリンクを出現順に対応させる）
+_PRICE_RE = re.compile(r'class="Product__priceValue">([\d,]+)円')
+_LINK_RE = re.compile(r'class="Product__titleLink" href="([^"]+)"')
+
+
+def build_query(card_name, card_number, rarity) -> str:
+    return f"{card_name or ''} {card_number or ''} {rarity or ''} PSA9".strip()
+
+
+def mercari_url(query: str) -> str:
+    # GAS の encodeURIComponent と同じエスケープ
+    keyword = quote(query, safe="!'()*")
+    return f"https://jp.mercari.com/search?keyword={keyword}&status=sold_out&sort=created_time&order=desc"
+
+
+def parse_closedsearch(html: str) -> tuple[list, list]:
+    """落札済み検索の HTML → (価格のリスト, 商品 URL のリスト)。どちらも表示順"""
+    prices = [int(m.replace(",", "")) for m in _PRICE_RE.findall(html)]
+    links = [
+        url if url.startswith("http") else f"https://auctions.yahoo.co.jp{url}"
+        for url in _LINK_RE.findall(html)
+    ]
+    return prices, links
+
+
+def _js_round(x: float) -> int:
+    """JavaScript の Math.round と同じ丸め（.5 は切り上げ）"""
+    return int(np.floor(x + 0.5))
+
+
+def robust_stats(prices) -> tuple[int | None, int | None]:
+    """
+    外れ値を除いた (平均, 中央値)。価格が無ければ (None, None)。
+    件数が MIN_SAMPLES_FOR_OUTLIER 以上なら四分位範囲 × OUTLIER_IQR_FACTOR の外側を除く。
+    """
+    arr = np.asarray(prices, dtype=float)
+    if arr.size == 0:
+        return None, None
+    if arr.size >= MIN_SAMPLES_FOR_OUTLIER:
+        q1, q3 = np.percentile(arr, [25, 75])
+        margin = (q3 - q1) * OUTLIER_IQR_FACTOR
+        kept = arr[(arr >= q1 - margin) & (arr <= q3 + margin)]
+        if kept.size:
+            arr = kept
+    return _js_round(arr.mean()), _js_round(np.median(arr))
+
+
+def stats_from_html(html: str, query: str) -> dict:
+    """HTML から GAS と同じ形式の相場を作る"""
+    prices, links = parse_closedsearch(html)
+    if not prices:
+        return {
+            "yahooAvg": None,
+            "yahooMedian": None,
+            "recent1": None,
+            "recent2": None,
+            "recent3": None,
+            "mercariUrl": mercari_url(query),
+            "hasHistory": False,
+        }
+    avg, median = robust_stats(prices)
+    # 直近 3 件は外れ値を含め、表示順のまま（価格とリンクが揃っているものだけ）
+    recents = [
+        {"price": prices[i], "url": links[i]} if i < len(prices) and i < len(links) and prices[i] else None
+        for i in range(3)
+    ]
+    return {
+        "yahooAvg": avg,
+        "yahooMedian": median,
+        "recent1": recents[0],
+        "recent2": recents[1],
+        "recent3": recents[2],
+        "mercariUrl": mercari_url(query),
+        "hasHistory": True,
+    }
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """keep-alive で使い回す Session（同時実行数ぶんのコネクションを保持）"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+
+def fetch_stats(session, card: dict, base_url: str = YAHOO_CLOSEDSEARCH_URL, retries: int = MAX_RETRIES) -> dict:
+    """
+    1 カードの相場を取得する。戻り値は GAS の results の 1 件と同じ形式。
+    再試行しても取得できなければ requests.RequestException を投げる（履歴なしの結果で既存の相場を上書きしない。
+    バッチごと呼び出し側の再試行に回る）。
+    """
+    card_name = card.get("card_name") or card.get("cardName") or ""
+    card_number = card.get("card_number") or card.get("cardNum") or ""
+    rarity = card.get("rarity") or ""
+    result = {
+        "id": card.get("id") or card_number,
+        "cardName": card_name,
+        "cardNum": card_number,
+        "rarity": rarity,
+    }
+    query = build_query(card_name, card_number, rarity)
+    if not query or query == "PSA9":
+        result.update(stats_from_html("", query))
+        result["mercariUrl"] = None
+        result["error"] = None
+        return result
+
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(RETRY_BASE_DELAY_SEC * (2 ** (attempt - 1)))
+        try:
+            r = session.get(base_url, params={"p": query}, timeout=REQUEST_TIMEOUT_SEC)
+            r.raise_for_status()
+            break
+        except requests.RequestException:
+            if attempt >= retries:
+                raise
+    result.update(stats_from_html(r.text, query))
+    result["error"] = None
+    return result
+
+
+def collect_batch(session, batch: list, base_url: str = YAHOO_CLOSEDSEARCH_URL, interval_sec: float = REQUEST_INTERVAL_SEC) -> list:
+    """
+    バッチ内のカードを順に取得する（バッチ同士の並行実行は呼び出し側で行う）。
+    1 件でも取得できなければ requests.RequestException を投げる（GAS の 1 バッチ失敗と同じ扱い）
+    """
+    results = []
+    for i, card in enumerate(batch):
+        if i and interval_sec > 0:
+            time.sleep(interval_sec)
+        results.append(fetch_stats(session, card, base_url))
+    return results
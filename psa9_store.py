@@ -0,0 +1,452 @@
+"""
+PSA9 相場の保存先（追記専用ログ + スナップショット）
+
+- psa9_stats.json          … コンパクション時点のスナップショット（従来どおりの {キー: 相場} 形式）
+- psa9_stats.log.jsonl     … それ以降の更新を 1 行 1 件で追記するログ（{"key": ..., "stats": {...}}）
+
+書き込みは更新件数ぶんの追記だけで済み、ファイル全体を書き直さない。
+読み込み側はログを一度走査して「キー → 最新行のオフセット」を持ち、追記分だけ差分で読み進める。
+コンパクションでスナップショットに最新値をまとめ、上書きされた古い行・対象外のカードの行を捨ててログを空にする。
+追記とコンパクションは psa9_stats.log.jsonl.lock のファイルロックで排他にし、コンパクションは
+ログを空の新しいファイルに os.replace で置き換える。読み込み側（バックエンドなど別プロセス）は
+ログの inode とスナップショットの更新時刻が変わったら最初から読み直す。
+
+実行:
+  python psa9_store.py compact            … merged_card_data.csv にないカード（孤立エントリ）も削除
+  python psa9_store.py compact --keep-orphans
+  python psa9_store.py migrate            … 旧形式のキー（No_card_number_rowIndex）を card_number|カード名 に書き換える
+  python psa9_store.py stats              … ログ行数・キー数などを表示
+"""
+import argparse
+import json
+import os
+import sys
+from contextlib import contextmanager
+
+# ファイルロックは任意（fcntl の無い Windows ではロックしない）
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import profiling
+import run_history
+from card_identity import canonical_key, card_number_of, clean  # noqa: F401（canonical_key は従来どおりここからも import できる）
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_PATH = os.path.join(BASE_DIR, "psa9_stats.json")
+LOG_PATH = os.path.join(BASE_DIR, "psa9_stats.log.jsonl")
+MERGED_CSV = os.path.join(BASE_DIR, "merged_card_data.csv")
+
+
+class Psa9Store:
+    def __init__(self, snapshot_path: str = SNAPSHOT_PATH, log_path: str = LOG_PATH):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path
+        self.lock_path = f"{log_path}.lock"
+        self._offsets: dict[str, int] = {}
+        self._scanned = 0  # ログを読み終えた位置（バイト）
+        self._log_lines = 0
+        self._generation = None  # 読み終えたログの世代（ログの inode・スナップショットの更新時刻）
+        self._snapshot: dict | None = None
+        self._snapshot_mtime = None
+
+    # --- 読み込み ---------------------------------------------------------
+
+    def _snapshot_mtime_now(self):
+        try:
+            return os.stat(self.snapshot_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_snapshot(self) -> dict:
+        mtime = self._snapshot_mtime_now()
+        if mtime is None:
+            self._snapshot, self._snapshot_mtime = {}, None
+            return self._snapshot
+        if self._snapshot is None or mtime != self._snapshot_mtime:
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, IOError):
+                data = {}
+            self._snapshot = data if isinstance(data, dict) else {}
+            self._snapshot_mtime = mtime
+        return self._snapshot
+
+    def _reset_index(self):
+        self._offsets.clear()
+        self._scanned = 0
+        self._log_lines = 0
+
+    def _open_log(self):
+        try:
+            return open(self.log_path, "rb")
+        except OSError:
+            return None
+
+    def _scan(self, f):
+        """
+        開いたログ f の追記分を読んで「キー → 最新行のオフセット」を更新する。
+        コンパクションでログが置き換わった（inode が変わった・スナップショットが書き直された・短くなった）ときや、
+        途中から読んだ行が壊れていた（ずれた位置から読んだ）ときは、最初から読み直す
+        """
+        st = os.fstat(f.fileno()) if f is not None else None
+        generation = ((st.st_dev, st.st_ino) if st else None, self._snapshot_mtime_now())
+        if generation != self._generation or (st is not None and st.st_size < self._scanned):
+            self._reset_index()
+            self._generation = generation
+        if st is None or st.st_size == self._scanned:
+            return
+        rescanned = self._scanned == 0
+        f.seek(self._scanned)
+        while True:
+            offset = f.tell()
+            line = f.readline()
+            if not line or not line.endswith(b"\n"):
+                # 書き込み途中の行は次回に読む
+                break
+            try:
+                key = json.loads(line).get("key")
+            except (json.JSONDecodeError, UnicodeDecodeError, AttributeError):
+                if not rescanned:
+                    self._reset_index()
+                    f.seek(0)
+                    rescanned = True
+                    continue
+                key = None  # 最初から読んでも壊れている行は飛ばす
+            self._scanned = f.tell()
+            if isinstance(key, str):
+                self._offsets[key] = offset
+                self._log_lines += 1
+
+    def refresh_index(self):
+        """ログの追記分だけ読んで「キー → 最新行のオフセット」を更新する"""
+        f = self._open_log()
+        try:
+            self._scan(f)
+        finally:
+            if f is not None:
+                f.close()
+
+    def _read_at(self, f, offset: int, key: str):
+        """offset の行が key の行なら (True, 相場)、ずれていれば (False, None)"""
+        f.seek(offset)
+        try:
+            rec = json.loads(f.readline())
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return False, None
+        if not isinstance(rec, dict) or rec.get("key") != key:
+            return False, None
+        return True, rec.get("stats")
+
+    def _read_latest(self, keys=None) -> dict:
+        """
+        ログの最新値 {キー: 相場}（keys を渡すとそのキーだけ）。索引と同じファイルを開いたまま読み、
+        オフセットの行が食い違えば最初から読み直して 1 回だけやり直す
+        """
+        f = self._open_log()
+        if f is None:
+            self._scan(None)
+            return {}
+        with f:
+            for attempt in range(2):
+                self._scan(f)
+                items = self._offsets.items() if keys is None else (
+                    (k, self._offsets[k]) for k in keys if k in self._offsets
+                )
+                latest = {}
+                stale = False
+                for key, offset in sorted(items, key=lambda kv: kv[1]):
+                    ok, stats = self._read_at(f, offset, key)
+                    if ok:
+                        latest[key] = stats
+                    else:
+                        stale = True
+                if not stale or attempt:
+                    return latest
+                self._reset_index()
+        return latest
+
+    def get(self, key: str):
+        """1 件だけ引く（ログにあれば最新行、なければスナップショット）"""
+        latest = self._read_latest([key])
+        if key in latest:
+            return latest[key]
+        return self._load_snapshot().get(key)
+
+    def load_all(self) -> dict:
+        """スナップショットにログの最新値を重ねた {キー: 相場}"""
+        latest = self._read_latest()
+        merged = dict(self._load_snapshot())
+        merged.update(latest)
+        return merged
+
+    # --- 書き込み ---------------------------------------------------------
+
+    @contextmanager
+    def _locked(self):
+        """追記とコンパクションを排他にするファイルロック（fcntl が無い環境ではロックしない）"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def append(self, updates: dict):
+        """更新分だけログに追記する"""
+        if not updates:
+            return
+        lines = "".join(
+            json.dumps({"key": k, "stats": v}, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for k, v in updates.items()
+        )
+        with self._locked():
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def compact(self, valid_key=None) -> dict:
+        """
+        スナップショット + ログの最新値を psa9_stats.json にまとめ、ログを空にする。
+        valid_key(key) -> bool を渡すと、False のキー（孤立エントリ）を捨てる。
+        ロックを取ってから読むので、読んだあと・置き換える前に追記された行を取りこぼさない。
+        戻り値: 件数の内訳
+        """
+        with self._locked():
+            merged = self.load_all()
+            log_lines = self._log_lines
+            log_keys = len(self._offsets)
+            dropped = 0
+            if valid_key is not None:
+                kept = {k: v for k, v in merged.items() if valid_key(k)}
+                dropped = len(merged) - len(kept)
+                merged = kept
+            self._replace(merged)
+        return {
+            "keys": len(merged),
+            "log_lines": log_lines,
+            "superseded": log_lines - log_keys,
+            "orphaned": dropped,
+        }
+
+    def rewrite(self, transform):
+        """
+        ロックを取ったうえで、スナップショット + ログの最新値を transform(data) -> dict で置き換え、ログを空にする。
+        戻り値: transform の戻り値
+        """
+        with self._locked():
+            data = transform(self.load_all())
+            self._replace(data)
+        return data
+
+    def _replace(self, data: dict):
+        """スナップショットを data で置き換え、ログを空の新しいファイルに置き換える（ロック中に呼ぶ）"""
+        tmp = f"{self.snapshot_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.snapshot_path)
+        # スナップショットを書いてからログを置き換える（途中で落ちてもログの再適用で同じ結果になる）。
+        # 切り詰めずに別ファイルへ置き換えるので、読み込み側は inode の変化で読み直しに気づく
+        log_tmp = f"{self.log_path}.tmp"
+        with open(log_tmp, "w", encoding="utf-8"):
+            pass
+        os.replace(log_tmp, self.log_path)
+        self._reset_index()
+        self._generation = None
+
+    @property
+    def source_paths(self) -> tuple:
+        return (self.snapshot_path, self.log_path)
+
+
+def psa9_score(psa9: dict) -> int:
+    """候補の中から「よりデータが揃っているもの」を優先するスコア。"""
+    if not isinstance(psa9, dict):
+        return -10**9
+    if psa9.get("error"):
+        return -10**6
+    recent_urls = []
+    for key in ("recent1", "recent2", "recent3"):
+        r = psa9.get(key) or {}
+        recent_urls.append(r.get("url"))
+    has_recent = any(u for u in recent_urls if isinstance(u, str) and u.strip())
+    yahoo_avg = psa9.get("yahooAvg")
+    has_hist = psa9.get("hasHistory") is True
+
+    score = 0
+    if has_recent:
+        score += 100
+    if yahoo_avg is not None:
+        score += 20
+    if has_hist:
+        score += 5
+    return score
+
+
+def is_legacy_key(key) -> bool:
+    """旧形式「No_card_number_rowIndex」のキーか"""
+    return isinstance(key, str) and "|" not in key and len(key.split("_")) >= 3
+
+
+def canonicalize(stats: dict, cards: list) -> tuple[dict, dict]:
+    """
+    旧形式のキーを正規のキーに書き換える。
+    cards: CSV の行順に並べた (No, card_number, カード名) のリスト（rowIndex の照合に使う）
+
+    - 旧キーの rowIndex の行が No・card_number と一致すればその行のカード名を使う
+    - 一致しなければ、同じ No・card_number を持つすべてのカードに割り当てる
+      （バックエンドの prefix フォールバックと同じ結果）
+    - 同じキーに複数の候補があれば、正規キーのもの → rowIndex が一致した旧キー → psa9_score が高いもの
+      の順に優先する（同点なら先に出てきた方。バックエンドのこれまでの照合順と同じ）
+    戻り値: (正規キーだけの dict, 内訳 {"migrated", "duplicates", "orphaned": [旧キー...]})
+    """
+    by_prefix: dict[str, list[str]] = {}
+    for no, cn, name in cards:
+        key = canonical_key(cn, name)
+        if key and no:
+            names = by_prefix.setdefault(f"{no}_{cn}", [])
+            if key not in names:
+                names.append(key)
+
+    candidates: dict[str, list[tuple]] = {}
+    orphaned = []
+    migrated = 0
+    for k, v in stats.items():
+        if not isinstance(k, str):
+            continue
+        if not is_legacy_key(k):
+            candidates.setdefault(k, []).append((1, 1, psa9_score(v), v))
+            continue
+        parts = k.split("_")
+        prefix = f"{parts[0]}_{parts[1]}"
+        targets = []
+        exact = 0
+        try:
+            idx = int(parts[-1])
+        except ValueError:
+            idx = -1
+        if 0 <= idx < len(cards):
+            no, cn, name = cards[idx]
+            if f"{no}_{cn}" == prefix and canonical_key(cn, name):
+                targets = [canonical_key(cn, name)]
+                exact = 1
+        if not targets:
+            targets = by_prefix.get(prefix, [])
+        if not targets:
+            orphaned.append(k)
+            continue
+        migrated += 1
+        for key in targets:
+            candidates.setdefault(key, []).append((0, exact, psa9_score(v), v))
+
+    result = {}
+    duplicates = 0
+    for key, cands in candidates.items():
+        duplicates += len(cands) - 1
+        result[key] = max(cands, key=lambda c: c[:3])[3]
+    return result, {"migrated": migrated, "duplicates": duplicates, "orphaned": orphaned}
+
+
+def _read_csv_cards(csv_path: str) -> list:
+    """CSV を行順に (No, card_number, カード名) のリストで読む"""
+    import csv
+
+    cards = []
+    with open(csv_path, "r", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            cards.append((clean(row.get("No")), card_number_of(row), clean(row.get("カード名"))))
+    return cards
+
+
+def _current_key_checker(csv_path: str):
+    """merged_card_data.csv のカードに対応するキーなら True を返す関数"""
+    composite = set()
+    prefixes = set()
+    for no, cn, name in _read_csv_cards(csv_path):
+        key = canonical_key(cn, name)
+        if key:
+            composite.add(key)
+        if no and cn:
+            prefixes.add(f"{no}_{cn}")
+
+    def valid(key: str) -> bool:
+        if not is_legacy_key(key):
+            return key in composite
+        # 旧形式 No_card_number_rowIndex
+        parts = key.split("_")
+        return f"{parts[0]}_{parts[1]}" in prefixes
+
+    return valid
+
+
+def main():
+    profiling.setup("psa9_store")
+    parser = argparse.ArgumentParser(description="PSA9 相場ログのコンパクション")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_compact = sub.add_parser("compact", help="ログをスナップショットにまとめる")
+    p_compact.add_argument("--keep-orphans", action="store_true", help="merged_card_data.csv にないカードの相場も残す")
+    p_compact.add_argument("--csv", default=MERGED_CSV, help="孤立判定に使う CSV")
+    p_migrate = sub.add_parser("migrate", help="旧形式のキーを card_number|カード名 に書き換える")
+    p_migrate.add_argument("--csv", default=MERGED_CSV, help="rowIndex・No の照合に使う CSV")
+    p_migrate.add_argument("--dry-run", action="store_true", help="内訳を表示するだけで書き換えない")
+    sub.add_parser("stats", help="ログとスナップショットの状態を表示")
+    args = parser.parse_args()
+
+    if args.command != "stats":  # 表示だけの stats は実行履歴に残さない
+        run_history.start(f"psa9_store_{args.command}")
+    store = Psa9Store()
+    if args.command == "stats":
+        store.refresh_index()
+        print(f"スナップショット: {len(store._load_snapshot())} 件")
+        print(f"ログ: {store._log_lines} 行（キー {len(store._offsets)} 件）")
+        return
+
+    if args.command == "migrate":
+        if not os.path.exists(args.csv):
+            print(f"エラー: {args.csv} が見つかりません", file=sys.stderr)
+            run_history.fail(f"{args.csv} が見つかりません")
+            sys.exit(1)
+        cards = _read_csv_cards(args.csv)
+
+        def migrate(data: dict) -> dict:
+            migrated, report = canonicalize(data, cards)
+            print(
+                f"旧形式 {report['migrated']} 件を正規キーに変換、重複 {report['duplicates']} 件を統合、"
+                f"孤立 {len(report['orphaned'])} 件（{len(data)} 件 → {len(migrated)} 件）"
+            )
+            for k in report["orphaned"]:
+                print(f"  孤立: {k}")
+            return migrated
+
+        if args.dry_run:
+            migrate(store.load_all())
+            print("（--dry-run のため書き換えません）")
+            return
+        store.rewrite(migrate)
+        print(f"保存: {store.snapshot_path}")
+        return
+
+    valid = None
+    if not args.keep_orphans:
+        if not os.path.exists(args.csv):
+            print(f"エラー: {args.csv} が見つかりません（--keep-orphans で孤立判定をスキップ）", file=sys.stderr)
+            run_history.fail(f"{args.csv} が見つかりません")
+            sys.exit(1)
+        valid = _current_key_checker(args.csv)
+    result = store.compact(valid)
+    for name in ("keys", "log_lines", "superseded", "orphaned"):
+        run_history.count(name, result[name])
+    print(
+        f"コンパクション完了: {result['keys']} 件を {store.snapshot_path} に保存"
+        f"（ログ {result['log_lines']} 行、上書き済み {result['superseded']} 行・孤立 {result['orphaned']} 件を削除）"
+    )
+
+
+if __name__ == "__main__":
+    main()
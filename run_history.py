@@ -0,0 +1,340 @@
+"""
+パイプラインの実行履歴（run_history.jsonl）。
+
+各スクリプトの 1 回の実行ごとに 1 行（JSON）を追記する。毎回記録する（プロファイルと違って常に有効）。
+  {"run_id": "20261018_010000", "entry": "scrape_rush", "started_at": "...", "seconds": 5123.4, "status": "ok",
+   "stages": {"read": 0.02, "search": 5120.1, "save": 0.1},
+   "counts": {"cards": 869, "matched": 812, ...}, "match_rate": 0.934,
+   "caches": {"translation": {"hits": 40, "misses": 3, "hit_rate": 0.93}},
+   "errors": {"cloudflare_retry": 4, "timeout": 1}}
+
+stage の所要時間は profiling.stage() から入る（プロファイルを有効にしていなくても記録する）。
+run_id は PIPELINE_RUN_ID（run_scheduled_update.sh が 1 回の実行で共通の値を渡す）、無ければ開始時刻。
+例外で終わった実行は status が "error"（error に例外の種類）になる。
+sys.exit(1) で抜ける箇所は先に run_history.fail(理由) を呼ぶ（SystemExit は例外として記録されず "ok" のままになるため）。
+
+  run = run_history.start("scrape_rush")
+  run_history.count("matched")            … 実行中のどこからでも（記録していなければ何もしない）
+  run_history.error("cloudflare_retry")
+
+実行:
+  python run_history.py show [--entry NAME] [--last N] … 直近の記録を表示
+  python run_history.py summary [--days N] [--weekly] … 入口ごとの直近と、それまでの中央値との比較（--weekly で週ごとの集計も）
+"""
+import argparse
+import atexit
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PATH_ENV = "RUN_HISTORY_PATH"
+RUN_ID_ENV = "PIPELINE_RUN_ID"
+DEFAULT_PATH = os.path.join(BASE_DIR, "run_history.jsonl")
+SUMMARY_WINDOW = 10  # 直近の実行と比べる過去の実行数
+SLOWER_RATIO = 1.5  # 過去の中央値よりこの倍率以上かかったら「遅い」
+SLOWER_MIN_SEC = 1.0  # ただし差がこの秒数未満なら数えない（数十ミリ秒で終わる処理のぶれ）
+MATCH_DROP = 0.05  # 一致率が過去の中央値からこれ以上下がったら「下がった」
+
+
+def history_path() -> str:
+    return os.environ.get(PATH_ENV, "").strip() or DEFAULT_PATH
+
+
+def run_id() -> str:
+    """実行 ID（PIPELINE_RUN_ID。無ければ今の時刻で決めて環境変数に入れ、子プロセスにも引き継ぐ）"""
+    value = os.environ.get(RUN_ID_ENV, "").strip()
+    if not value:
+        value = datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.environ[RUN_ID_ENV] = value
+    return value
+
+
+class RunRecorder:
+    def __init__(self, entry: str, path: str | None = None):
+        self.entry = entry
+        self.path = path or history_path()
+        self.run_id = run_id()
+        self.started_at = datetime.now().astimezone()
+        self._started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.counts: dict[str, int | float] = {}
+        self.errors: dict[str, int] = {}
+        self.caches: dict[str, dict] = {}
+        self.match_rate: float | None = None
+        self.status = "ok"
+        self.error_detail = None
+        self._finished = False
+        self._lock = threading.Lock()  # 取得処理のワーカースレッドからも数える
+
+    def add_stage(self, name: str, seconds: float):
+        """同じ名前の stage が何度もあれば合計する"""
+        self.stages[name] = round(self.stages.get(name, 0.0) + seconds, 3)
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def error(self, name: str, n: int = 1):
+        if not n:
+            return
+        with self._lock:
+            self.errors[name] = self.errors.get(name, 0) + n
+
+    def cache(self, name: str, hits: int, misses: int):
+        looked_up = hits + misses
+        self.caches[name] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / looked_up, 4) if looked_up else None,
+        }
+
+    def match(self, matched: int, total: int):
+        """一致率（照合できた件数 / 照合した件数）"""
+        self.match_rate = round(matched / total, 4) if total else None
+
+    def fail(self, detail: str):
+        self.status = "error"
+        self.error_detail = detail
+
+    def record(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "entry": self.entry,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "seconds": round(time.perf_counter() - self._started, 3),
+            "status": self.status,
+            "error": self.error_detail,
+            "stages": self.stages,
+            "counts": self.counts,
+            "match_rate": self.match_rate,
+            "caches": self.caches,
+            "errors": self.errors,
+        }
+
+    def finish(self):
+        """1 行追記する（2 回目以降は何もしない）。書けなくても実行自体は失敗させない"""
+        if self._finished:
+            return
+        self._finished = True
+        line = json.dumps(self.record(), ensure_ascii=False)
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"警告: {self.path} に実行履歴を書けませんでした: {e}")
+
+
+_current: RunRecorder | None = None
+_previous_excepthook = sys.excepthook
+
+
+def _excepthook(exc_type, exc, tb):
+    if _current is not None:
+        _current.fail(exc_type.__name__)
+    _previous_excepthook(exc_type, exc, tb)
+
+
+def start(entry: str, path: str | None = None) -> RunRecorder:
+    """入口（スクリプトの main）で 1 回呼ぶ。終了時に自動で追記する"""
+    global _current
+    if _current is None:
+        _current = RunRecorder(entry, path)
+        sys.excepthook = _excepthook
+        atexit.register(finish)
+    return _current
+
+
+def current() -> RunRecorder | None:
+    return _current
+
+
+def add_stage(name: str, seconds: float):
+    if _current is not None:
+        _current.add_stage(name, seconds)
+
+
+def count(name: str, n: int = 1):
+    if _current is not None:
+        _current.count(name, n)
+
+
+def error(name: str, n: int = 1):
+    if _current is not None:
+        _current.error(name, n)
+
+
+def cache(name: str, hits: int, misses: int):
+    if _current is not None:
+        _current.cache(name, hits, misses)
+
+
+def match(matched: int, total: int):
+    if _current is not None:
+        _current.match(matched, total)
+
+
+def fail(detail: str):
+    if _current is not None:
+        _current.fail(detail)
+
+
+def finish():
+    if _current is not None:
+        _current.finish()
+
+
+# --- 読み込み・集計 ---
+
+def load(path: str | None = None, entry: str | None = None, days: float | None = None) -> list:
+    """記録を古い順に。壊れた行は飛ばす"""
+    path = path or history_path()
+    if not os.path.exists(path):
+        return []
+    since = datetime.now().astimezone() - timedelta(days=days) if days else None
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(rec, dict) or (entry and rec.get("entry") != entry):
+                continue
+            if since is not None:
+                try:
+                    if datetime.fromisoformat(str(rec.get("started_at"))) < since:
+                        continue
+                except ValueError:
+                    continue
+            records.append(rec)
+    records.sort(key=lambda r: str(r.get("started_at")))
+    return records
+
+
+def _median(values: list):
+    values = [v for v in values if isinstance(v, (int, float))]
+    return statistics.median(values) if values else None
+
+
+def summarize(records: list, window: int = SUMMARY_WINDOW) -> dict:
+    """
+    入口ごとに、直近の実行とそれより前の window 回の中央値を比べる。
+      {"scrape_rush": {"runs": 30, "last": {...}, "median_seconds": 5000.0, "slower": false,
+                       "median_match_rate": 0.93, "match_dropped": false, "error_runs": 2}}
+    """
+    by_entry: dict[str, list] = {}
+    for rec in records:
+        by_entry.setdefault(rec.get("entry") or "?", []).append(rec)
+    summary = {}
+    for entry, recs in sorted(by_entry.items()):
+        last = recs[-1]
+        before = [r for r in recs[:-1] if r.get("status") == "ok"][-window:]
+        median_seconds = _median([r.get("seconds") for r in before])
+        median_match = _median([r.get("match_rate") for r in before])
+        last_match = last.get("match_rate")
+        summary[entry] = {
+            "runs": len(recs),
+            "error_runs": sum(1 for r in recs if r.get("status") != "ok"),
+            "last": last,
+            "median_seconds": median_seconds,
+            "slower": bool(
+                median_seconds is not None
+                and (last.get("seconds") or 0) > median_seconds * SLOWER_RATIO
+                and (last.get("seconds") or 0) - median_seconds >= SLOWER_MIN_SEC
+            ),
+            "median_match_rate": median_match,
+            "match_dropped": bool(
+                median_match is not None and last_match is not None and last_match < median_match - MATCH_DROP
+            ),
+        }
+    return summary
+
+
+def weekly(records: list) -> list:
+    """
+    入口・週（ISO 週の月曜日）ごとの集計（週単位の傾向を見る用）。古い順。
+      [{"entry": "scrape_rush", "week": "2026-10-12", "runs": 7, "error_runs": 0, "median_seconds": 5012.3,
+        "median_match_rate": 0.93, "errors": {"cloudflare_retry": 21}}]
+    """
+    groups: dict[tuple, list] = {}
+    for rec in records:
+        try:
+            started = datetime.fromisoformat(str(rec.get("started_at")))
+        except ValueError:
+            continue
+        week = (started - timedelta(days=started.weekday())).date().isoformat()
+        groups.setdefault((rec.get("entry") or "?", week), []).append(rec)
+    rows = []
+    for (entry, week), recs in sorted(groups.items(), key=lambda kv: (kv[0][1], kv[0][0])):
+        errors: dict[str, int] = {}
+        for r in recs:
+            for name, n in (r.get("errors") or {}).items():
+                errors[name] = errors.get(name, 0) + n
+        ok = [r for r in recs if r.get("status") == "ok"]
+        rows.append({
+            "entry": entry,
+            "week": week,
+            "runs": len(recs),
+            "error_runs": len(recs) - len(ok),
+            "median_seconds": _median([r.get("seconds") for r in ok]),
+            "median_match_rate": _median([r.get("match_rate") for r in ok]),
+            "errors": errors,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="パイプラインの実行履歴（run_history.jsonl）の表示")
+    parser.add_argument("--path", default=None, help=f"履歴ファイル（デフォルト: {DEFAULT_PATH}）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_show = sub.add_parser("show", help="直近の記録を表示")
+    p_show.add_argument("--entry", help="この入口だけ")
+    p_show.add_argument("--last", type=int, default=20)
+    p_summary = sub.add_parser("summary", help="入口ごとの直近と過去の中央値の比較")
+    p_summary.add_argument("--days", type=float, default=90)
+    p_summary.add_argument("--weekly", action="store_true", help="週ごとの集計も表示")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        records = load(args.path, entry=args.entry)[-args.last :]
+        if not records:
+            print("記録はありません")
+        for r in records:
+            stages = "、".join(f"{k} {v:.1f}s" for k, v in r.get("stages", {}).items())
+            errors = "、".join(f"{k} {v}" for k, v in r.get("errors", {}).items()) or "なし"
+            rate = f"{r['match_rate']:.1%}" if r.get("match_rate") is not None else "-"
+            print(
+                f"{r.get('started_at')} {r.get('entry'):<26} {r.get('status'):<5} {r.get('seconds', 0):9.1f} 秒  "
+                f"一致率 {rate}  エラー {errors}  [{stages}]"
+            )
+        return
+
+    records = load(args.path, days=args.days)
+    summary = summarize(records)
+    if not summary:
+        print("記録はありません")
+    for entry, s in summary.items():
+        last = s["last"]
+        median = f"{s['median_seconds']:.1f} 秒" if s["median_seconds"] is not None else "-"
+        marks = [m for m, on in (("遅くなった", s["slower"]), ("一致率が下がった", s["match_dropped"])) if on]
+        print(
+            f"{entry:<26} {s['runs']:4d} 回（エラー {s['error_runs']}）  直近 {last.get('seconds', 0):.1f} 秒 / 中央値 {median}"
+            f"{'  ← ' + '・'.join(marks) if marks else ''}"
+        )
+
+    if args.weekly and records:
+        print("\n週ごと（中央値）:")
+        for w in weekly(records):
+            median = f"{w['median_seconds']:.1f} 秒" if w["median_seconds"] is not None else "-"
+            rate = f"{w['median_match_rate']:.1%}" if w["median_match_rate"] is not None else "-"
+            errors = "、".join(f"{k} {v}" for k, v in w["errors"].items()) or "なし"
+            print(f"  {w['week']} {w['entry']:<26} {w['runs']:3d} 回  {median}  一致率 {rate}  エラー {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,11 @@
 """
 import re
 import csv
-from playwright.sync_api import sync_playwright
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+import profiling
+import run_history
+from browser_manager import BrowserManager
 
 
 def extract_card_number(card_name: str) -> str:
@@ -62,6 +65,103 @@ def clean_price(price_str: str) -> int:
         return 0
 
 
+def parse_price_row(cell_texts: List[str], current_set_name: str = "") -> Tuple[Optional[Dict], str]:
+    """
+    買取価格表の 1 行（セルのテキスト）を解析する。
+    戻り値: (データ行なら結果の dict・それ以外は None, 次の行に引き継ぐセット名)
+    """
+    # セルが少なすぎる場合はスキップ
+    if len(cell_texts) < 4:
+        return None, current_set_name
+
+    # ヘッダー行をスキップ（「弾」「Ｎｏ．」「レア」などのキーワードが含まれている場合）
+    if any(keyword in " ".join(cell_texts) for keyword in ["弾", "Ｎｏ", "No", "レア", "カード名", "買取金額", "更新"]):
+        # ヘッダー行の場合は、次の行の準備としてスキップ
+        return None, current_set_name
+
+    # セル数に応じてデータを抽出
+    # セル構造のパターン:
+    # パターン1: [弾, No, レア, カード名, 買取金額, 更新日] (6セル)
+    # パターン2: [No, レア, カード名, 買取金額, 更新日] (5セル)
+    # パターン3: [No, カード名, 買取金額, 更新日] (4セル・プロモ行 SV-P/S-P/SM-P など)
+    # パターン4: [弾名のみ] (1セル - セット名の行)
+
+    if len(cell_texts) == 1:
+        # セット名の行の可能性
+        potential_set_name = cell_texts[0]
+        if potential_set_name and not any(char in potential_set_name for char in ["¥", "円", "/"]):
+            current_set_name = potential_set_name
+        return None, current_set_name
+
+    # データ行の処理用に変数を初期化
+    set_name = current_set_name
+    no = ""
+    rarity = ""
+    card_name = ""
+    price = ""
+    update_date = ""
+
+    if len(cell_texts) == 4:
+        # プロモ行: [No, カード名, 買取金額, 更新日]（レア列なし）
+        # 001/SV-P, 001/S-P, 005/SM-P などの形式
+        no = cell_texts[0]
+        card_name = cell_texts[1]
+        price = cell_texts[2]
+        update_date = cell_texts[3]
+        rarity = "プロモ"
+    elif len(cell_texts) == 6:
+        # [弾, No, レア, カード名, 買取金額, 更新日]
+        set_name = cell_texts[0] if cell_texts[0] else current_set_name
+        no = cell_texts[1]
+        rarity = cell_texts[2]
+        card_name = cell_texts[3]
+        price = cell_texts[4]
+        update_date = cell_texts[5]
+    elif len(cell_texts) == 5:
+        # [No, レア, カード名, 買取金額, 更新日] または [弾, No, レア, カード名, 買取金額]
+        if re.match(r'\d+/\d+', cell_texts[0]) or re.match(r'\d+/[A-Z-]+', cell_texts[0]) or cell_texts[0].isdigit():
+            no = cell_texts[0]
+            rarity = cell_texts[1]
+            card_name = cell_texts[2]
+            price = cell_texts[3]
+            update_date = cell_texts[4]
+        else:
+            set_name = cell_texts[0] if cell_texts[0] else current_set_name
+            no = cell_texts[1]
+            rarity = cell_texts[2]
+            card_name = cell_texts[3]
+            price = cell_texts[4]
+            update_date = ""
+    else:
+        return None, current_set_name
+
+    # 共通: 空のデータはスキップ
+    if not card_name or not price or "¥" not in price:
+        return None, current_set_name
+
+    # 型番を抽出（Noカラムとカード名の両方から試行）
+    card_number = no if no else extract_card_number(card_name)
+    if not card_number:
+        card_number = extract_card_number(card_name)
+
+    # 価格を数値に変換
+    price_int = clean_price(price)
+
+    # 価格が0の場合はスキップ（データが不正な可能性）
+    if price_int == 0:
+        return None, current_set_name
+
+    return {
+        "No": no,
+        "レア": rarity,
+        "カード名": card_name,
+        "買取金額": price_int,
+        "更新日": update_date,
+        "card_number": card_number,
+        "弾": set_name
+    }, current_set_name
+
+
 def scrape_otachu_psa10(url: str) -> List[Dict]:
     """
     おたちゅう秋葉原のPSA10買取価格表をスクレイピング
@@ -69,25 +169,8 @@ def scrape_otachu_psa10(url: str) -> List[Dict]:
     results = []
     current_set_name = ""  # 現在のセット名を保持
     
-    with sync_playwright() as p:
-        # ブラウザを起動（Chromiumで試行、失敗した場合はFirefoxを使用）
-        browser = None
-        try:
-            browser = p.chromium.launch(
-                headless=True,
-                args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
-            )
-        except Exception as e:
-            print(f"Chromiumの起動に失敗しました: {e}")
-            print("Firefoxを使用して再試行します...")
-            try:
-                browser = p.firefox.launch(headless=True)
-            except Exception as e2:
-                print(f"Firefoxの起動にも失敗しました: {e2}")
-                raise
-        
-        page = browser.new_page()
-        
+    # ブラウザを起動（Chrome → Chromium → Firefox の順に試す。画像などは読み込まない）
+    with BrowserManager(label="otachu") as browser, browser.page() as page:
         # ページにアクセス
         print(f"ページにアクセス中: {url}")
         page.goto(url, wait_until="networkidle")
@@ -113,97 +196,9 @@ def scrape_otachu_psa10(url: str) -> List[Dict]:
                 
                 # セルのテキストを取得
                 cell_texts = [cell.inner_text().strip() for cell in cells]
-                
-                # ヘッダー行をスキップ（「弾」「Ｎｏ．」「レア」などのキーワードが含まれている場合）
-                if any(keyword in " ".join(cell_texts) for keyword in ["弾", "Ｎｏ", "No", "レア", "カード名", "買取金額", "更新"]):
-                    # ヘッダー行の場合は、次の行の準備としてスキップ
-                    continue
-                
-                # セル数に応じてデータを抽出
-                # セル構造のパターン:
-                # パターン1: [弾, No, レア, カード名, 買取金額, 更新日] (6セル)
-                # パターン2: [No, レア, カード名, 買取金額, 更新日] (5セル)
-                # パターン3: [No, カード名, 買取金額, 更新日] (4セル・プロモ行 SV-P/S-P/SM-P など)
-                # パターン4: [弾名のみ] (1セル - セット名の行)
-                
-                if len(cell_texts) == 1:
-                    # セット名の行の可能性
-                    potential_set_name = cell_texts[0]
-                    if potential_set_name and not any(char in potential_set_name for char in ["¥", "円", "/"]):
-                        current_set_name = potential_set_name
-                    continue
-                
-                # データ行の処理用に変数を初期化
-                set_name = current_set_name
-                no = ""
-                rarity = ""
-                card_name = ""
-                price = ""
-                update_date = ""
-                
-                if len(cell_texts) == 4:
-                    # プロモ行: [No, カード名, 買取金額, 更新日]（レア列なし）
-                    # 001/SV-P, 001/S-P, 005/SM-P などの形式
-                    no = cell_texts[0]
-                    card_name = cell_texts[1]
-                    price = cell_texts[2]
-                    update_date = cell_texts[3]
-                    rarity = "プロモ"
-                elif len(cell_texts) == 6:
-                    # [弾, No, レア, カード名, 買取金額, 更新日]
-                    set_name = cell_texts[0] if cell_texts[0] else current_set_name
-                    no = cell_texts[1]
-                    rarity = cell_texts[2]
-                    card_name = cell_texts[3]
-                    price = cell_texts[4]
-                    update_date = cell_texts[5]
-                elif len(cell_texts) == 5:
-                    # [No, レア, カード名, 買取金額, 更新日] または [弾, No, レア, カード名, 買取金額]
-                    if re.match(r'\d+/\d+', cell_texts[0]) or re.match(r'\d+/[A-Z-]+', cell_texts[0]) or cell_texts[0].isdigit():
-                        no = cell_texts[0]
-                        rarity = cell_texts[1]
-                        card_name = cell_texts[2]
-                        price = cell_texts[3]
-                        update_date = cell_texts[4]
-                    else:
-                        set_name = cell_texts[0] if cell_texts[0] else current_set_name
-                        no = cell_texts[1]
-                        rarity = cell_texts[2]
-                        card_name = cell_texts[3]
-                        price = cell_texts[4]
-                        update_date = ""
-                else:
-                    continue
-                
-                # 共通: 空のデータはスキップ
-                if not card_name or not price or "¥" not in price:
-                    continue
-                
-                # 型番を抽出（Noカラムとカード名の両方から試行）
-                card_number = no if no else extract_card_number(card_name)
-                if not card_number:
-                    card_number = extract_card_number(card_name)
-                
-                # 価格を数値に変換
-                price_int = clean_price(price)
-                
-                # 価格が0の場合はスキップ（データが不正な可能性）
-                if price_int == 0:
-                    continue
-                
-                # 結果に追加
-                result = {
-                    "No": no,
-                    "レア": rarity,
-                    "カード名": card_name,
-                    "買取金額": price_int,
-                    "更新日": update_date,
-                    "card_number": card_number,
-                    "弾": set_name
-                }
-                results.append(result)
-        
-        browser.close()
+                result, current_set_name = parse_price_row(cell_texts, current_set_name)
+                if result is not None:
+                    results.append(result)
     
     print(f"合計 {len(results)} 件のデータを取得しました")
     return results
@@ -232,14 +227,19 @@ def main():
     """
     メイン処理
     """
+    profiling.setup("scrape_otachu")
+    run_history.start("scrape_otachu")
     url = "https://otachu-akiba.com/1gocard/buying_price/psa-pokemon-cards/"
     output_file = "otachu_psa10.csv"
     
     # スクレイピング実行
-    data = scrape_otachu_psa10(url)
+    with profiling.stage("scrape"):
+        data = scrape_otachu_psa10(url)
+    run_history.count("rows", len(data))
     
     # CSVに保存
-    save_to_csv(data, output_file)
+    with profiling.stage("save"):
+        save_to_csv(data, output_file)
     
     print("処理が完了しました")
 
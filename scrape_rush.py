@@ -7,7 +7,12 @@ import time
 import sys
 from urllib.parse import quote
 from typing import List, Dict, Optional
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+import card_snapshot
+import profiling
+import run_history
+from browser_manager import BrowserManager
 
 
 def read_otachu_csv(filename: str) -> List[Dict]:
@@ -209,6 +214,48 @@ def _prefer_without_mikaeri(candidates: list) -> list:
     return without_mikaeri if without_mikaeri else candidates
 
 
+def _match_product(product_name: str, product_url: str, normalized_target_name: str, card_number: str = "",
+                   normalized_product_name: Optional[str] = None) -> tuple:
+    """
+    検索結果の商品が対象カードか判定する。戻り値: (名前一致, 型番一致)
+    型番が合っている商品に限り、名前は双方向部分一致 or トークン全含むでOK（【SAR】カシオペア など対応）。
+    型番なし/不一致のときは既存の厳しい条件（ターゲット ⊂ 商品）のみ。
+    """
+    if normalized_product_name is None:
+        normalized_product_name = _normalize_card_name(product_name)
+    has_number_match = bool(card_number) and (
+        _check_card_number_in_text(card_number, product_name)
+        or _check_card_number_in_text(card_number, product_url or "")
+    )
+    if not normalized_target_name:
+        return False, has_number_match
+    if has_number_match:
+        name_match = (
+            normalized_target_name in normalized_product_name
+            or normalized_product_name in normalized_target_name
+            or _target_tokens_all_in_product(normalized_target_name, normalized_product_name)
+        )
+    else:
+        name_match = normalized_target_name in normalized_product_name
+    return name_match, has_number_match
+
+
+def _matched_candidates(candidates: list, card_number: str = "") -> list:
+    """名前が一致した商品（型番指定時は型番一致も必須）"""
+    return [
+        p for p in (candidates or [])
+        if p.get('name_match') and (not card_number or p.get('number_match'))
+    ]
+
+
+def _pick_cheapest(candidates: list) -> Optional[Dict]:
+    """「未開封」が付いていないものを優先し、その中で最安値を1件選ぶ（候補が無ければ None）"""
+    preferred = _prefer_without_mikaeri(candidates)
+    if not preferred:
+        return None
+    return min(preferred, key=lambda x: x['price'])
+
+
 def search_cardrush(page, keyword: str, target_name: str = "", rarity: str = "", card_number: str = "") -> Optional[Dict]:
     """
     カードラッシュで検索して、在庫ありの最安値商品情報を取得
@@ -232,6 +279,7 @@ def search_cardrush(page, keyword: str, target_name: str = "", rarity: str = "",
             page.goto(search_url, wait_until="domcontentloaded", timeout=30000)
         except PlaywrightTimeoutError:
             print(f"  タイムアウトが発生しましたが、ページの読み込みを続行します...")
+            run_history.error("page_timeout")
             time.sleep(2)
         
         # Cloudflare チャレンジ通過を待つ: 商品リンクが表示されるまで最大20秒待機
@@ -257,6 +305,7 @@ def search_cardrush(page, keyword: str, target_name: str = "", rarity: str = "",
         _is_cloudflare = "Just a moment" in page.content() or "Verify you are human" in page.content()
         if len(product_links) == 0 and _is_cloudflare:
             print(f"  Cloudflareチャレンジ検出。15秒待機してリトライ...")
+            run_history.error("cloudflare_retry")
             time.sleep(15)
             try:
                 page.goto(search_url, wait_until="domcontentloaded", timeout=30000)
@@ -367,26 +416,10 @@ def search_cardrush(page, keyword: str, target_name: str = "", rarity: str = "",
                 
                 # 元データのカード名とのマッチ度を計算（パターン2対応: 型番一致時は双方向部分一致）
                 normalized_product_name = _normalize_card_name(product_name)
-                has_number_match = bool(card_number) and (
-                    _check_card_number_in_text(card_number, product_name)
-                    or _check_card_number_in_text(card_number, product_url or "")
+                name_match, has_number_match = _match_product(
+                    product_name, product_url, normalized_target_name, card_number,
+                    normalized_product_name=normalized_product_name,
                 )
-                if has_number_match:
-                    # 型番が合っている商品に限り、名前は双方向部分一致 or トークン全含むでOK（【SAR】カシオペア など対応）
-                    name_match = (
-                        bool(normalized_target_name)
-                        and (
-                            normalized_target_name in normalized_product_name
-                            or normalized_product_name in normalized_target_name
-                            or _target_tokens_all_in_product(normalized_target_name, normalized_product_name)
-                        )
-                    )
-                else:
-                    # 型番なし/不一致のときは既存の厳しい条件（ターゲット ⊂ 商品）のみ
-                    name_match = (
-                        bool(normalized_target_name)
-                        and normalized_target_name in normalized_product_name
-                    )
                 
                 # デバッグ出力（最初の数件のみ）
                 if len(product_items) + len(out_of_stock_items) < 3:
@@ -419,14 +452,8 @@ def search_cardrush(page, keyword: str, target_name: str = "", rarity: str = "",
                 continue
         
         # 在庫あり・在庫なしの両方からマッチする商品を抽出（型番指定時は型番一致も必須）
-        matched_items = [
-            p for p in product_items
-            if p.get('name_match') and (not card_number or p.get('number_match'))
-        ]
-        matched_out_of_stock = [
-            p for p in (out_of_stock_items or [])
-            if p.get('name_match') and (not card_number or p.get('number_match'))
-        ]
+        matched_items = _matched_candidates(product_items, card_number)
+        matched_out_of_stock = _matched_candidates(out_of_stock_items, card_number)
         # レアがマスボの場合は「マスターボールミラー」の商品に絞り、状態なしを優先
         if rarity == "マスボ":
             matched_items = _filter_masbo_candidates(matched_items)
@@ -435,10 +462,8 @@ def search_cardrush(page, keyword: str, target_name: str = "", rarity: str = "",
                 print(f"    マスボ: マスターボールミラー対象 在庫あり{len(matched_items)}件 / 在庫なし{len(matched_out_of_stock)}件")
 
         # 在庫あり・在庫なしをまとめて「未開封」が付いていないものを優先し、その中で最安値を1件選ぶ
-        combined = matched_items + matched_out_of_stock
-        if combined:
-            preferred = _prefer_without_mikaeri(combined)
-            cheapest = min(preferred, key=lambda x: x['price'])
+        cheapest = _pick_cheapest(matched_items + matched_out_of_stock)
+        if cheapest:
             if cheapest.get('stock') is not None:
                 print(f"    在庫ありリストから該当カード名({target_name})を含む商品を選択: {cheapest['name'][:50]} ({cheapest['price']}円)")
             else:
@@ -479,6 +504,7 @@ def search_cardrush(page, keyword: str, target_name: str = "", rarity: str = "",
         
     except PlaywrightTimeoutError as e:
         print(f"  タイムアウトエラー: {keyword}")
+        run_history.error("search_timeout")
         print(f"  タイムアウトが発生しましたが、画像取得を試みます...")
         
         # タイムアウトが発生しても、ページは部分的に読み込まれている可能性がある
@@ -535,6 +561,7 @@ def search_cardrush(page, keyword: str, target_name: str = "", rarity: str = "",
         }
     except Exception as e:
         print(f"  検索エラー: {keyword} - {e}")
+        run_history.error("search_error")
         print(f"  エラーが発生しましたが、画像取得を試みます...")
         
         # エラーが発生しても画像取得を試みる
@@ -604,7 +631,8 @@ def scrape_cardrush_data(input_csv: str, output_csv: str, debug_mode: bool = Fal
     """
     # CSVを読み込む
     print(f"CSVファイルを読み込み中: {input_csv}")
-    data = read_otachu_csv(input_csv)
+    with profiling.stage("read"):
+        data = read_otachu_csv(input_csv)
     
     # 複数カード番号でフィルタリング（--cards / --cards-file）
     if filter_card_numbers is not None:
@@ -640,35 +668,13 @@ def scrape_cardrush_data(input_csv: str, output_csv: str, debug_mode: bool = Fal
         print(f"デバッグモード: 先頭5件のみ処理します")
     
     print(f"合計 {len(data)} 件のデータを処理します")
+    run_history.count("cards", len(data))
     
     results = []
+    searched = matched = 0
     
-    with sync_playwright() as p:
-        # ブラウザを起動（Chrome優先: Cloudflare検出されにくい。GitHub Actions等ではChromiumへフォールバック）
-        browser = None
-        try:
-            browser = p.chromium.launch(
-                channel="chrome",
-                headless=True,
-                args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
-            )
-            print("Chrome で起動しました")
-        except Exception:
-            try:
-                browser = p.chromium.launch(
-                    headless=True,
-                    args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
-                )
-                print("Chromium で起動しました")
-            except Exception as e:
-                print(f"Chromiumの起動に失敗しました: {e}")
-                print("Firefoxを使用して再試行します...")
-                try:
-                    browser = p.firefox.launch(headless=True)
-                except Exception as e2:
-                    print(f"Firefoxの起動にも失敗しました: {e2}")
-                    raise
-        
+    # ブラウザを起動（Chrome優先: Cloudflare検出されにくい。GitHub Actions等ではChromium → Firefoxへフォールバック）
+    with profiling.stage("search"), BrowserManager(label="cardrush") as browser:
         # リクエスト間の待機時間（秒）
         wait_between_requests = 5
         
@@ -691,18 +697,12 @@ def scrape_cardrush_data(input_csv: str, output_csv: str, debug_mode: bool = Fal
                 continue
             
             # Cloudflare対策: 毎回新しいコンテキストで初回アクセスとして扱う
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
-            page = context.new_page()
-            
-            try:
+            with browser.page(fresh_context=True) as page:
                 target_name = row.get('カード名', '').strip()
                 rarity = row.get('レア', '').strip()
                 card_number_val = row.get('card_number', '').strip()
                 rush_data = search_cardrush(page, keyword, target_name=target_name, rarity=rarity, card_number=card_number_val)
-            finally:
-                context.close()
+            searched += 1
             
             # リクエスト間に待機
             if idx < len(data):
@@ -712,9 +712,11 @@ def scrape_cardrush_data(input_csv: str, output_csv: str, debug_mode: bool = Fal
                 # データを統合
                 if rush_data['price'] is not None:
                     # 価格が取得できた場合（在庫あり or 在庫なしでも価格あり）
+                    matched += 1
                     row['ラッシュ販売価格'] = rush_data['price']
                     if rush_data['stock'] is not None:
                         # 在庫あり
+                        run_history.count("in_stock")
                         row['ラッシュ在庫状況'] = f"在庫あり ({rush_data['stock']}枚)"
                     else:
                         # 在庫なしだが価格は取得できた
@@ -746,8 +748,11 @@ def scrape_cardrush_data(input_csv: str, output_csv: str, debug_mode: bool = Fal
                 row['期待利益'] = ''
             
             results.append(row)
-        
-        browser.close()
+    
+    # 一致率 = 価格が取れたカード / 検索したカード（サイト側の変更・ブロックで下がったら気づけるように）
+    run_history.count("searched", searched)
+    run_history.count("matched", matched)
+    run_history.match(matched, searched)
     
     # (型番, カード名) で重複をまとめ、更新日が新しい行だけ残す
     if results:
@@ -774,12 +779,16 @@ def scrape_cardrush_data(input_csv: str, output_csv: str, debug_mode: bool = Fal
     print(f"\n結果をCSVに保存中: {output_csv}")
     if results:
         fieldnames = list(results[0].keys())
-        with open(output_csv, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(results)
+        with profiling.stage("save"):
+            with open(output_csv, 'w', newline='', encoding='utf-8-sig') as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(results)
+            # 読む側（バックエンド・app.py・refresh_psa9_stats）用の型付きスナップショット
+            card_snapshot.write_snapshot(output_csv)
         
         print(f"保存完了: {len(results)} 件のデータを {output_csv} に保存しました")
+        run_history.count("rows_saved", len(results))
     else:
         print("保存するデータがありません")
 
@@ -788,6 +797,8 @@ def main():
     """
     メイン処理
     """
+    profiling.setup("scrape_rush")
+    run_history.start("scrape_rush")
     input_csv = "otachu_psa10.csv"
     output_csv = "merged_card_data.csv"
     
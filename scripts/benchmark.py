@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+"""
+処理時間のベンチマーク（オフライン。ブラウザ・外部サイトには行かない）。
+
+対象:
+  extract_card_number      … scrape_otachu.extract_card_number（カード名・型番の文字列から型番を抽出）
+  otachu_row_parser        … scrape_otachu.parse_price_row（買取価格表の 1 行を解析）
+  cardrush_matching        … scrape_rush の候補判定（名前・型番の一致 → マスボ絞り込み → 未開封を避けて最安値）
+  profit_backend           … backend/main.py の calculate_profit（DataFrame の行ごと）
+  profit_filtered          … generate_filtered_csv.calc_card_profit（csv.DictReader の行ごと）
+  generate_filtered_csv    … filtered_cards.csv の生成（読み込み〜書き出し・スナップショット）
+  load_cards_csv           … card_snapshot.read_cards の CSV からの読み込み（型をそろえるまで）
+  load_cards_snapshot      … card_snapshot.read_cards のスナップショット（.parquet）からの読み込み（pyarrow が無ければ省略）
+  api_cards_build          … /api/cards の初回（CSV かスナップショット・リンク・PSA9 の読み込みと行の組み立て）
+  api_cards                … /api/cards の 2 回目以降（作成済みの全件レスポンス）
+  api_cards_query          … /api/cards の絞り込み・並び替え（1 ページ分）
+  api_psa9_stats_hit       … /api/psa9-stats（psa9_stats.json の相場で返せる 100 件ずつ）
+  api_psa9_stats_miss      … /api/psa9-stats（GAS に取りに行く 100 件ずつ。GAS は scripts/fake_gas_server.py を待ち時間 0 で使う）
+
+データ:
+  recorded … リポジトリにある実データ（otachu_psa10.csv・merged_card_data.csv・リンク JSON・psa9_stats.json）
+  1000 / 10000 / 100000 … 実データの行を型番・名前・価格をずらして複製した合成カタログ（乱数は固定）
+合成データ・API 用のファイルは一時ディレクトリに書き、リポジトリのファイルは変更しない。
+
+実行:
+  python scripts/benchmark.py run                            … 全件（recorded, 1000, 10000, 100000）
+  python scripts/benchmark.py run --quick                    … recorded と 1000 だけ・各 3 回
+  python scripts/benchmark.py run --sizes 1000,10000 --only cardrush_matching,api_cards
+  python scripts/benchmark.py run --output bench_results/baseline.json
+  python scripts/benchmark.py compare bench_results/baseline.json bench_results/20261018_120000.json
+
+結果は JSON（bench_results/ に実行日時の名前。--output で変更）。
+compare は基準より --threshold（デフォルト 15%）以上遅くなった項目を一覧にし、1 件でもあれば終了コード 1 で終わる。
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, "backend"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import card_snapshot
+import generate_filtered_csv as gfc
+import scrape_otachu
+import scrape_rush
+from card_identity import canonical_key, card_number_of, clean, duplicated_numbers, link_key
+
+RESULTS_DIR = os.path.join(BASE_DIR, "bench_results")
+DEFAULT_SIZES = "recorded,1000,10000,100000"
+QUICK_SIZES = "recorded,1000"
+DEFAULT_REPEAT = 5
+QUICK_REPEAT = 3
+DEFAULT_THRESHOLD = 0.15
+# これより短い差は誤差として扱う（数ミリ秒の項目が揺れで引っかからないように）
+DEFAULT_MIN_DELTA_MS = 2.0
+SEED = 20240601
+CANDIDATES_PER_SEARCH = 12  # カードラッシュの 1 検索あたりの商品数（実際の検索結果 1 ページぶん程度）
+SLOW_RUN_SEC = 10.0  # 1 回がこれより長い項目（100000 件の /api/cards 初回など）は計測回数を減らす
+SLOW_REPEAT = 2
+PSA9_REQUEST_SIZE = 100  # /api/psa9-stats の 1 リクエストあたりの上限
+CSV_COLUMNS = ["No", "レア", "カード名", "card_number", "買取金額", "更新日", "弾", "ラッシュ販売価格", "ラッシュ在庫状況", "画像URL", "期待利益"]
+BENCHMARKS = (
+    "extract_card_number",
+    "otachu_row_parser",
+    "cardrush_matching",
+    "profit_backend",
+    "profit_filtered",
+    "generate_filtered_csv",
+    "load_cards_csv",
+    "load_cards_snapshot",
+    "api_cards_build",
+    "api_cards",
+    "api_cards_query",
+    "api_psa9_stats_hit",
+    "api_psa9_stats_miss",
+)
+
+
+# --- データ ---
+
+def _read_csv(name: str) -> list:
+    with open(os.path.join(BASE_DIR, name), encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+def _read_json(name: str) -> dict:
+    try:
+        with open(os.path.join(BASE_DIR, name), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _shift_number(cn: str, k: int) -> str:
+    """型番の左側の数字を k ずらす（118/081 → 119/081）。数字で始まらない型番は末尾に k を付ける"""
+    left, sep, right = cn.partition("/")
+    if left.isdigit():
+        return f"{(int(left) + k) % 1000:0{len(left)}d}{sep}{right}"
+    return f"{cn}{k}"
+
+
+def _scale_price(value, factor: float):
+    try:
+        return str(int(float(str(value).replace(",", "")) * factor))
+    except (TypeError, ValueError):
+        return value
+
+
+def build_catalog(size) -> list:
+    """merged_card_data.csv の行 → size 件のカタログ（"recorded" はそのまま）"""
+    recorded = _read_csv("merged_card_data.csv")
+    if size == "recorded":
+        return recorded
+    rng = random.Random(SEED)
+    rows = []
+    for i in range(size):
+        base = recorded[i % len(recorded)]
+        k = i // len(recorded)
+        if k == 0:
+            rows.append(dict(base))
+            continue
+        row = dict(base)
+        cn = _shift_number(card_number_of(base), k * 131)
+        row["No"] = cn
+        row["card_number"] = cn
+        row["カード名"] = f"{clean(base.get('カード名'))}{'ABCDEFGHJK'[k % 10]}{k}"
+        factor = 0.8 + rng.random() * 0.5
+        for col in ("買取金額", "ラッシュ販売価格", "期待利益"):
+            row[col] = _scale_price(base.get(col), factor)
+        rows.append(row)
+    return rows
+
+
+def build_links(rows: list, recorded_links: dict, ratio: float) -> dict:
+    """行 → リンク JSON（実データで URL があるカードと同じ割合で付ける）"""
+    pairs = [(card_number_of(r), clean(r.get("カード名"))) for r in rows]
+    duplicated = duplicated_numbers(pairs)
+    rng = random.Random(SEED + 1)
+    links = {}
+    for cn, name in pairs:
+        if cn and rng.random() < ratio:
+            links[link_key(cn, name, cn in duplicated)] = f"https://example.com/card/{len(links)}"
+    return links or dict(recorded_links)
+
+
+def build_psa9_stats(rows: list, ratio: float) -> dict:
+    rng = random.Random(SEED + 2)
+    stats = {}
+    fetched_at = datetime.now().astimezone().isoformat(timespec="seconds")
+    for r in rows:
+        key = canonical_key(card_number_of(r), r.get("カード名"))
+        if key and key not in stats and rng.random() < ratio:
+            price = rng.randint(5, 200) * 500
+            stats[key] = {
+                "yahooAvg": price,
+                "yahooMedian": price,
+                "recent1": {"price": price, "url": "https://auctions.yahoo.co.jp/jp/auction/x1"},
+                "recent2": None,
+                "recent3": None,
+                "mercariUrl": "https://jp.mercari.com/search?keyword=x",
+                "hasHistory": True,
+                "error": None,
+                "fetchedAt": fetched_at,
+            }
+    return stats
+
+
+def extract_inputs(rows: list) -> list:
+    """extract_card_number の入力: カード名だけ（型番なし）・名前+型番・弾コード・プロモの混在"""
+    inputs = []
+    for i, r in enumerate(rows):
+        name = clean(r.get("カード名"))
+        cn = card_number_of(r)
+        kind = i % 4
+        if kind == 0:
+            inputs.append(name)
+        elif kind == 1:
+            inputs.append(f"{name} {cn}")
+        elif kind == 2:
+            inputs.append(f"{name} SV{i % 11 + 1}a")
+        else:
+            inputs.append(f"{name} {i % 300 + 1:03d}/SV-P")
+    return inputs
+
+
+def otachu_rows(rows: list) -> list:
+    """
+    買取価格表のセルのテキストを再現する（おたちゅうのテーブルの各形式）。
+    6 セル（弾つき）・5 セル・4 セル（プロモ）に、ヘッダー行と価格なしの行を混ぜる
+    """
+    out = []
+    for i, r in enumerate(rows):
+        if i % 50 == 0:
+            out.append(["弾", "Ｎｏ．", "レア", "カード名", "買取金額", "更新日"])
+        price = f"¥{int(float(r.get('買取金額') or 0)):,}"
+        no, rarity, name, date = r.get("No", ""), r.get("レア", ""), r.get("カード名", ""), r.get("更新日", "")
+        kind = i % 10
+        if kind < 5:
+            out.append([no, rarity, name, price, date])
+        elif kind < 8:
+            out.append([f"SV{i % 11 + 1}a", no, rarity, name, price, date])
+        elif kind == 8:
+            out.append([f"{i % 300 + 1:03d}/SV-P", name, price, date])
+        else:
+            out.append([no, rarity, name, "お問い合わせください", date])
+    return out
+
+
+def cardrush_searches(rows: list) -> list:
+    """
+    カードごとの (検索対象, 検索結果の商品リスト)。
+    商品名はカードラッシュの表記（〔状態A-〕名前【SAR】{型番}[弾]）で、
+    本物・未開封・状態違い・マスターボールミラー・別カードを混ぜる
+    """
+    rng = random.Random(SEED + 3)
+    searches = []
+    for i, r in enumerate(rows):
+        name = clean(r.get("カード名"))
+        cn = card_number_of(r)
+        rarity = "マスボ" if i % 25 == 0 else clean(r.get("レア"))
+        base_price = int(float(r.get("ラッシュ販売価格") or 0) or 1000)
+        products = [
+            f"{name}【{r.get('レア', '')}】{{{cn}}}[SV{i % 11 + 1}a]",
+            f"〔状態B〕{name}【{r.get('レア', '')}】{{{cn}}}",
+            f"{name}(未開封){{{cn}}}",
+            f"{name}(マスターボールミラー){{{cn}}}",
+        ]
+        while len(products) < CANDIDATES_PER_SEARCH:
+            other = rows[rng.randrange(len(rows))]
+            products.append(f"{clean(other.get('カード名'))}【{other.get('レア', '')}】{{{card_number_of(other)}}}")
+        items = [
+            {
+                "name": p[:100],
+                "price": base_price + rng.randint(-500, 500),
+                "stock": rng.choice([None, 1, 3]),
+                "url": f"https://www.cardrush-pokemon.jp/product/{i * CANDIDATES_PER_SEARCH + j}",
+            }
+            for j, p in enumerate(products)
+        ]
+        searches.append((name, rarity, cn, items))
+    return searches
+
+
+def write_dataset(rows: list, directory: str, size) -> dict:
+    """API 用の CSV（とスナップショット）・リンク JSON・psa9_stats.json を directory に書き、パスを返す"""
+    recorded_pokeca = _read_json("pokeca_chart_links.json")
+    recorded_ebay = _read_json("ebay_links.json")
+    recorded_psa9 = _read_json("psa9_stats.json")
+    if size == "recorded":
+        pokeca, ebay, psa9 = recorded_pokeca, recorded_ebay, recorded_psa9
+    else:
+        pokeca = build_links(rows, recorded_pokeca, 0.45)
+        ebay = build_links(rows, recorded_ebay, 0.3)
+        psa9 = build_psa9_stats(rows, 0.33)
+    paths = {
+        "csv": os.path.join(directory, "cards.csv"),
+        "pokeca": os.path.join(directory, "pokeca_chart_links.json"),
+        "ebay": os.path.join(directory, "ebay_links.json"),
+        "psa9": os.path.join(directory, "psa9_stats.json"),
+        "psa9_log": os.path.join(directory, "psa9_stats.log.jsonl"),
+        "filtered": os.path.join(directory, "filtered_cards.csv"),
+    }
+    with open(paths["csv"], "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+    # パイプラインと同じく CSV の横にスナップショットを置く（pyarrow が無ければ CSV だけ）
+    with contextlib.redirect_stdout(io.StringIO()):
+        card_snapshot.write_snapshot(paths["csv"])
+    for key, data in (("pokeca", pokeca), ("ebay", ebay), ("psa9", psa9)):
+        with open(paths[key], "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+    return paths
+
+
+# --- 計測 ---
+
+def _timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def measure(fn, repeat: int) -> list:
+    """
+    fn を repeat 回実行して秒数のリストを返す（1 回目は慣らしとして捨てる）。
+    1 回目が SLOW_RUN_SEC を超える重い項目は 1 回目も結果に含め、SLOW_REPEAT 回までにする
+    """
+    first = _timed(fn)
+    if first > SLOW_RUN_SEC:
+        runs = [first]
+        while len(runs) < min(repeat, SLOW_REPEAT):
+            runs.append(_timed(fn))
+        return runs
+    return [_timed(fn) for _ in range(repeat)]
+
+
+def _summarize(runs: list, items: int) -> dict:
+    best = min(runs)
+    return {
+        "items": items,
+        "min": round(best, 6),
+        "median": round(statistics.median(runs), 6),
+        "runs": [round(r, 6) for r in runs],
+        "per_item_us": round(best / items * 1e6, 3) if items else None,
+    }
+
+
+def bench_pure(name: str, rows: list, repeat: int) -> tuple:
+    """(計測する関数, 件数)"""
+    if name == "extract_card_number":
+        inputs = extract_inputs(rows)
+        return (lambda: [scrape_otachu.extract_card_number(s) for s in inputs]), len(inputs)
+
+    if name == "otachu_row_parser":
+        table = otachu_rows(rows)
+
+        def parse():
+            current = ""
+            for cells in table:
+                _, current = scrape_otachu.parse_price_row(cells, current)
+
+        return parse, len(table)
+
+    if name == "cardrush_matching":
+        searches = cardrush_searches(rows)
+
+        def match():
+            for target_name, rarity, cn, items in searches:
+                normalized_target = scrape_rush._normalize_card_name(target_name)
+                in_stock, out_of_stock = [], []
+                for item in items:
+                    name_match, number_match = scrape_rush._match_product(item["name"], item["url"], normalized_target, cn)
+                    product = dict(item, name_match=name_match, number_match=number_match)
+                    (in_stock if item["stock"] is not None else out_of_stock).append(product)
+                matched = scrape_rush._matched_candidates(in_stock, cn)
+                matched_out = scrape_rush._matched_candidates(out_of_stock, cn)
+                if rarity == "マスボ":
+                    matched = scrape_rush._filter_masbo_candidates(matched)
+                    matched_out = scrape_rush._filter_masbo_candidates(matched_out)
+                scrape_rush._pick_cheapest(matched + matched_out)
+
+        return match, len(searches)
+
+    if name == "profit_backend":
+        import pandas as pd
+        from main import calculate_profit
+
+        df = pd.DataFrame(rows, columns=CSV_COLUMNS)
+        for col in ("買取金額", "ラッシュ販売価格", "期待利益"):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        return (lambda: [calculate_profit(row) for _, row in df.iterrows()]), len(df)
+
+    if name == "profit_filtered":
+        return (lambda: [gfc.calc_card_profit(row) for row in rows]), len(rows)
+
+    raise KeyError(name)
+
+
+@contextlib.contextmanager
+def fake_gas_server():
+    """scripts/fake_gas_server.py を待ち時間 0 で別スレッドに立てる"""
+    import fake_gas_server
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), fake_gas_server.make_handler(0, 0.0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextlib.contextmanager
+def backend_app(paths: dict, gas_url: str):
+    """backend/main.py の読み込み元を一時ディレクトリのファイルに差し替えた TestClient"""
+    import main
+    from fastapi.testclient import TestClient
+    from psa9_store import Psa9Store
+
+    saved = {
+        name: getattr(main, name)
+        for name in ("CSV_PATH", "POKECA_LINKS_PATH", "EBAY_LINKS_PATH", "PSA9_STATS_PATH", "PSA9_LOG_PATH",
+                     "_DATASET_SOURCES", "_psa9_store", "PSA9_SOURCE", "GAS_PSA9_API_URL", "_dataset")
+    }
+    main.CSV_PATH = paths["csv"]
+    main.POKECA_LINKS_PATH = paths["pokeca"]
+    main.EBAY_LINKS_PATH = paths["ebay"]
+    main.PSA9_STATS_PATH = paths["psa9"]
+    main.PSA9_LOG_PATH = paths["psa9_log"]
+    main._DATASET_SOURCES = (
+        paths["csv"], card_snapshot.snapshot_path(paths["csv"]), paths["pokeca"], paths["ebay"], paths["psa9"], paths["psa9_log"],
+    )
+    main._psa9_store = Psa9Store(paths["psa9"], paths["psa9_log"])
+    main.PSA9_SOURCE = "gas"
+    main.GAS_PSA9_API_URL = gas_url
+    main._dataset = None
+    try:
+        with TestClient(main.app) as client:
+            yield main, client
+    finally:
+        for name, value in saved.items():
+            setattr(main, name, value)
+
+
+def _psa9_requests(rows: list, stats: dict, hit: bool) -> list:
+    """/api/psa9-stats の body のリスト（hit=True は psa9_stats.json にあるカードだけ、False は無いカードだけ）"""
+    cards = []
+    for i, r in enumerate(rows):
+        key = canonical_key(card_number_of(r), r.get("カード名"))
+        if key is None or (key in stats) != hit:
+            continue
+        cards.append({
+            "id": f"{r.get('No')}_{card_number_of(r)}_{i}",
+            "card_name": clean(r.get("カード名")),
+            "card_number": card_number_of(r),
+            "rarity": clean(r.get("レア")),
+        })
+    return [{"cards": cards[i : i + PSA9_REQUEST_SIZE]} for i in range(0, len(cards), PSA9_REQUEST_SIZE)]
+
+
+def bench_io(names: list, rows: list, size, repeat: int) -> dict:
+    """ファイル・API を使う項目。{name: (runs, 件数)}"""
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        paths = write_dataset(rows, workdir, size)
+        if "generate_filtered_csv" in names:
+            def generate():
+                with contextlib.redirect_stdout(io.StringIO()):
+                    gfc.generate_filtered_csv(input_csv=paths["csv"], output_csv=paths["filtered"])
+
+            results["generate_filtered_csv"] = (measure(generate, repeat), len(rows))
+        if "load_cards_csv" in names:
+            results["load_cards_csv"] = (
+                measure(lambda: card_snapshot.read_cards(paths["csv"], prefer_snapshot=False), repeat),
+                len(rows),
+            )
+        if "load_cards_snapshot" in names:
+            if card_snapshot.read_snapshot(paths["csv"]) is None:
+                print("  load_cards_snapshot: スナップショットを使えないので省略（pyarrow が無い・CARD_SNAPSHOT=0）")
+            else:
+                results["load_cards_snapshot"] = (measure(lambda: card_snapshot.read_snapshot(paths["csv"]), repeat), len(rows))
+
+        api_names = [n for n in names if n.startswith("api_")]
+        if not api_names:
+            return results
+        with open(paths["psa9"], encoding="utf-8") as f:
+            stats = json.load(f)
+        with fake_gas_server() as gas_url, contextlib.redirect_stdout(io.StringIO()), backend_app(paths, gas_url) as (main, client):
+            if "api_cards_build" in api_names:
+                def build():
+                    main._dataset = None
+                    assert client.get("/api/cards").status_code == 200
+
+                results["api_cards_build"] = (measure(build, repeat), len(rows))
+            if "api_cards" in api_names:
+                results["api_cards"] = (
+                    measure(lambda: client.get("/api/cards", headers={"Accept-Encoding": "identity"}), repeat),
+                    len(rows),
+                )
+            if "api_cards_query" in api_names:
+                params = {"keyword": "ex", "min_profit": 5001, "sort": "profit_rate", "limit": 100}
+                results["api_cards_query"] = (measure(lambda: client.get("/api/cards", params=params), repeat), len(rows))
+            for name, hit in (("api_psa9_stats_hit", True), ("api_psa9_stats_miss", False)):
+                if name not in api_names:
+                    continue
+                bodies = _psa9_requests(rows, stats, hit)
+
+                def post_all():
+                    main._psa9_cache._entries.clear()  # GAS から取った分を毎回捨てる（miss を毎回 GAS に行かせる）
+                    for body in bodies:
+                        r = client.post("/api/psa9-stats", json=body)
+                        assert r.status_code == 200, r.text
+
+                results[name] = (measure(post_all, repeat), sum(len(b["cards"]) for b in bodies))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run(args) -> int:
+    sizes = [s.strip() for s in (args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)).split(",") if s.strip()]
+    sizes = [s if s == "recorded" else int(s) for s in sizes]
+    repeat = args.repeat or (QUICK_REPEAT if args.quick else DEFAULT_REPEAT)
+    names = [n.strip() for n in args.only.split(",")] if args.only else list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        print(f"エラー: 不明な項目 {', '.join(unknown)}（{', '.join(BENCHMARKS)}）")
+        return 2
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().astimezone().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+        },
+        "results": {},
+    }
+    pure = [n for n in names if n in ("extract_card_number", "otachu_row_parser", "cardrush_matching", "profit_backend", "profit_filtered")]
+    io_names = [n for n in names if n not in pure]
+    for size in sizes:
+        rows = build_catalog(size)
+        print(f"--- {size}（{len(rows)} 件）")
+        measured = {}
+        for name in pure:
+            fn, items = bench_pure(name, rows, repeat)
+            measured[name] = (measure(fn, repeat), items)
+        if io_names:
+            measured.update(bench_io(io_names, rows, size, repeat))
+        for name in names:
+            if name not in measured:
+                continue
+            runs, items = measured[name]
+            summary = _summarize(runs, items)
+            report["results"][f"{name}@{size}"] = summary
+            print(f"  {name:<22} min {summary['min'] * 1000:10.2f} ms  median {summary['median'] * 1000:10.2f} ms  ({items} 件)")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {output}")
+    return 0
+
+
+def compare(args) -> int:
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    base_results, new_results = base.get("results", {}), new.get("results", {})
+    print(f"基準: {args.base}（{base.get('meta', {}).get('git_commit') or '-'}）")
+    print(f"比較: {args.new}（{new.get('meta', {}).get('git_commit') or '-'}）")
+
+    regressions = []
+    for key in sorted(set(base_results) | set(new_results)):
+        b, n = base_results.get(key), new_results.get(key)
+        if b is None or n is None:
+            print(f"  {key:<34} {'（基準なし）' if b is None else '（今回なし）'}")
+            continue
+        before, after = b[args.metric], n[args.metric]
+        ratio = after / before if before else float("inf")
+        delta_ms = (after - before) * 1000
+        mark = ""
+        if ratio > 1 + args.threshold and delta_ms > args.min_delta_ms:
+            mark = "  ← 遅くなった"
+            regressions.append(key)
+        elif ratio < 1 - args.threshold and -delta_ms > args.min_delta_ms:
+            mark = "  （速くなった）"
+        print(f"  {key:<34} {before * 1000:10.2f} → {after * 1000:10.2f} ms  ({ratio - 1:+.1%}){mark}")
+
+    if regressions:
+        print(f"{len(regressions)} 件が {args.threshold:.0%} 以上遅くなりました: {', '.join(regressions)}")
+        return 1
+    print("遅くなった項目はありません")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="処理時間のベンチマーク")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_run = sub.add_parser("run", help="計測して JSON に保存")
+    p_run.add_argument("--sizes", help=f"カンマ区切りの件数（recorded は実データ。デフォルト {DEFAULT_SIZES}）")
+    p_run.add_argument("--only", help="カンマ区切りの項目名（省略時はすべて）")
+    p_run.add_argument("--repeat", type=int, help=f"各項目の計測回数（デフォルト {DEFAULT_REPEAT}）")
+    p_run.add_argument("--quick", action="store_true", help=f"{QUICK_SIZES} だけ・各 {QUICK_REPEAT} 回")
+    p_run.add_argument("--output", help="結果の JSON（デフォルト bench_results/実行日時.json）")
+    p_cmp = sub.add_parser("compare", help="2 つの結果を比べ、遅くなった項目があれば終了コード 1")
+    p_cmp.add_argument("base", help="基準の結果 JSON")
+    p_cmp.add_argument("new", help="比べる結果 JSON")
+    p_cmp.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="遅くなったとみなす割合（0.15 = 15%%）")
+    p_cmp.add_argument("--metric", choices=("min", "median"), default="min")
+    p_cmp.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS, help="これより小さい差は無視")
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == "run" else compare(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,9 @@ ebay_links.json を一括生成する。
      --english-name-index N   … 英名列の 0 始まりインデックス（P列なら 16）。未指定時は「View Sold Prices」の左隣を自動検出
      --output path            … 出力 JSON パス
 
+英名列が空の行は、カード名から同梱の辞書（ebay_name_dictionary.json）で英名を組み立てる
+（ポケモン名・トレーナー名 + ex / V / メガ などの規則で確実に訳せるときだけ。ebay_names.py）。
+
 キー規則:
   - 同じ card_number が1件だけ → キーは "766/742"
   - 同じ card_number が複数（例: 173/086 が Nの筋書き と トウコ）→ キーは "173/086|Nの筋書き"
@@ -24,10 +27,15 @@ import csv
 import json
 import os
 import sys
-from collections import Counter
 from urllib.parse import quote
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+import profiling  # noqa: E402
+import run_history  # noqa: E402
+from card_identity import duplicated_numbers, link_key  # noqa: E402
+from ebay_names import english_name_offline  # noqa: E402
+
 DEFAULT_OUTPUT = os.path.join(BASE_DIR, "ebay_links.json")
 EBAY_BASE = "https://www.ebay.com/sch/i.html?_nkw={query}&LH_Sold=1&LH_Complete=1"
 CARD_NUMBER_INDEX = 3
@@ -68,6 +76,7 @@ def read_rows_by_index(csv_path: str):
 
 
 def main():
+    profiling.setup("build_ebay_links")
     parser = argparse.ArgumentParser(description="Sheet export CSV → ebay_links.json")
     parser.add_argument("csv_path", help="スプレッドシートをエクスポートした CSV のパス")
     parser.add_argument(
@@ -92,9 +101,11 @@ def main():
         help=f"出力 JSON パス（デフォルト: {DEFAULT_OUTPUT}）",
     )
     args = parser.parse_args()
+    run_history.start("build_ebay_links")
 
     if not os.path.exists(args.csv_path):
         print(f"エラー: ファイルが見つかりません: {args.csv_path}", file=sys.stderr)
+        run_history.fail(f"{args.csv_path} が見つかりません")
         sys.exit(1)
 
     # 英名列をインデックスで取得（P列 = View Sold Prices の左隣を自動検出 or --english-name-index）
@@ -105,10 +116,12 @@ def main():
         print(f"英名列を自動検出（インデックス {english_col_index} = View Sold Prices の左隣）", file=sys.stderr)
 
     if data_rows and english_col_index is not None:
-        cn_counts = Counter()
-        for row in data_rows:
-            if len(row) > CARD_NUMBER_INDEX:
-                cn_counts[normalize(row[CARD_NUMBER_INDEX])] += 1
+        # 同じ型番に別名のカードがあるものだけ card_number|カード名 のキーにする
+        duplicated = duplicated_numbers(
+            (normalize(row[CARD_NUMBER_INDEX]), normalize(row[CARD_NAME_INDEX]))
+            for row in data_rows
+            if len(row) > max(CARD_NUMBER_INDEX, CARD_NAME_INDEX)
+        )
         result = {}
         skipped = 0
         for row in data_rows:
@@ -118,21 +131,21 @@ def main():
             card_number = normalize(row[CARD_NUMBER_INDEX])
             card_name = normalize(row[CARD_NAME_INDEX])
             eng = normalize(row[english_col_index]) if english_col_index < len(row) else ""
+            if not eng and card_name:
+                eng = english_name_offline(card_name) or ""
             if not card_number or not eng:
                 skipped += 1
                 continue
             url = build_url_from_english_name(eng, card_number)
-            if cn_counts[card_number] > 1:
-                key = f"{card_number}|{card_name}" if card_name else card_number
-            else:
-                key = card_number
-            result[key] = url
+            result[link_key(card_number, card_name, card_number in duplicated)] = url
         out_dir = os.path.dirname(args.output)
         if out_dir:
             os.makedirs(out_dir, exist_ok=True)
         with open(args.output, "w", encoding="utf-8") as f:
             json.dump(result, f, ensure_ascii=False, indent=2)
         print(f"出力: {args.output} （{len(result)} 件、スキップ {skipped} 件）")
+        run_history.count("links", len(result))
+        run_history.count("skipped", skipped)
         return
 
     # 列名指定で DictReader
@@ -143,6 +156,7 @@ def main():
 
     if not rows:
         print("エラー: CSV にデータ行がありません。", file=sys.stderr)
+        run_history.fail("CSV にデータ行がありません")
         sys.exit(1)
 
     # card_number の列名（No か card_number）
@@ -171,14 +185,13 @@ def main():
 
     if not url_col and not english_col:
         print(
-            "エラー: URL を取得できません。--url-column で URL 列を指定するか、"
-            "--english-name-column で英名列を指定してください。",
+            "URL 列・英名列がないため、カード名から辞書で英名を組み立てます"
+            "（--url-column / --english-name-column で列を指定できます）",
             file=sys.stderr,
         )
-        sys.exit(1)
 
-    # card_number の出現回数（複合キー用）
-    cn_counts = Counter(normalize(r.get(cn_col, "")) for r in rows if normalize(r.get(cn_col, "")))
+    # 同じ型番に別名のカードがあるものだけ card_number|カード名 のキーにする
+    duplicated = duplicated_numbers((normalize(r.get(cn_col, "")), normalize(r.get(name_col, ""))) for r in rows)
 
     result = {}
     skipped = 0
@@ -198,23 +211,24 @@ def main():
             eng = normalize(row.get(english_col, ""))
             if eng:
                 url = build_url_from_english_name(eng, card_number)
+        if not url and card_name:
+            eng = english_name_offline(card_name)
+            if eng:
+                url = build_url_from_english_name(eng, card_number)
 
         if not url:
             skipped += 1
             continue
 
-        if cn_counts[card_number] > 1:
-            key = f"{card_number}|{card_name}" if card_name else card_number
-        else:
-            key = card_number
-
-        result[key] = url
+        result[link_key(card_number, card_name, card_number in duplicated)] = url
 
     os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
     with open(args.output, "w", encoding="utf-8") as f:
         json.dump(result, f, ensure_ascii=False, indent=2)
 
     print(f"出力: {args.output} （{len(result)} 件、スキップ {skipped} 件）")
+    run_history.count("links", len(result))
+    run_history.count("skipped", skipped)
 
 
 if __name__ == "__main__":
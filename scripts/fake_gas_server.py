@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+PSA9 相場 GAS（scripts/gas/psa9_stats_api.gs）のローカル代替サーバー。
+
+本物の GAS と同じ入出力（POST { cards: [...] } → { results: [...] }）で、
+ヤフオクには行かずにカードごとの固定値を返す。バックエンドの /api/psa9-stats や
+refresh_psa9_stats.py の動作確認・並行実行の計測に使う。
+
+使い方:
+  python scripts/fake_gas_server.py --port 8765 --delay-ms 600 --fail-rate 0.1
+  PSA9_SOURCE=gas GAS_PSA9_API_URL=http://127.0.0.1:8765/ uvicorn backend.main:app
+  python scripts/fake_gas_server.py --check   … backend/gas_client.py の動作確認（失敗があれば終了コード 1）
+
+オプション:
+  --delay-ms N   … 1 カードあたりの待ち時間（GAS の Utilities.sleep(600) 相当。デフォルト 600）
+  --fail-rate R  … リクエストを 500 で失敗させる確率（0〜1。再試行の確認用）
+
+--check では別スレッドにこのサーバーを立て、GasClient について次を確かめる:
+  同時実行数が上限を超えない・500 とタイムアウトを再試行する・id の無い結果に送信順で id を補う
+  （端数のバッチも含む）・再試行しても失敗したバッチだけを GasBatchError にして残りの結果は返す
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+
+def fake_stats(card: dict) -> dict:
+    """カード情報から決定的なダミー相場を作る（同じカードなら毎回同じ値）"""
+    query = f"{card.get('cardName') or ''} {card.get('cardNum') or ''} {card.get('rarity') or ''} PSA9".strip()
+    mercari_url = (
+        f"https://jp.mercari.com/search?keyword={quote(query)}&status=sold_out&sort=created_time&order=desc"
+    )
+    seed = int(hashlib.md5(query.encode("utf-8")).hexdigest()[:8], 16)
+    if seed % 4 == 0:
+        return {
+            "id": card.get("id"),
+            "yahooAvg": None,
+            "yahooMedian": None,
+            "recent1": None,
+            "recent2": None,
+            "recent3": None,
+            "mercariUrl": mercari_url,
+            "hasHistory": False,
+            "error": None,
+        }
+    base = 5000 + (seed % 200) * 500
+    prices = [base + (seed >> i) % 3000 for i in (3, 7, 11)]
+    recents = [
+        {"price": p, "url": f"https://auctions.yahoo.co.jp/jp/auction/x{seed % 10**9}{n}"}
+        for n, p in enumerate(prices)
+    ]
+    return {
+        "id": card.get("id"),
+        "yahooAvg": round(sum(prices) / len(prices)),
+        "yahooMedian": sorted(prices)[1],
+        "recent1": recents[0],
+        "recent2": recents[1],
+        "recent3": recents[2],
+        "mercariUrl": mercari_url,
+        "hasHistory": True,
+        "error": None,
+    }
+
+
+class FakeGasState:
+    """
+    --check 用の振る舞いと計測。バッチ（先頭カードの id）ごとに何回目の試行かを数える
+      fail_first:  各バッチの最初の N 回を 500 にする
+      stall_first: 各バッチの最初の N 回を stall_sec 秒待たせる（クライアントのタイムアウトの確認用）
+      omit_ids:    結果に id を入れない
+      fail_ids:    この id を含むバッチは毎回 500 にする
+    """
+
+    def __init__(self, fail_first: int = 0, stall_first: int = 0, stall_sec: float = 0.0, omit_ids: bool = False, fail_ids=()):
+        self.fail_first = fail_first
+        self.stall_first = stall_first
+        self.stall_sec = stall_sec
+        self.omit_ids = omit_ids
+        self.fail_ids = set(fail_ids)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.inflight = 0
+        self.max_inflight = 0
+        self.attempts: dict = {}
+
+    def enter(self, cards: list) -> int:
+        """リクエストの開始。このバッチの何回目の試行か（1 始まり）"""
+        key = (cards[0].get("id") if cards else None)
+        with self.lock:
+            self.requests += 1
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+            return self.attempts[key]
+
+    def leave(self):
+        with self.lock:
+            self.inflight -= 1
+
+
+def make_handler(delay_ms: int, fail_rate: float, state: FakeGasState | None = None):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, obj):
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._send_json(200, {"message": "PSA9 API is running. Use POST with { cards: [...] }."})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "invalid json"})
+                return
+            cards = payload.get("cards") or []
+            if state is None:
+                if fail_rate and random.random() < fail_rate:
+                    self._send_json(500, {"error": "fake failure"})
+                    return
+                time.sleep(delay_ms / 1000 * len(cards))
+                self._send_json(200, {"results": [fake_stats(c) for c in cards]})
+                return
+            attempt = state.enter(cards)
+            try:
+                if attempt <= state.stall_first:
+                    time.sleep(state.stall_sec)
+                if attempt <= state.fail_first or any(c.get("id") in state.fail_ids for c in cards):
+                    self._send_json(500, {"error": "fake failure"})
+                    return
+                time.sleep(delay_ms / 1000 * len(cards))
+                results = [fake_stats(c) for c in cards]
+                if state.omit_ids:
+                    for res in results:
+                        res.pop("id")
+                self._send_json(200, {"results": results})
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # タイムアウトしたクライアントが切断済み
+            finally:
+                state.leave()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@contextmanager
+def serve_in_thread(delay_ms: int = 0, fail_rate: float = 0.0, state: FakeGasState | None = None):
+    """空いているポートで別スレッドに立て、URL を返す"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(delay_ms, fail_rate, state))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _cards(n: int) -> list:
+    return [
+        {"id": f"c{i:03d}", "card_name": f"カード{i}", "card_number": f"{i:03d}/100", "rarity": "SAR"}
+        for i in range(n)
+    ]
+
+
+def run_check() -> list:
+    """GasClient の振る舞いを確かめる。戻り値: 失敗した項目の説明"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+    import gas_client
+    from gas_client import GasBatchError, GasClient
+
+    gas_client.RETRY_BASE_DELAY_SEC = 0.01
+    failures = []
+
+    def check(ok: bool, label: str):
+        print(f"  {'OK' if ok else 'NG'}: {label}")
+        if not ok:
+            failures.append(label)
+
+    async def fetch(url: str, cards: list, **kwargs):
+        client = GasClient(url, **kwargs)
+        try:
+            return await client.fetch(cards)
+        finally:
+            await client.aclose()
+
+    def ids_of(results: list) -> list:
+        return [r.get("id") for r in results]
+
+    cards = _cards(160)
+    expected_ids = [c["id"] for c in cards]
+
+    print("同時実行数の上限（8 バッチ・上限 3）")
+    state = FakeGasState()
+    with serve_in_thread(delay_ms=5, state=state) as url:
+        results, errors = asyncio.run(fetch(url, cards, concurrency=3))
+    check(state.max_inflight == 3, f"同時に処理中のリクエストが 3 本まで（最大 {state.max_inflight} 本）")
+    check(not errors and ids_of(results) == expected_ids, "全件が送信順に返る")
+
+    print("500 の再試行")
+    state = FakeGasState(fail_first=1)
+    with serve_in_thread(state=state) as url:
+        results, errors = asyncio.run(fetch(url, cards, concurrency=3))
+    check(not errors and ids_of(results) == expected_ids, "各バッチ 1 回目の 500 のあと全件そろう")
+    check(state.requests == 16, f"リクエストは 1 バッチ 2 回（{state.requests} 回）")
+
+    print("タイムアウトの再試行")
+    state = FakeGasState(stall_first=1, stall_sec=1.0)
+    with serve_in_thread(state=state) as url:
+        results, errors = asyncio.run(fetch(url, cards[:40], concurrency=2, timeout=0.3))
+    check(not errors and ids_of(results) == expected_ids[:40], "1 回目がタイムアウトしても全件そろう")
+
+    print("id の無い結果（端数のバッチを含む 45 件）")
+    state = FakeGasState(omit_ids=True)
+    with serve_in_thread(state=state) as url:
+        results, errors = asyncio.run(fetch(url, cards[:45], concurrency=3))
+    check(not errors and ids_of(results) == expected_ids[:45], "送信順で id を補う")
+
+    print("失敗し続けるバッチ（60 件のうち 2 バッチ目）")
+    state = FakeGasState(fail_ids={"c025"})
+    with serve_in_thread(state=state) as url:
+        results, errors = asyncio.run(fetch(url, cards[:60], concurrency=3, retries=1))
+    check(ids_of(results) == expected_ids[:20] + expected_ids[40:60], "残りのバッチの結果は返る")
+    check(
+        len(errors) == 1 and isinstance(errors[0], GasBatchError)
+        and errors[0].batch_index == 1 and errors[0].ids == expected_ids[20:40],
+        "失敗したバッチの番号と id が GasBatchError に入る",
+    )
+    check(state.attempts.get("c020") == 2, f"失敗したバッチも再試行する（{state.attempts.get('c020')} 回）")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PSA9 GAS のローカル代替サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay-ms", type=int, default=600, help="1 カードあたりの待ち時間（ミリ秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="500 を返す確率（0〜1）")
+    parser.add_argument("--check", action="store_true", help="サーバーを立てずに backend/gas_client.py の動作を確認する")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = run_check()
+        print(f"\n{'すべて OK' if not failures else f'NG {len(failures)} 件'}")
+        sys.exit(1 if failures else 0)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.delay_ms, args.fail_rate))
+    print(f"fake GAS: http://{args.host}:{args.port}/ （delay {args.delay_ms}ms/件, fail-rate {args.fail_rate}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Gemini（google-genai の Client）のローカル代替。
+
+update_ebay_links_gemini.translate_with_gemini に client として渡すと、API を呼ばずに
+プロンプト内の [{id, ja}, ...] から決定的な「英名」（en:<日本語名>）を JSON で返す。
+順番の入れ替え・一部の id の欠け・壊れた JSON・例外をわざと混ぜられるので、
+チャンク分割・並列実行・id での対応付け・チャンクごとの再試行を確認できる。
+最後に、空の en が返った名前だけがネガティブキャッシュに入り、エラーで答えが返らなかった名前は入らないことも確かめる。
+
+使い方（filtered_cards.csv のカード名で確認）:
+  python scripts/fake_gemini_client.py --fail-rate 0.2 --drop-rate 0.1 --chunk-size 25
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fake_english(japanese: str) -> str:
+    return f"en:{japanese}"
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def generate_content(self, model=None, contents="", config=None):
+        owner = self.owner
+        with owner.lock:
+            owner.calls += 1
+            roll = owner.random.random()
+            drop_rolls = None
+        if owner.delay_ms:
+            time.sleep(owner.delay_ms / 1000)
+        if roll < owner.fail_rate / 2:
+            raise RuntimeError("fake: 503 UNAVAILABLE")
+        if roll < owner.fail_rate:
+            return _FakeResponse('[{"id": "0", "en": ')  # 途中で切れた JSON
+        items = json.loads(contents[contents.index("Input:") + len("Input:") :])
+        with owner.lock:
+            drop_rolls = [owner.random.random() for _ in items]
+            owner.random.shuffle(items)
+        results = [
+            {"id": it["id"], "en": "" if it["ja"] in owner.empty_names else fake_english(it["ja"])}
+            for it, r in zip(items, drop_rolls)
+            if r >= owner.drop_rate
+        ]
+        return _FakeResponse(json.dumps(results, ensure_ascii=False))
+
+
+class FakeGeminiClient:
+    """
+    fail_rate: 呼び出しが失敗する確率（半分は例外、半分は壊れた JSON）
+    drop_rate: 応答から 1 件ずつ id が欠ける確率
+    empty_names: 訳せなかったとして空の en を返す日本語名
+    応答の順番は常にシャッフルする（行の順番に頼った対応付けだと必ずずれる）
+    """
+
+    def __init__(
+        self, fail_rate: float = 0.0, drop_rate: float = 0.0, delay_ms: int = 0, seed: int = 0, empty_names=()
+    ):
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.empty_names = set(empty_names)
+        self.delay_ms = delay_ms
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.models = _FakeModels(self)
+
+    def close(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini の代替クライアントで translate_with_gemini を確認")
+    parser.add_argument("--csv", default=os.path.join(BASE_DIR, "filtered_cards.csv"))
+    parser.add_argument("--fail-rate", type=float, default=0.2)
+    parser.add_argument("--drop-rate", type=float, default=0.1)
+    parser.add_argument("--delay-ms", type=int, default=200, help="1 呼び出しあたりの待ち時間（ミリ秒）")
+    parser.add_argument("--chunk-size", type=int, default=25)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import update_ebay_links_gemini as gem
+
+    gem.GEMINI_RETRY_BASE_DELAY_SEC = 0.1
+    names = sorted({name for _, _, name in gem.load_filtered_cards(args.csv) if name})
+    client = FakeGeminiClient(args.fail_rate, args.drop_rate, args.delay_ms)
+    started = time.time()
+    result = gem.translate_with_gemini(
+        names, "", client=client, chunk_size=args.chunk_size, concurrency=args.concurrency
+    )
+    elapsed = time.time() - started
+
+    wrong = [(ja, en) for ja, en in zip(names, result) if en and en != fake_english(ja)]
+    missing = sum(1 for en in result if not en)
+    print(f"名前 {len(names)} 件、呼び出し {client.calls} 回、{elapsed:.1f} 秒")
+    print(f"対応ずれ {len(wrong)} 件、未取得 {missing} 件")
+    for ja, en in wrong[:10]:
+        print(f"  ずれ: {ja} -> {en}")
+    blocked_ok = check_negative_cache(gem)
+    sys.exit(1 if wrong or not blocked_ok else 0)
+
+
+def check_negative_cache(gem) -> bool:
+    """（辞書に無い名前で）空の en だけをネガティブキャッシュに記録し、エラーで答えが無かった名前は記録しないか"""
+    sys.path.insert(0, BASE_DIR)
+    from ebay_names import TranslationCache, translate_names
+    from negative_cache import NegativeCache
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, client, expected in (
+            ("すべてエラー", FakeGeminiClient(fail_rate=1.0), set()),
+            ("空の en", FakeGeminiClient(empty_names={"ダミーモンA"}), {"ダミーモンA"}),
+        ):
+            negative = NegativeCache(gem.NEGATIVE_CACHE_NAMESPACE, path=os.path.join(tmp, "negative_cache.json"))
+            cache = TranslationCache(os.path.join(tmp, "cache.json"))
+            translate_names(
+                ["ダミーモンA", "ダミーモンB"], cache, lambda bases: gem.translate_with_gemini(bases, "", client=client), negative
+            )
+            recorded = set(negative.entries)
+            good = recorded == expected
+            ok = ok and good
+            print(f"  {'OK' if good else 'NG'}: {label} → ネガティブキャッシュ {sorted(recorded)}（期待値 {sorted(expected)}）")
+    return ok
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+pokeca-chart.com のローカル代替サーバー。
+
+pokeca_chart_links.json にあるカード詳細ページを「サイトに載っているカード」として、
+fetch_pokeca_chart_links.py が使う次の URL に決定的な内容で応答する。
+  /wp-json/wp/v2/search?search=… … WordPress の検索 API（[{id, title, url, type, subtype}, ...]）
+  /?s=…                           … 検索ページ（--static-html のときだけ結果のリンクを HTML に含める）
+  /{slug}/                        … カード詳細ページ（タイトルにカード名。載っていなければ 404）
+検索は WordPress と同じく、空白で区切った語をすべて型番かカード名（filtered_cards.csv の名前）に含むカードを返す。
+
+ブラウザ（JavaScript 実行後の表示）の代わりに、ヘッダー X-Fake-Rendered: 1 付きの検索ページには結果のリンク
+（無ければ NOT FOUND）を含めて返す。
+
+使い方:
+  python scripts/fake_pokeca_chart_server.py --port 8767 --delay-ms 200
+  POKECA_CHART_BASE_URL=http://127.0.0.1:8767 python fetch_pokeca_chart_links.py --http-only
+  python scripts/fake_pokeca_chart_server.py --check   … fetch_pokeca_chart_links.run_pool の確認（失敗があれば終了コード 1）
+
+オプション:
+  --delay-ms N   … 1 リクエストあたりの待ち時間（デフォルト 200）
+  --no-api       … 検索 API を 404 にする（静的 HTML への切り替えの確認用）
+  --static-html  … 検索ページの HTML に結果のリンクを含める（実サイトは JavaScript で後から表示）
+  --drop N       … pokeca_chart_links.json の先頭から N 件おきに 1 件を「サイトに無い」扱いにする
+
+--check では別スレッドにこのサーバーを立て、Playwright の代わりに FakeBrowserPages（レンダリング後の
+検索ページを HTTP で取るページ）を使って run_pool を動かし、次を確かめる:
+  候補 URL（synth）→ HTTP 検索（http）→ ブラウザ（browser）の順に試し、見つかった段階で止まる・
+  サイトが NOT FOUND と表示したカードだけネガティブキャッシュに記録し、ページを開けなかったカードは記録しない
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+import requests
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_catalog(drop: int = 0) -> dict:
+    """slug → {card_number, names}。pokeca_chart_links.json と filtered_cards.csv から作る"""
+    with open(os.path.join(BASE_DIR, "pokeca_chart_links.json"), encoding="utf-8") as f:
+        links = json.load(f)
+    names_by_cn: dict = {}
+    with open(os.path.join(BASE_DIR, "filtered_cards.csv"), encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            cn = (row.get("card_number") or "").strip()
+            name = (row.get("カード名") or "").strip()
+            if cn and name:
+                names_by_cn.setdefault(cn, set()).add(name)
+    catalog = {}
+    for i, (key, url) in enumerate(sorted(links.items())):
+        if drop and i % drop == 0:
+            continue
+        cn, _, name = key.partition("|")
+        slug = url.rstrip("/").rsplit("/", 1)[-1]
+        entry = catalog.setdefault(slug, {"card_number": cn, "names": set()})
+        entry["names"].update([name] if name else names_by_cn.get(cn, ()))
+    return catalog
+
+
+def search(catalog: dict, query: str) -> list:
+    """WordPress の検索と同じく、空白で区切った語をすべて含むカード（型番かカード名に含まれるか）"""
+    words = query.replace("＆", "&").split()
+
+    def hit(entry, word):
+        return word in entry["card_number"] or any(word in n.replace("＆", "&") for n in entry["names"])
+
+    return sorted(slug for slug, entry in catalog.items() if words and all(hit(entry, w) for w in words))
+
+
+def make_handler(catalog: dict, base_url: str, options: dict, log: list | None = None):
+    """
+    options: {"delay_ms", "no_api", "static_html", "broken_browser"}（実行中に書き換えてよい。
+      broken_browser: X-Fake-Rendered 付きのリクエストに応答せず切断する＝ブラウザでページを開けない）
+    log を渡すと受けたリクエストを ("detail" | "api" | "search" | "rendered", slug か検索語) で追記する
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: str, content_type: str):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(data)
+
+        def _log(self, kind: str, detail: str):
+            if log is not None:
+                log.append((kind, detail))
+
+        def do_GET(self):
+            time.sleep(options.get("delay_ms", 0) / 1000)
+            parsed = urlparse(self.path)
+            params = parse_qs(parsed.query)
+            if parsed.path.rstrip("/") == "/wp-json/wp/v2/search":
+                self._log("api", (params.get("search") or [""])[0])
+                if options.get("no_api"):
+                    self._send(404, '{"code":"rest_no_route"}', "application/json")
+                    return
+                items = [
+                    {"id": i, "title": slug, "url": f"{base_url}/{slug}/", "type": "post", "subtype": "post"}
+                    for i, slug in enumerate(search(catalog, (params.get("search") or [""])[0]))
+                ]
+                self._send(200, json.dumps(items), "application/json; charset=utf-8")
+                return
+            if parsed.path == "/" and "s" in params:
+                rendered = self.headers.get("X-Fake-Rendered") == "1"
+                self._log("rendered" if rendered else "search", params["s"][0])
+                if rendered and options.get("broken_browser"):
+                    self.close_connection = True
+                    return
+                slugs = search(catalog, params["s"][0])
+                if (options.get("static_html") or rendered) and slugs:
+                    body = "".join(f'<a href="/{escape(s)}/">{escape(s)}</a>' for s in slugs)
+                elif options.get("static_html") or rendered:
+                    body = "<h1>NOT FOUND</h1>"
+                else:
+                    body = '<div id="results"></div><script>/* 結果は JavaScript で表示 */</script>'
+                self._send(200, f"<html><body>{body}</body></html>", "text/html; charset=utf-8")
+                return
+            slug = unquote(parsed.path).strip("/")
+            self._log("detail", slug)
+            if slug in catalog:
+                title = " / ".join(sorted(catalog[slug]["names"])) or slug
+                body = f"<html><head><title>{escape(title)}</title></head><body><h1>{escape(title)}</h1></body></html>"
+                self._send(200, body, "text/html; charset=utf-8")
+            else:
+                self._send(404, "<html><body>NOT FOUND</body></html>", "text/html; charset=utf-8")
+
+        do_HEAD = do_GET
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class _FakeLocator:
+    @property
+    def first(self):
+        return self
+
+    async def click(self, timeout=None):
+        raise TimeoutError("fake: 検索ボタンはありません")
+
+
+class _FakePage:
+    """Playwright のページの代わり。goto で検索ページを「レンダリング後」として取得する"""
+
+    def __init__(self, session: requests.Session):
+        self.session = session
+        self.html = ""
+
+    async def goto(self, url, wait_until=None, timeout=None):
+        r = await asyncio.to_thread(self.session.get, url, headers={"X-Fake-Rendered": "1"}, timeout=10)
+        self.html = r.text
+
+    async def wait_for_timeout(self, ms):
+        pass
+
+    async def wait_for_selector(self, selector, timeout=None):
+        if "<a " not in self.html:
+            raise TimeoutError("fake: リンクが表示されません")
+
+    async def content(self):
+        return self.html
+
+    def locator(self, selector):
+        return _FakeLocator()
+
+
+class FakeBrowserPages:
+    """browser_manager.AsyncBrowserManager の代わり（run_pool が使う page()・close() だけ）"""
+
+    def __init__(self, **kwargs):
+        self.session = requests.Session()
+        self.pages_opened = 0
+
+    @asynccontextmanager
+    async def page(self):
+        self.pages_opened += 1
+        yield _FakePage(self.session)
+
+    async def close(self):
+        self.session.close()
+
+
+def _pick_cards(catalog: dict, n: int) -> list:
+    """弾コードが英数字だけで、filtered_cards.csv に名前が 1 つだけある標準型番のカード [(型番, 名前, slug)]"""
+    picked = []
+    for slug, entry in sorted(catalog.items()):
+        m = re.fullmatch(r"([a-z0-9]+)-\d+-\d+", slug)
+        if m and len(entry["names"]) == 1:
+            picked.append((entry["card_number"], next(iter(entry["names"])), slug))
+        if len(picked) == n:
+            break
+    return picked
+
+
+def run_check() -> list:
+    """fetch_pokeca_chart_links.run_pool の取得順を確かめる。戻り値: 失敗した項目の説明"""
+    catalog = load_catalog()
+    options = {"delay_ms": 0, "no_api": False, "static_html": False}
+    log: list = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), None)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    server.RequestHandlerClass = make_handler(catalog, base_url, options, log)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["POKECA_CHART_BASE_URL"] = base_url
+    sys.path.insert(0, BASE_DIR)
+    import fetch_pokeca_chart_links as fpl
+    from negative_cache import NegativeCache
+
+    workdir = tempfile.mkdtemp(prefix="pokeca_check_")
+    fpl.AsyncBrowserManager = FakeBrowserPages
+    fpl.CSV_PATH = fpl.Path(workdir) / "filtered_cards.csv"
+    fpl.OUTPUT_PATH = fpl.Path(workdir) / "pokeca_chart_links.json"
+    fpl.REQUEST_DELAY_SEC = 0
+    fpl.PAGE_LOAD_WAIT_SEC = 0
+    fpl.SEARCH_RETRY_WAIT_MS = 0
+    fpl.HTTP_MIN_INTERVAL_SEC = 0
+
+    (synth_cn, synth_name, synth_slug), (http_cn, http_name, http_slug), (browser_cn, browser_name, browser_slug) = (
+        _pick_cards(catalog, 3)
+    )
+    missing_cn, missing_name = "999/998", "存在しないカード"
+    with open(fpl.CSV_PATH, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["card_number", "カード名", "弾"])
+        writer.writerow([synth_cn, synth_name, synth_slug.split("-")[0].upper()])  # 正しい弾 → 候補 URL で見つかる
+        writer.writerow([http_cn, http_name, "ZZ9"])  # 違う弾 → 候補 URL は 404
+        writer.writerow([browser_cn, browser_name, "ZZ9"])
+        writer.writerow([missing_cn, missing_name, ""])
+
+    failures = []
+
+    def check(ok: bool, label: str):
+        print(f"  {'OK' if ok else 'NG'}: {label}")
+        if not ok:
+            failures.append(label)
+
+    def run(entries: list, negative) -> tuple:
+        results: dict = {}
+        log.clear()
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                fetched = asyncio.run(fpl.run_pool(entries, results, 1, 0, False, negative=negative))
+            finally:
+                sys.stdout = stdout
+        return fetched, results, list(log)
+
+    def kinds(requests_log: list) -> list:
+        return list(dict.fromkeys(kind for kind, _ in requests_log))
+
+    negative = NegativeCache("pokeca_chart", path=os.path.join(workdir, "negative_cache.json"))
+    try:
+        print(f"候補 URL で見つかるカード（{synth_cn}）")
+        fetched, results, requests_log = run([(synth_cn, synth_name, False)], negative)
+        check(fetched == {"synth": 1} and results.get(synth_cn) == f"{base_url}/{synth_slug}/", "synth で取得")
+        check(kinds(requests_log) == ["detail"], f"検索はしない（{kinds(requests_log)}）")
+
+        print(f"候補 URL が外れ、検索 API で見つかるカード（{http_cn}）")
+        fetched, results, requests_log = run([(http_cn, http_name, False)], negative)
+        check(fetched == {"http": 1} and results.get(http_cn) == f"{base_url}/{http_slug}/", "http で取得")
+        check(kinds(requests_log) == ["detail", "api"], f"候補 URL → 検索 API の順（{kinds(requests_log)}）")
+
+        print(f"HTTP では見つからず、ブラウザで見つかるカード（{browser_cn}、検索 API なし）")
+        options["no_api"] = True
+        fetched, results, requests_log = run([(browser_cn, browser_name, False)], negative)
+        check(fetched == {"browser": 1} and results.get(browser_cn) == f"{base_url}/{browser_slug}/", "browser で取得")
+        check(
+            kinds(requests_log) == ["detail", "api", "search", "rendered"],
+            f"候補 URL → 検索 API → 検索ページ → ブラウザの順（{kinds(requests_log)}）",
+        )
+        check(browser_cn not in negative.entries, "見つかったカードはネガティブキャッシュに記録しない")
+
+        print(f"サイトに無いカード（{missing_cn}）")
+        fetched, results, requests_log = run([(missing_cn, missing_name, False)], negative)
+        check(not fetched and not results, "どの段階でも見つからない")
+        check(negative.entries.get(missing_cn, {}).get("reason") == fpl.NOT_FOUND_ON_SITE, "NOT FOUND をネガティブキャッシュに記録")
+
+        print(f"ブラウザでページを開けないカード（{http_cn}、検索 API なし）")
+        options["broken_browser"] = True
+        fetched, results, requests_log = run([(http_cn, http_name, False)], negative)
+        check(not fetched and not results, "見つからない")
+        check(http_cn not in negative.entries, "ページを開けなかったカードはネガティブキャッシュに記録しない")
+    finally:
+        options["no_api"] = False
+        options["broken_browser"] = False
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pokeca-chart.com のローカル代替サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--delay-ms", type=int, default=200, help="1 リクエストあたりの待ち時間（ミリ秒）")
+    parser.add_argument("--no-api", action="store_true", help="検索 API を 404 にする")
+    parser.add_argument("--static-html", action="store_true", help="検索ページの HTML に結果のリンクを含める")
+    parser.add_argument("--drop", type=int, default=0, help="N 件おきに 1 件をサイトに無い扱いにする")
+    parser.add_argument("--check", action="store_true", help="サーバーを立てずに fetch_pokeca_chart_links.run_pool の動作を確認する")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = run_check()
+        print(f"\n{'すべて OK' if not failures else f'NG {len(failures)} 件'}")
+        sys.exit(1 if failures else 0)
+
+    base_url = f"http://{args.host}:{args.port}"
+    catalog = load_catalog(args.drop)
+    options = {"delay_ms": args.delay_ms, "no_api": args.no_api, "static_html": args.static_html}
+    handler = make_handler(catalog, base_url, options)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"fake pokeca-chart: {base_url}/ （{len(catalog)} 件, delay {args.delay_ms}ms）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+ヤフオク落札済み検索（closedsearch）のローカル代替サーバー。
+
+psa9_collector.py が読むのと同じ HTML 断片（Product__priceValue / Product__titleLink）を、
+検索クエリごとに決定的な内容で返す。一部のクエリは「履歴なし」、一部は外れ値（まとめ売りなど）を含む。
+refresh_psa9_stats.py --source yahoo の動作確認・計測に使う。
+
+使い方:
+  python scripts/fake_yahoo_server.py --port 8766 --delay-ms 300
+  YAHOO_CLOSEDSEARCH_URL=http://127.0.0.1:8766/closedsearch/closedsearch python scripts/refresh_psa9_stats.py
+  python scripts/fake_yahoo_server.py --check   … psa9_collector.py の結果を GAS の結果と比べ、503 が続くと例外になるかも確かめる（違えば終了コード 1）
+
+オプション:
+  --delay-ms N   … 1 リクエストあたりの待ち時間（デフォルト 300）
+  --fail-rate R  … リクエストを 503 で失敗させる確率（0〜1。再試行の確認用）
+
+FIXTURES のクエリには固定の落札一覧を返す。KNOWN_GAS_RESULTS はその一覧を scripts/gas/psa9_stats_api.gs の
+getYahooStats に通した結果（Node で実行して得た値）で、--check では psa9_collector.fetch_stats の結果が
+これと一致するか（外れ値を含む一覧は平均・中央値だけ外れ値を除いた値）を確かめる。
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_AUCTION = "https://auctions.yahoo.co.jp/jp/auction"
+_MERCARI = "https://jp.mercari.com/search?keyword={}&status=sold_out&sort=created_time&order=desc"
+
+# (カード名, 型番, レア) → 表示順の落札一覧。URL は相対パスも混ぜる（GAS と同じく https://auctions.yahoo.co.jp を補う）
+FIXTURES = {
+    # 平均が .5（Math.round は切り上げ）・外れ値の判定をしない 2 件
+    ("ピカチュウ", "001/100", "SAR"): [(12000, f"{_AUCTION}/fx1a"), (12001, f"{_AUCTION}/fx1b")],
+    # 中央値が .5（偶数件は中央 2 件の平均を丸める）・外れ値なしの 4 件
+    ("リザードン", "002/100", "SR"): [
+        (8000, "/jp/auction/fx2a"), (9001, "/jp/auction/fx2b"), (8500, "/jp/auction/fx2c"), (9500, "/jp/auction/fx2d"),
+    ],
+    # まとめ売り（外れ値）を含む 5 件
+    ("ミュウ", "003/100", "UR"): [
+        (10000, f"{_AUCTION}/fx3a"), (110000, f"{_AUCTION}/fx3bulk"), (11000, f"{_AUCTION}/fx3c"),
+        (12000, f"{_AUCTION}/fx3d"), (10500, f"{_AUCTION}/fx3e"),
+    ],
+    # 履歴なし（レアが空。クエリに空白が 2 つ続く）
+    ("リーリエ&ピッピ", "004/100", ""): [],
+}
+
+KNOWN_GAS_RESULTS = {
+    ("ピカチュウ", "001/100", "SAR"): {
+        "yahooAvg": 12001, "yahooMedian": 12001,
+        "recent1": {"price": 12000, "url": f"{_AUCTION}/fx1a"},
+        "recent2": {"price": 12001, "url": f"{_AUCTION}/fx1b"},
+        "recent3": None,
+        "mercariUrl": _MERCARI.format("%E3%83%94%E3%82%AB%E3%83%81%E3%83%A5%E3%82%A6%20001%2F100%20SAR%20PSA9"),
+        "hasHistory": True,
+    },
+    ("リザードン", "002/100", "SR"): {
+        "yahooAvg": 8750, "yahooMedian": 8751,
+        "recent1": {"price": 8000, "url": f"{_AUCTION}/fx2a"},
+        "recent2": {"price": 9001, "url": f"{_AUCTION}/fx2b"},
+        "recent3": {"price": 8500, "url": f"{_AUCTION}/fx2c"},
+        "mercariUrl": _MERCARI.format("%E3%83%AA%E3%82%B6%E3%83%BC%E3%83%89%E3%83%B3%20002%2F100%20SR%20PSA9"),
+        "hasHistory": True,
+    },
+    ("ミュウ", "003/100", "UR"): {
+        "yahooAvg": 30700, "yahooMedian": 11000,
+        "recent1": {"price": 10000, "url": f"{_AUCTION}/fx3a"},
+        "recent2": {"price": 110000, "url": f"{_AUCTION}/fx3bulk"},
+        "recent3": {"price": 11000, "url": f"{_AUCTION}/fx3c"},
+        "mercariUrl": _MERCARI.format("%E3%83%9F%E3%83%A5%E3%82%A6%20003%2F100%20UR%20PSA9"),
+        "hasHistory": True,
+    },
+    ("リーリエ&ピッピ", "004/100", ""): {
+        "yahooAvg": None, "yahooMedian": None, "recent1": None, "recent2": None, "recent3": None,
+        "mercariUrl": _MERCARI.format(
+            "%E3%83%AA%E3%83%BC%E3%83%AA%E3%82%A8%26%E3%83%94%E3%83%83%E3%83%94%20004%2F100%20%20PSA9"
+        ),
+        "hasHistory": False,
+    },
+}
+
+# GAS は外れ値を除かないので、平均・中央値だけ GAS と違う値になるもの（外れ値 110000 を除いた 4 件の値）
+ROBUST_OVERRIDES = {
+    ("ミュウ", "003/100", "UR"): {"yahooAvg": 10875, "yahooMedian": 10750},
+}
+
+
+def _fixture_query(card_name: str, card_number: str, rarity: str) -> str:
+    # psa9_collector.build_query と同じ組み立て（GAS と同じ）
+    return f"{card_name} {card_number} {rarity} PSA9".strip()
+
+
+_FIXTURE_LISTINGS = {_fixture_query(*card): items for card, items in FIXTURES.items()}
+
+
+def fake_listing(query: str) -> list:
+    """クエリから決定的な落札一覧 [(価格, URL), ...] を作る（同じクエリなら毎回同じ）"""
+    if query in _FIXTURE_LISTINGS:
+        return _FIXTURE_LISTINGS[query]
+    seed = int(hashlib.md5(query.encode("utf-8")).hexdigest()[:8], 16)
+    if seed % 4 == 0:
+        return []
+    count = 3 + seed % 8
+    base = 5000 + (seed % 200) * 500
+    items = []
+    for n in range(count):
+        price = base + ((seed >> n) % 3000)
+        items.append((price, f"https://auctions.yahoo.co.jp/jp/auction/x{seed % 10**9}{n}"))
+    if seed % 3 == 0:
+        # まとめ売り（外れ値）を 1 件混ぜる
+        items.insert(1, (base * 10, f"https://auctions.yahoo.co.jp/jp/auction/x{seed % 10**9}bulk"))
+    return items
+
+
+def render_page(query: str) -> str:
+    rows = []
+    for price, url in fake_listing(query):
+        rows.append(
+            '<li class="Product">'
+            f'<a class="Product__titleLink" href="{escape(url)}">{escape(query)}</a>'
+            f'<span class="Product__priceValue">{price:,}円</span>'
+            "</li>"
+        )
+    body = "".join(rows) or '<p class="Empty">該当する商品はありません</p>'
+    return f"<html><body><ul>{body}</ul></body></html>"
+
+
+def make_handler(delay_ms: int, fail_rate: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = (parse_qs(parsed.query).get("p") or [""])[0]
+            if fail_rate and random.random() < fail_rate:
+                self.send_response(503)
+                self.end_headers()
+                return
+            time.sleep(delay_ms / 1000)
+            body = render_page(query).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def run_check() -> list:
+    """FIXTURES のカードを psa9_collector.fetch_stats で取得し、GAS の結果と比べる。戻り値: 違った項目の説明"""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import psa9_collector
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(0, 0.0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/closedsearch/closedsearch"
+    failures = []
+    session = psa9_collector.make_session(1)
+    try:
+        for card, gas in KNOWN_GAS_RESULTS.items():
+            name, number, rarity = card
+            result = psa9_collector.fetch_stats(
+                session, {"id": number, "card_name": name, "card_number": number, "rarity": rarity}, base_url
+            )
+            expected = {**gas, **ROBUST_OVERRIDES.get(card, {}), "error": None}
+            diffs = [f"{k}: {result.get(k)!r}（期待値 {v!r}）" for k, v in expected.items() if result.get(k) != v]
+            label = " ".join(p for p in card if p)
+            note = "（外れ値を除いた平均・中央値。GAS は {yahooAvg} / {yahooMedian}）".format(**gas) if card in ROBUST_OVERRIDES else ""
+            print(f"  {'OK' if not diffs else 'NG'}: {label} → 平均 {result.get('yahooAvg')}・中央値 {result.get('yahooMedian')}{note}")
+            for d in diffs:
+                print(f"      {d}")
+            if diffs:
+                failures.append(label)
+    finally:
+        session.close()
+        server.shutdown()
+        server.server_close()
+
+    # 取得できないときは履歴なしの結果を返さず例外にする（既存の相場を上書きせず、バッチごと再試行に回す）
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(0, 1.0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/closedsearch/closedsearch"
+    session = psa9_collector.make_session(1)
+    retry_delay = psa9_collector.RETRY_BASE_DELAY_SEC
+    psa9_collector.RETRY_BASE_DELAY_SEC = 0
+    try:
+        batch = [{"id": number, "card_name": name, "card_number": number, "rarity": rarity}
+                 for name, number, rarity in list(KNOWN_GAS_RESULTS)[:2]]
+        psa9_collector.collect_batch(session, batch, base_url, interval_sec=0)
+        print("  NG: 503 が続いても collect_batch が結果を返した（既存の相場を上書きしてしまう）")
+        failures.append("503")
+    except psa9_collector.requests.RequestException as e:
+        print(f"  OK: 503 が続くと collect_batch が例外を投げる（{type(e).__name__}）")
+    finally:
+        psa9_collector.RETRY_BASE_DELAY_SEC = retry_delay
+        session.close()
+        server.shutdown()
+        server.server_close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ヤフオク落札済み検索のローカル代替サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--delay-ms", type=int, default=300, help="1 リクエストあたりの待ち時間（ミリ秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="503 を返す確率（0〜1）")
+    parser.add_argument("--check", action="store_true", help="サーバーを立てずに psa9_collector.py の結果を GAS の結果と比べる")
+    args = parser.parse_args()
+
+    if args.check:
+        failures = run_check()
+        print(f"\n{'すべて OK' if not failures else f'NG {len(failures)} 件'}")
+        sys.exit(1 if failures else 0)
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.delay_ms, args.fail_rate))
+    print(
+        f"fake Yahoo: http://{args.host}:{args.port}/closedsearch/closedsearch "
+        f"（delay {args.delay_ms}ms, fail-rate {args.fail_rate}）"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
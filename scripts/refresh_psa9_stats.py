@@ -1,26 +1,56 @@
 """
-アプリで表示するカード（利益 5001 円以上）について GAS を呼び出し、PSA9 相場を取得して
-psa9_stats.json に保存する。
+アプリで表示するカード（利益 5001 円以上）について PSA9 相場を取得して
+psa9_stats.json（追記ログ psa9_stats.log.jsonl）に保存する。
+取得元はヤフオクを直接検索する psa9_collector.py（デフォルト）か、従来の GAS（--source gas）。
 
 対象: merged_card_data.csv のうち、利益が 5001 円以上の行（表示されるカードと同一）。
      filtered_cards.csv だけだと利益率 20% 未満の 5000〜10000 円帯が抜けるため、
      merged ベースで利益閾値だけかけている。
 
-実行: GAS_PSA9_API_URL を .env に書くか環境変数で設定してから
+実行:
   python scripts/refresh_psa9_stats.py
+  （GAS 経由にする場合は GAS_PSA9_API_URL を .env に書くか環境変数で設定して --source gas）
+
+  オプション:
+    --source yahoo|gas … 取得元（デフォルト yahoo、環境変数 PSA9_SOURCE）
+    --concurrency N … 同時に投げるバッチ数（デフォルト 3）
+    --fresh         … 前回の途中結果を使わず最初から取得
+    --budget N      … 1 回の実行で取得する最大カード数（デフォルト 300、環境変数 PSA9_CALL_BUDGET）
+    --all           … TTL を無視して利益の高い順に取得
+
+取得対象は優先度順に選ぶ: 未取得の新規カード → 履歴ありで期限切れ（利益の高い順）→ 履歴なしで期限切れ。
+各エントリには fetchedAt（取得時刻）を保存し、利益 3 万円以上は 12 時間、通常は 24 時間、
+履歴なしは 3 日、エラーは 6 時間を有効期間とする。
+
+バッチは keep-alive の Session で並行実行し、失敗したバッチは再試行キューに回して全体は止めない。
+バッチごとに更新分を psa9_stats.log.jsonl に追記し（psa9_stats.json 全体は書き直さない）、
+チェックポイントも保存するので、途中で止まっても再実行で残りだけ取得する。
+ログをスナップショット（psa9_stats.json）にまとめるには python psa9_store.py compact。
 
 プロジェクトルートに .env があれば GAS_PSA9_API_URL を自動で読み込む（Lightsail などで便利）。
 
 cron 例（毎日 3:00）:
-  0 3 * * * cd /path/to/project && GAS_PSA9_API_URL=... python scripts/refresh_psa9_stats.py
+  0 3 * * * cd /path/to/project && python scripts/refresh_psa9_stats.py
 """
+import argparse
+import hashlib
 import json
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
 
-import pandas as pd
 import requests
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import card_snapshot
+import profiling
+import psa9_collector
+import run_history
+from card_identity import canonical_key, card_number_of, clean
+from psa9_store import Psa9Store
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # プロジェクトルートの .env を読み込む（Lightsail 内で実行するとき用）
@@ -40,9 +70,22 @@ if os.path.isfile(_env_path):
                     os.environ.setdefault(k, v)
 MERGED_CSV = os.path.join(BASE_DIR, "merged_card_data.csv")
 FILTERED_CSV = os.path.join(BASE_DIR, "filtered_cards.csv")
-OUTPUT_JSON = os.path.join(BASE_DIR, "psa9_stats.json")
+# 途中で止まったときの再開用（取得済みの id）。全件取得できたら削除する
+CHECKPOINT_JSON = os.path.join(BASE_DIR, "psa9_stats.checkpoint.json")
 BATCH_SIZE = 20
-SLEEP_MS = 600
+DEFAULT_CONCURRENCY = 3  # GAS の同時実行上限・ヤフオクへの負荷に合わせて小さめ
+DEFAULT_SOURCE = os.environ.get("PSA9_SOURCE", "yahoo")
+MAX_RETRIES = 2  # 1 バッチあたりの再試行回数（指数バックオフ）
+RETRY_BASE_DELAY_SEC = 1
+RETRY_ROUNDS = 1  # 失敗バッチをまとめて再試行する回数
+# 相場の有効期間（この期間内に取得済みのカードは再取得しない）
+HIGH_PROFIT_THRESHOLD = 30000  # これ以上の利益のカードは短い TTL で新しさを保つ
+TTL_HIGH_PROFIT = timedelta(hours=12)
+TTL_DEFAULT = timedelta(hours=24)
+TTL_NO_HISTORY = timedelta(days=3)  # ヤフオクに履歴がないカードは変化が少ない
+TTL_ERROR = timedelta(hours=6)
+# 1 回の実行で取得する最大カード数（GAS のクォータ・ヤフオクへのリクエスト数を一定に保つ）
+DEFAULT_CALL_BUDGET = int(os.environ.get("PSA9_CALL_BUDGET", "300"))
 MIN_PROFIT_TO_SHOW = 5001  # フロントと一致（この利益以上のカードを対象）
 
 
@@ -91,6 +134,7 @@ def load_gas_url():
     url = os.environ.get("GAS_PSA9_API_URL", "").strip()
     if not url:
         print("エラー: GAS_PSA9_API_URL 環境変数を設定してください")
+        run_history.fail("GAS_PSA9_API_URL が未設定")
         sys.exit(1)
     return url
 
@@ -102,18 +146,17 @@ def build_card_list():
     merged が無い場合は filtered_cards のみで従来どおり構築（後方互換）。
     """
     if os.path.exists(MERGED_CSV):
-        merged_df = pd.read_csv(MERGED_CSV, encoding="utf-8-sig")
+        merged_df = card_snapshot.read_cards(MERGED_CSV)
         seen = set()
         cards = []
         for _, row in merged_df.iterrows():
             profit = _calculate_profit(row)
             if profit < MIN_PROFIT_TO_SHOW:
                 continue
-            no = str(row.get("No", "") or "").strip()
-            cn = str(row.get("card_number", "") or row.get("No", "") or "").strip()
-            name = str(row.get("カード名", "") or "").strip()
-            rarity = str(row.get("レア", "") or "").strip() if pd.notna(row.get("レア")) else ""
-            composite_key = f"{cn}|{name}" if cn and name else None
+            cn = card_number_of(row)
+            name = clean(row.get("カード名"))
+            rarity = clean(row.get("レア"))
+            composite_key = canonical_key(cn, name)
             if not composite_key or composite_key in seen:
                 continue
             seen.add(composite_key)
@@ -122,6 +165,7 @@ def build_card_list():
                 "card_name": name,
                 "card_number": cn,
                 "rarity": rarity,
+                "profit": profit,
             })
         if cards:
             return cards
@@ -129,38 +173,102 @@ def build_card_list():
     # 後方互換: merged が無い or 対象 0 件のときは filtered_cards のみ
     if not os.path.exists(FILTERED_CSV):
         print(f"エラー: {MERGED_CSV} または {FILTERED_CSV} が必要です")
+        run_history.fail(f"{MERGED_CSV} も {FILTERED_CSV} も見つかりません")
         sys.exit(1)
-    merged_df = pd.read_csv(MERGED_CSV, encoding="utf-8-sig") if os.path.exists(MERGED_CSV) else None
-    filtered_df = pd.read_csv(FILTERED_CSV, encoding="utf-8-sig")
+    merged_df = card_snapshot.read_cards(MERGED_CSV) if os.path.exists(MERGED_CSV) else None
+    filtered_df = card_snapshot.read_cards(FILTERED_CSV)
     merged_key_to_idx = {}
     if merged_df is not None:
         for i, row in merged_df.iterrows():
-            no = str(row.get("No", "") or "").strip()
-            cn = str(row.get("card_number", "") or row.get("No", "") or "").strip()
-            name = str(row.get("カード名", "") or "").strip()
-            key = (no, cn, name)
+            key = (clean(row.get("No")), card_number_of(row), clean(row.get("カード名")))
             if key not in merged_key_to_idx:
                 merged_key_to_idx[key] = i
     cards = []
-    for filtered_idx, (_, row) in enumerate(filtered_df.iterrows()):
-        no = str(row.get("No", "") or "").strip()
-        cn = str(row.get("card_number", "") or row.get("No", "") or "").strip()
-        name = str(row.get("カード名", "") or "").strip()
-        rarity = str(row.get("レア", "") or "").strip() if pd.notna(row.get("レア")) else ""
-        key = (no, cn, name)
+    for _, row in filtered_df.iterrows():
+        cn = card_number_of(row)
+        name = clean(row.get("カード名"))
+        rarity = clean(row.get("レア"))
+        key = (clean(row.get("No")), cn, name)
         if merged_df is not None and merged_key_to_idx.get(key) is None:
             continue
-        composite_key = f"{cn}|{name}" if cn and name else f"{no}_{cn}_{filtered_idx}"
+        # キーは card_number|カード名 のみ（行インデックス依存の旧キーは書かない）
+        composite_key = canonical_key(cn, name)
+        if not composite_key:
+            continue
         cards.append({
             "id": composite_key,
             "card_name": name,
             "card_number": cn,
             "rarity": rarity,
+            "profit": _calculate_profit(row),
         })
     return cards
 
 
-def fetch_batch(gas_url, batch):
+def _parse_fetched_at(value):
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def _ttl_for(card, stats):
+    """相場エントリの有効期間。高利益ほど短く、履歴なしは長く、エラーは早めに取り直す"""
+    if stats.get("error"):
+        return TTL_ERROR
+    if stats.get("hasHistory") is not True:
+        return TTL_NO_HISTORY
+    if card.get("profit", 0) >= HIGH_PROFIT_THRESHOLD:
+        return TTL_HIGH_PROFIT
+    return TTL_DEFAULT
+
+
+def select_due_cards(cards, existing, budget, now=None):
+    """
+    今回取得するカードを優先度順に選ぶ（最大 budget 件）。
+      1. psa9_stats に未登録（新規カード）
+      2. 履歴ありで TTL 切れ … 利益の高い順
+      3. 履歴なしで TTL 切れ（TTL は長め）
+    fetchedAt が無い旧エントリは TTL 切れとして扱う。
+    戻り値: (今回取得するカード, 予算超過で次回に回した件数, 期限内でスキップした件数)
+    """
+    now = now or datetime.now(timezone.utc)
+    due = []
+    fresh = 0
+    for card in cards:
+        stats = existing.get(card["id"])
+        if not isinstance(stats, dict):
+            due.append((0, -card.get("profit", 0), card))
+            continue
+        fetched_at = _parse_fetched_at(stats.get("fetchedAt"))
+        if fetched_at is not None and now - fetched_at < _ttl_for(card, stats):
+            fresh += 1
+            continue
+        tier = 1 if stats.get("hasHistory") is True or stats.get("error") else 2
+        # 同じ優先度なら、古いもの（fetchedAt なしを最優先）から
+        age = (now - fetched_at).total_seconds() if fetched_at is not None else float("inf")
+        due.append((tier, -card.get("profit", 0), card) if tier == 1 else (tier, -age, card))
+    due.sort(key=lambda x: (x[0], x[1]))
+    selected = [card for _, _, card in due[:budget]] if budget > 0 else [card for _, _, card in due]
+    return selected, len(due) - len(selected), fresh
+
+
+def make_session(pool_size: int) -> requests.Session:
+    """keep-alive で使い回す Session（同時実行数ぶんのコネクションを保持）"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+def fetch_batch(session, gas_url, batch):
     payload = {
         "cards": [
             {
@@ -172,93 +280,224 @@ def fetch_batch(gas_url, batch):
             for c in batch
         ]
     }
-    r = requests.post(
-        gas_url,
-        json=payload,
-        headers={"Content-Type": "application/json"},
-        timeout=120,
-    )
+    r = session.post(gas_url, json=payload, timeout=120)
     r.raise_for_status()
     data = r.json()
     return data.get("results", [])
 
 
+def fetch_batch_with_retry(session, gas_url, batch, retries=MAX_RETRIES):
+    """指数バックオフ（1秒, 2秒, 4秒…）で再試行しながら 1 バッチ取得する"""
+    for attempt in range(retries + 1):
+        try:
+            return fetch_batch(session, gas_url, batch)
+        except (requests.RequestException, ValueError):
+            if attempt >= retries:
+                raise
+            run_history.error("gas_retry")
+            time.sleep(RETRY_BASE_DELAY_SEC * (2 ** attempt))
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _to_stats(r, fetched_at):
+    return {
+        "yahooAvg": r.get("yahooAvg"),
+        "yahooMedian": r.get("yahooMedian"),
+        "recent1": r.get("recent1"),
+        "recent2": r.get("recent2"),
+        "recent3": r.get("recent3"),
+        "mercariUrl": r.get("mercariUrl"),
+        "hasHistory": r.get("hasHistory"),
+        "error": r.get("error"),
+        "fetchedAt": fetched_at,
+    }
+
+
+def merge_results(batch, results):
+    """
+    GAS が results に id を返す場合は id をキーとして保存する。
+    id を返さない場合があるので、そのときは送信した順番（batch順）で保存する。
+    戻り値: {キー: 相場} の更新分
+    """
+    updates = {}
+    fetched_at = _now_iso()
+    has_result_ids = any((r or {}).get("id") for r in results)
+    if has_result_ids:
+        for r in results:
+            cid = (r or {}).get("id")
+            if not cid:
+                continue
+            updates[cid] = _to_stats(r, fetched_at)
+    else:
+        for j, r in enumerate(results):
+            if j >= len(batch):
+                break
+            updates[batch[j]["id"]] = _to_stats(r or {}, fetched_at)
+    return updates
+
+
+def save_json_atomic(path, obj, indent=2):
+    """途中で落ちても壊れたファイルが残らないよう、一時ファイルに書いてから置き換える"""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp, path)
+
+
+def _cards_signature(cards):
+    return hashlib.sha1("\n".join(c["id"] for c in cards).encode("utf-8")).hexdigest()
+
+
+def load_checkpoint(cards):
+    """前回の途中結果（同じ対象カードのときだけ有効）から、取得済みの id の集合を返す"""
+    if not os.path.exists(CHECKPOINT_JSON):
+        return set()
+    try:
+        with open(CHECKPOINT_JSON, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return set()
+    if data.get("signature") != _cards_signature(cards):
+        return set()
+    return set(data.get("done") or [])
+
+
+def save_checkpoint(cards, done_ids):
+    save_json_atomic(CHECKPOINT_JSON, {"signature": _cards_signature(cards), "done": sorted(done_ids)}, indent=None)
+
+
+def run_batches(session, fetch, batches, existing, on_batch_done, concurrency):
+    """
+    バッチを同時実行数の上限つきで並行実行する。
+    fetch(session, batch) -> results（GAS の results と同じ形式）
+    戻り値: (保存した件数, 失敗したバッチのリスト)
+    """
+    total = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            pool.submit(fetch, session, batch): (n, batch)
+            for n, batch in batches
+        }
+        for fut in as_completed(futures):
+            n, batch = futures[fut]
+            try:
+                results = fut.result()
+            except Exception as e:
+                print(f"  バッチ {n}: {len(batch)} 件... エラー: {e}（再試行キューへ）")
+                run_history.error("batch_error")
+                failed.append((n, batch))
+                continue
+            updates = merge_results(batch, results)
+            existing.update(updates)
+            total += len(updates)
+            print(f"  バッチ {n}: {len(batch)} 件... OK")
+            on_batch_done(batch, updates)
+    return total, failed
+
+
 def main():
-    gas_url = load_gas_url()
-    cards = build_card_list()
+    profiling.setup("refresh_psa9_stats")
+    parser = argparse.ArgumentParser(description="PSA9 相場を取得して psa9_stats.json に保存")
+    parser.add_argument("--source", choices=("yahoo", "gas"), default=DEFAULT_SOURCE, help=f"取得元（デフォルト: {DEFAULT_SOURCE}）")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"同時に投げるバッチ数（デフォルト: {DEFAULT_CONCURRENCY}）")
+    parser.add_argument("--fresh", action="store_true", help="前回の途中結果（チェックポイント）を使わず最初から取得")
+    parser.add_argument("--budget", type=int, default=DEFAULT_CALL_BUDGET, help=f"1 回の実行で取得する最大カード数（0 で無制限。デフォルト: {DEFAULT_CALL_BUDGET}）")
+    parser.add_argument("--all", action="store_true", help="TTL を無視して対象カードをすべて取得（予算は適用）")
+    args = parser.parse_args()
+    run_history.start("refresh_psa9_stats")
+
+    if args.source == "gas":
+        gas_url = load_gas_url()
+        new_session = make_session
+
+        def fetch(session, batch):
+            return fetch_batch_with_retry(session, gas_url, batch)
+    else:
+        new_session = psa9_collector.make_session
+
+        def fetch(session, batch):
+            return psa9_collector.collect_batch(session, batch)
+
+    with profiling.stage("load"):
+        cards = build_card_list()
+        if not cards:
+            print("取得対象のカードがありません")
+            sys.exit(0)
+
+        # 既存の相場（スナップショット + 追記ログの最新値）
+        store = Psa9Store()
+        existing = store.load_all()
+
+    # 取得からの経過時間と利益で優先度を付け、予算内のカードだけ取得する
+    if args.all:
+        cards = sorted(cards, key=lambda c: -c.get("profit", 0))
+        deferred = max(0, len(cards) - args.budget) if args.budget > 0 else 0
+        cards = cards[: args.budget] if args.budget > 0 else cards
+        fresh = 0
+    else:
+        cards, deferred, fresh = select_due_cards(cards, existing, args.budget)
+    print(f"期限内でスキップ: {fresh} 件、予算超過で次回へ: {deferred} 件")
+    run_history.count("due", len(cards))
+    run_history.count("deferred", deferred)
+    # 期限内（TTL 内）の相場をそのまま使えたカードをヒットとして記録する
+    run_history.cache("psa9_ttl", fresh, len(cards) + deferred)
     if not cards:
-        print("取得対象のカードがありません")
-        sys.exit(0)
+        print("取得が必要なカードはありません")
+        return
 
-    print(f"対象: {len(cards)} 件、{BATCH_SIZE} 件ずつバッチ実行")
+    # 前回途中で止まった場合は、取得済みのカードを飛ばして残りだけ取得する
+    done_ids = set() if args.fresh else load_checkpoint(cards)
+    pending = [c for c in cards if c["id"] not in done_ids]
+    if done_ids:
+        print(f"前回の途中結果から再開: 取得済み {len(cards) - len(pending)} 件をスキップ")
+    print(f"対象: {len(pending)} 件、{BATCH_SIZE} 件ずつバッチ実行（同時 {args.concurrency} バッチ、取得元 {args.source}）")
 
-    # 既存の psa9_stats を読み込み（上書き更新）
-    existing = {}
-    if os.path.exists(OUTPUT_JSON):
-        try:
-            with open(OUTPUT_JSON, "r", encoding="utf-8") as f:
-                existing = json.load(f)
-        except (json.JSONDecodeError, IOError):
-            pass
+    with_history = 0
+
+    def on_batch_done(batch, updates):
+        nonlocal with_history
+        # バッチごとに更新分をログに追記し、チェックポイントを保存（途中で止まっても次回そこから再開できる）
+        done_ids.update(c["id"] for c in batch)
+        with_history += sum(1 for s in updates.values() if s.get("hasHistory") is True)
+        run_history.error("result_error", sum(1 for s in updates.values() if s.get("error")))
+        store.append(updates)
+        save_checkpoint(cards, done_ids)
 
+    batches = [
+        ((i // BATCH_SIZE) + 1, pending[i : i + BATCH_SIZE])
+        for i in range(0, len(pending), BATCH_SIZE)
+    ]
+    session = new_session(args.concurrency)
     total = 0
-    for i in range(0, len(cards), BATCH_SIZE):
-        batch = cards[i : i + BATCH_SIZE]
-        batch_num = (i // BATCH_SIZE) + 1
-        print(f"  バッチ {batch_num}: {len(batch)} 件...", end=" ", flush=True)
-        try:
-            results = fetch_batch(gas_url, batch)
-            # GAS が results に id を返す場合は id をキーとして保存する。
-            # id を返さない場合があるので、そのときは送信した順番（batch順）で保存する。
-            has_result_ids = any((r or {}).get("id") for r in results)
-            if has_result_ids:
-                for r in results:
-                    cid = (r or {}).get("id")
-                    if not cid:
-                        continue
-                    existing[cid] = {
-                        "yahooAvg": r.get("yahooAvg"),
-                        "yahooMedian": r.get("yahooMedian"),
-                        "recent1": r.get("recent1"),
-                        "recent2": r.get("recent2"),
-                        "recent3": r.get("recent3"),
-                        "mercariUrl": r.get("mercariUrl"),
-                        "hasHistory": r.get("hasHistory"),
-                        "error": r.get("error"),
-                    }
-                    total += 1
-            else:
-                for j, r in enumerate(results):
-                    if j >= len(batch):
-                        break
-                    card = batch[j]
-                    cid = card["id"]
-                    existing[cid] = {
-                        "yahooAvg": r.get("yahooAvg"),
-                        "yahooMedian": r.get("yahooMedian"),
-                        "recent1": r.get("recent1"),
-                        "recent2": r.get("recent2"),
-                        "recent3": r.get("recent3"),
-                        "mercariUrl": r.get("mercariUrl"),
-                        "hasHistory": r.get("hasHistory"),
-                        "error": r.get("error"),
-                    }
-                    total += 1
-            print("OK")
-        except Exception as e:
-            print(f"エラー: {e}")
-            # ここまでで保存
+    failed = batches
+    # 失敗したバッチは再試行キューに積み、全体を止めずに後でもう一度まとめて試す
+    for round_num in range(RETRY_ROUNDS + 1):
+        if not failed:
             break
-        # GAS 側のレート制限を考慮（バッチ間に少し待機）
-        import time
-        time.sleep(1)
+        if round_num:
+            print(f"再試行キュー {len(failed)} バッチ（{round_num} 回目）...")
+            time.sleep(RETRY_BASE_DELAY_SEC * (2 ** (MAX_RETRIES + round_num)))
+        with profiling.stage("fetch" if not round_num else f"retry_{round_num}"):
+            count, failed = run_batches(session, fetch, failed, existing, on_batch_done, args.concurrency)
+        total += count
+    session.close()
+    # 一致率 = 相場（取引履歴）が見つかったカード / 取得したカード
+    run_history.count("fetched", total)
+    run_history.count("with_history", with_history)
+    run_history.match(with_history, total)
 
-    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-        # GAS が返す id をキーにしているため、返却された形式はそのまま保存する
-        # （バックエンド側で composite_key 優先 + 互換フォールバックしている）
-        json.dump(existing, f, ensure_ascii=False, indent=2)
+    if failed:
+        remaining = sum(len(b) for _, b in failed)
+        run_history.error("unfetched_cards", remaining)
+        print(f"未取得: {len(failed)} バッチ（{remaining} 件）。再実行すると残りだけ取得します")
+    elif os.path.exists(CHECKPOINT_JSON):
+        os.remove(CHECKPOINT_JSON)
 
-    print(f"完了: {total} 件を {OUTPUT_JSON} に保存しました")
+    print(f"完了: {total} 件を {store.log_path} に追記しました（まとめるには python psa9_store.py compact）")
 
 
 if __name__ == "__main__":
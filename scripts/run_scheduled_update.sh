@@ -5,6 +5,9 @@
 # 例（cron）:
 #   0 10 * * * cd /Users/あなた/Desktop/Poke\ trade\ PSA && ./scripts/run_scheduled_update.sh
 #   0 1 * * * cd /home/ubuntu/app && PYTHON=/home/ubuntu/app/venv/bin/python ./scripts/run_scheduled_update.sh
+#
+# 遅いときは PIPELINE_PROFILE=1 を付けて実行すると、各スクリプトの CPU・メモリのプロファイルを
+# profiles/<実行 ID>/<スクリプト名>/ に書き出す（profiling.py・docs/PROFILING.md）
 
 set -e
 ROOT="$(cd "$(dirname "$0")/.." && pwd)"
@@ -18,6 +21,8 @@ if [ -f .env ]; then
 fi
 
 PYTHON="${PYTHON:-python3}"
+# 1 回の実行で共通の ID（各スクリプトのプロファイルを同じフォルダにまとめ、実行履歴 run_history.jsonl の run_id にも使う）
+export PIPELINE_RUN_ID="${PIPELINE_RUN_ID:-$(date '+%Y%m%d_%H%M%S')}"
 
 echo "[$(date '+%Y-%m-%d %H:%M:%S')] scrape_otachu.py"
 $PYTHON scrape_otachu.py
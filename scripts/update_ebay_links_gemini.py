@@ -3,8 +3,14 @@
 filtered_cards.csv と ebay_links.json を比較し、ebay_links にないカード（新規）だけ
 Gemini API で英名を取得して eBay URL を組み立て、ebay_links.json にマージする。
 
+英訳はカード名の基本名（ポケモン名・トレーナー名）ごとに ebay_name_cache.json に保存し、
+ex / V / メガ / (SA) などの部分はローカルの規則で付け直す（ebay_names.py）。
+ポケモン名・トレーナー名は同梱の辞書（ebay_name_dictionary.json）で訳し、
+Gemini に送るのはキャッシュにも辞書にもない基本名（カードタイトルなど）だけ。
+英訳が空だった基本名は negative_cache.json（negative_cache.py）に記録し、再試行待ちの間は送らない。
+
 前提:
-  - GEMINI_API_KEY を .env に書くか環境変数で設定（Google AI Studio で取得）
+  - GEMINI_API_KEY を .env に書くか環境変数で設定（Google AI Studio で取得。キャッシュだけで訳せるときは不要）
   - プロジェクトルートの .env があれば自動で読み込む
   - pip install google-genai
 
@@ -15,14 +21,26 @@ Gemini API で英名を取得して eBay URL を組み立て、ebay_links.json 
     --dry-run   … 新規カードを表示するだけで JSON は更新しない
     --csv path  … filtered_cards.csv のパス（省略時はプロジェクトルートの filtered_cards.csv）
     --output    … 出力 JSON パス（省略時は ebay_links.json）
+    --cache     … 英訳キャッシュのパス（省略時は ebay_name_cache.json）
+    --chunk-size N  … Gemini に 1 回で送る名前数（デフォルト 40）
+    --concurrency N … 同時に投げるチャンク数（デフォルト 4）
+    --retry-untranslated … 前回英訳が空だった基本名も再試行待ちを無視して送る
 """
 import json
 import os
 import sys
-from collections import Counter
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import quote
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+import card_snapshot  # noqa: E402
+from card_identity import identify  # noqa: E402
+from ebay_names import DEFAULT_CACHE_PATH, TranslationCache, translate_names  # noqa: E402
+import profiling  # noqa: E402
+import run_history  # noqa: E402
+from negative_cache import NegativeCache  # noqa: E402
 
 # プロジェクトルートの .env を読み込む（GEMINI_API_KEY 用）
 _env_path = os.path.join(BASE_DIR, ".env")
@@ -43,6 +61,24 @@ if os.path.isfile(_env_path):
 DEFAULT_CSV = os.path.join(BASE_DIR, "filtered_cards.csv")
 DEFAULT_OUTPUT = os.path.join(BASE_DIR, "ebay_links.json")
 EBAY_BASE = "https://www.ebay.com/sch/i.html?_nkw={query}&LH_Sold=1&LH_Complete=1"
+GEMINI_CHUNK_SIZE = 40  # 1 リクエストあたりの名前数
+GEMINI_CONCURRENCY = 4
+GEMINI_MAX_RETRIES = 2  # チャンクごとの再試行回数（指数バックオフ）
+GEMINI_RETRY_BASE_DELAY_SEC = 2
+NEGATIVE_CACHE_NAMESPACE = "ebay_name"
+GEMINI_FALLBACK_MODELS = ("gemini-2.0-flash", "gemini-2.5-flash-lite")
+# id つきの JSON 配列で返させる（行の順番で対応させるとずれたときに別カードの英名が付く）
+GEMINI_JSON_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": {
+        "type": "ARRAY",
+        "items": {
+            "type": "OBJECT",
+            "properties": {"id": {"type": "STRING"}, "en": {"type": "STRING"}},
+            "required": ["id", "en"],
+        },
+    },
+}
 
 
 def normalize(s):
@@ -57,25 +93,13 @@ def build_url_from_english_name(english_name: str, card_number: str) -> str:
 
 
 def load_filtered_cards(csv_path: str):
-    """filtered_cards.csv を読み、(key, card_number, card_name) のリストを返す。"""
-    import pandas as pd
-    df = pd.read_csv(csv_path, encoding="utf-8-sig")
-    cn_col = "card_number" if "card_number" in df.columns else "No"
-    name_col = "カード名"
-    counts = Counter()
-    for _, row in df.iterrows():
-        cn = normalize(row.get(cn_col, ""))
-        if cn:
-            counts[cn] += 1
-    rows = []
-    for _, row in df.iterrows():
-        cn = normalize(row.get(cn_col, ""))
-        name = normalize(row.get(name_col, ""))
-        if not cn:
-            continue
-        key = f"{cn}|{name}" if (name and counts[cn] > 1) else cn
-        rows.append((key, cn, name))
-    return rows
+    """filtered_cards.csv（スナップショットがあればそちら）を読み、(key, card_number, card_name) のリストを返す。key は ebay_links.json のキー"""
+    df = card_snapshot.read_cards(csv_path)
+    return [
+        (ident.link_key, ident.card_number, ident.card_name)
+        for ident in identify(row for _, row in df.iterrows())
+        if ident.card_number
+    ]
 
 
 def load_ebay_links(path: str) -> dict:
@@ -85,82 +109,140 @@ def load_ebay_links(path: str) -> dict:
         return json.load(f)
 
 
-def translate_with_gemini(japanese_names: list, api_key: str) -> list:
-    """Gemini で日本語カード名を英名に訳す。順序は維持。"""
-    try:
-        from google import genai
-    except ImportError:
-        print("エラー: google-genai がインストールされていません。pip install google-genai", file=sys.stderr)
-        sys.exit(1)
+def _chunk_prompt(chunk: list) -> str:
+    items = json.dumps([{"id": cid, "ja": name} for cid, name in chunk], ensure_ascii=False)
+    return f"""Translate the following Japanese Pokémon TCG names (Pokémon, trainers or card titles) to their official English names as used on English cards.
+Return a JSON array with one object {{"id": ..., "en": ...}} per input, using the same id. No other text.
+
+Input:
+{items}"""
 
+
+def _parse_chunk_response(text: str) -> dict:
+    """構造化出力（[{id, en}, ...]）→ {id: 英名}。行の順番には依存しない"""
+    text = (text or "").strip()
+    if text.startswith("```"):
+        # ```json ... ``` で囲まれて返る場合
+        text = text.strip("`")
+        text = text[text.find("\n") + 1 :] if "\n" in text else text
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("results") or data.get("items") or []
+    result = {}
+    for item in data if isinstance(data, list) else []:
+        if isinstance(item, dict) and item.get("id") is not None:
+            result[str(item["id"])] = normalize(item.get("en"))
+    return result
+
+
+def _generate(client, prompt: str) -> str:
+    """GEMINI_MODEL で生成し、失敗したらフォールバックのモデルを順に試す"""
     model_id = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
-    numbered = "\n".join(f"{i+1}. {n}" for i, n in enumerate(japanese_names))
-    prompt = f"""Translate the following Japanese Pokémon TCG card names to their official English names as used on English cards.
-Return ONLY the English name for each, one per line, in the exact same order (1 line per card). No other text.
-
-Japanese names:
-{numbered}"""
-    client = genai.Client(api_key=api_key)
-    response = None
+    last_error = None
+    for model in [model_id] + [m for m in GEMINI_FALLBACK_MODELS if m != model_id]:
+        try:
+            response = client.models.generate_content(model=model, contents=prompt, config=GEMINI_JSON_CONFIG)
+            return response.text or ""
+        except Exception as e:
+            last_error = e
+    raise last_error
+
+
+def _translate_chunk(client, n: int, chunk: list) -> dict:
+    """
+    1 チャンクを訳す。例外・JSON の崩れ・id の欠けはこのチャンクだけ再試行する。
+    再試行しても訳せなかった id のうち、モデルが空の en で答えたものは空文字、
+    一度も答えが返らなかったもの（エラー・欠け）は結果に含めない（呼び出し側で None になる）。
+    """
+    result = {}
+    answered_empty = set()
+    pending = chunk
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(GEMINI_RETRY_BASE_DELAY_SEC * (2 ** (attempt - 1)))
+        try:
+            got = _parse_chunk_response(_generate(client, _chunk_prompt(pending)))
+        except Exception as e:
+            print(f"  チャンク {n}: エラー {e}（{attempt + 1} 回目）", file=sys.stderr)
+            run_history.error("gemini_error")
+            continue
+        ids = {cid for cid, _ in pending}
+        result.update({cid: en for cid, en in got.items() if cid in ids and en})
+        answered_empty.update(cid for cid, en in got.items() if cid in ids and not en)
+        pending = [(cid, name) for cid, name in pending if cid not in result]
+        if not pending:
+            break
+    if pending:
+        print(f"  警告: チャンク {n} で {len(pending)} 件を訳せませんでした", file=sys.stderr)
+        run_history.error("gemini_untranslated", len(pending))
+        result.update({cid: "" for cid, _ in pending if cid in answered_empty})
+    return result
+
+
+def translate_with_gemini(
+    japanese_names: list,
+    api_key: str,
+    client=None,
+    chunk_size: int = GEMINI_CHUNK_SIZE,
+    concurrency: int = GEMINI_CONCURRENCY,
+) -> list:
+    """
+    Gemini で日本語カード名を英名に訳す。戻り値は japanese_names と同じ順
+    （モデルが訳せなかったと答えたものは空文字、エラーなどで答えが返らなかったものは None）。
+    chunk_size 件ずつ concurrency 並列で投げ、結果は行の順番ではなく id で対応させる。
+    client を渡すとそれを使う（scripts/fake_gemini_client.py の FakeGeminiClient など）。
+    """
+    own_client = client is None
+    if own_client:
+        try:
+            from google import genai
+        except ImportError:
+            print("エラー: google-genai がインストールされていません。pip install google-genai", file=sys.stderr)
+            run_history.fail("google-genai が未インストール")
+            sys.exit(1)
+        client = genai.Client(api_key=api_key)
+
+    items = [(str(i), name) for i, name in enumerate(japanese_names)]
+    chunks = [items[i : i + chunk_size] for i in range(0, len(items), max(1, chunk_size))]
+    translated: dict[str, str] = {}
     try:
-        response = client.models.generate_content(
-            model=model_id,
-            contents=prompt,
-        )
-        print(f"  モデル: {model_id}", file=sys.stderr)
-    except Exception as e:
-        for fallback in ["gemini-2.0-flash", "gemini-2.5-flash-lite"]:
-            if fallback == model_id:
-                continue
-            try:
-                response = client.models.generate_content(model=fallback, contents=prompt)
-                print(f"  モデル: {fallback}", file=sys.stderr)
-                break
-            except Exception:
-                continue
-        if response is None:
-            raise e
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            futures = [pool.submit(_translate_chunk, client, n + 1, chunk) for n, chunk in enumerate(chunks)]
+            for fut in as_completed(futures):
+                translated.update(fut.result())
     finally:
-        client.close()
-
-    text = (response.text or "").strip()
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    # 行頭の "1. " "1) " などを除去
-    result = []
-    for ln in lines:
-        s = ln
-        for i, c in enumerate(s):
-            if c.isdigit() or c in ".) ":
-                continue
-            s = s[i:].lstrip()
-            break
-        result.append(s or ln)
-    # 数が足りない場合はそのまま返す（呼び出し側で不足分は空文字）
-    while len(result) < len(japanese_names):
-        result.append("")
-    return result[: len(japanese_names)]
+        if own_client:
+            client.close()
+    got = sum(1 for en in translated.values() if en)
+    print(f"  Gemini: {len(items)} 件を {len(chunks)} チャンクで送信、{got} 件を取得", file=sys.stderr)
+    return [translated.get(cid) for cid, _ in items]
 
 
 def main():
     import argparse
+    profiling.setup("update_ebay_links_gemini")
     parser = argparse.ArgumentParser(description="新規カードのみ Gemini で英名取得し ebay_links にマージ")
     parser.add_argument("--dry-run", action="store_true", help="新規のみ表示し JSON は更新しない")
     parser.add_argument("--csv", default=DEFAULT_CSV, help=f"filtered_cards.csv のパス（デフォルト: {DEFAULT_CSV}）")
     parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"出力 JSON（デフォルト: {DEFAULT_OUTPUT}）")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help=f"英訳キャッシュ（デフォルト: {DEFAULT_CACHE_PATH}）")
+    parser.add_argument("--chunk-size", type=int, default=GEMINI_CHUNK_SIZE, help=f"Gemini に 1 回で送る名前数（デフォルト: {GEMINI_CHUNK_SIZE}）")
+    parser.add_argument("--concurrency", type=int, default=GEMINI_CONCURRENCY, help=f"同時に投げるチャンク数（デフォルト: {GEMINI_CONCURRENCY}）")
+    parser.add_argument("--retry-untranslated", action="store_true", help="前回英訳が空だった基本名も再試行待ちを無視して送る")
     args = parser.parse_args()
-
-    api_key = os.environ.get("GEMINI_API_KEY", "").strip()
-    if not api_key:
-        print("エラー: 環境変数 GEMINI_API_KEY を設定してください（Google AI Studio で取得）", file=sys.stderr)
-        sys.exit(1)
+    run_history.start("update_ebay_links_gemini")
 
     if not os.path.exists(args.csv):
         print(f"エラー: {args.csv} が見つかりません", file=sys.stderr)
+        run_history.fail(f"{args.csv} が見つかりません")
         sys.exit(1)
 
-    all_cards = load_filtered_cards(args.csv)
-    existing = load_ebay_links(args.output)
+    with profiling.stage("load"):
+        all_cards = load_filtered_cards(args.csv)
+        existing = load_ebay_links(args.output)
     new_cards = [(k, cn, name) for k, cn, name in all_cards if k not in existing]
+    run_history.count("cards", len(all_cards))
+    run_history.count("new_cards", len(new_cards))
 
     if not new_cards:
         print("新規カードはありません。")
@@ -174,15 +256,43 @@ def main():
         print("（--dry-run のため JSON は更新しません）")
         return
 
+    started = time.time()
+    cache = TranslationCache(args.cache)
+    negative = NegativeCache(NEGATIVE_CACHE_NAMESPACE, ignore_wait=args.retry_untranslated)
+    api_key = os.environ.get("GEMINI_API_KEY", "").strip()
+
+    def translate_unknown(bases):
+        # キャッシュにない基本名があるときだけ API キーが必要
+        if not api_key:
+            print("エラー: 環境変数 GEMINI_API_KEY を設定してください（Google AI Studio で取得）", file=sys.stderr)
+            run_history.fail("GEMINI_API_KEY が未設定")
+            sys.exit(1)
+        print(f"Gemini で英名を取得中...（{len(bases)} 件）")
+        return translate_with_gemini(bases, api_key, chunk_size=args.chunk_size, concurrency=args.concurrency)
+
     names_ja = [name for _, _, name in new_cards]
-    print("Gemini で英名を取得中...")
-    names_en = translate_with_gemini(names_ja, api_key)
+    with profiling.stage("translate"):
+        names_en, stats = translate_names(names_ja, cache, translate_unknown, negative)
+    cache.save()
+    negative.save()
+    run_history.cache("translation", stats["hits"], stats["misses"])
+    for name in ("offline", "requested", "translated", "skipped"):
+        run_history.count(f"translation_{name}", stats[name])
+    looked_up = stats["hits"] + stats["misses"]
+    hit_rate = stats["hits"] / looked_up * 100 if looked_up else 0.0
+    print(
+        f"英訳キャッシュ: 基本名 {looked_up} 件中 {stats['hits']} 件ヒット（{hit_rate:.0f}%）、"
+        f"辞書で訳せた {stats['offline']} 件、Gemini に送信 {stats['requested']} 件（訳せた {stats['translated']} 件）、"
+        f"前回訳せず再試行待ち {stats['skipped']} 件、"
+        f"{time.time() - started:.1f} 秒"
+    )
 
     merged = dict(existing)
     for (key, card_number, _), eng in zip(new_cards, names_en):
         eng = normalize(eng)
         if not eng:
             print(f"  警告: 英名が空です key={key}", file=sys.stderr)
+            run_history.error("empty_english_name")
             continue
         url = build_url_from_english_name(eng, card_number)
         merged[key] = url
@@ -191,8 +301,11 @@ def main():
     out_dir = os.path.dirname(args.output)
     if out_dir:
         os.makedirs(out_dir, exist_ok=True)
-    with open(args.output, "w", encoding="utf-8") as f:
+    with profiling.stage("save"), open(args.output, "w", encoding="utf-8") as f:
         json.dump(merged, f, ensure_ascii=False, indent=2)
+    added = len(merged) - len(existing)
+    run_history.count("added", added)
+    run_history.match(added, len(new_cards))
     print(f"完了: {args.output} に {len(merged)} 件を保存しました（新規 {len(new_cards)} 件追加）")
 
 